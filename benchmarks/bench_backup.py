@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Benchmark database backups: shutil.copy of the file against the online backup API.
+
+Fills an encrypted scratch database, then times a plain file copy (the old
+make_backup, unsafe while a connection writes) and backup_database taken in one
+step and in BACKUP_PAGES steps. For the backup API runs a second thread keeps
+committing small writes (every --write-interval ms), and the slowest of those
+commits shows how long the backup held the database up.
+
+Usage: python benchmarks/bench_backup.py [--rows N] [--write-interval MS]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.db
+from src.db import connect_db, init_db
+from src.keys import DatabaseKey
+from src.repos import UserRepo, EmailRepo
+from src.backup import BACKUP_PAGES, backup_database
+
+PASSPHRASE = "correct horse battery staple"
+
+def writer(key, stop, latencies, interval):
+    """Commit one small insert at a time until stop is set, recording each commit's latency."""
+    conn = connect_db(key)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    while not stop.is_set():
+        start = time.perf_counter()
+        conn.execute("INSERT INTO catalog_meta (key, value) VALUES ('bench', ?) "
+                     "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (str(start),))
+        conn.commit()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(interval)
+    conn.close()
+
+def timed_backup(key, target, pages, interval):
+    source = connect_db(key, check_same_thread=False)
+    stop, latencies = threading.Event(), []
+    thread = threading.Thread(target=writer, args=(key, stop, latencies, interval))
+    thread.start()
+    time.sleep(0.05)
+    start = time.perf_counter()
+    total = backup_database(source, target, key, pages=pages)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    thread.join()
+    source.close()
+    return elapsed, total, max(latencies) if latencies else 0.0, len(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000, help="Email rows in the scratch database")
+    parser.add_argument('--write-interval', type=float, default=250, help="Milliseconds between concurrent commits")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        os.makedirs('data')
+        key = DatabaseKey.unlock(PASSPHRASE, src.db.DB_PATH)
+        init_db(key)
+        conn = connect_db(key)
+        user_id = UserRepo(conn).add(first_name="Bench", last_name="User")
+        EmailRepo(conn).add_many({'user_id': user_id, 'email_address': f"user{i}@example.com", 'source_site': 'bench'}
+                                 for i in range(args.rows))
+        conn.commit()
+        conn.close()
+        size = os.path.getsize(src.db.DB_PATH) / 2**20
+        print(f"Database: {size:.1f} MiB")
+
+        start = time.perf_counter()
+        shutil.copy(src.db.DB_PATH, 'copy.db')
+        print(f"{'shutil.copy (no consistency)':<32} {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+        for label, pages in (("backup API, one step", -1), (f"backup API, {BACKUP_PAGES}-page steps", BACKUP_PAGES)):
+            elapsed, total, worst, commits = timed_backup(key, f"backup{pages}.db", pages, args.write_interval / 1000)
+            print(f"{label:<32} {elapsed * 1000:8.1f} ms  ({total} pages; {commits} concurrent commits, "
+                  f"slowest {worst * 1000:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
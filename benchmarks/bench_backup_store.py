@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Benchmark the deduplicating backup store against full backup copies.
+
+Fills an encrypted scratch database, then repeatedly changes a few rows and takes
+a backup, once as a full backup_database copy per snapshot (what dated .bak files
+amounted to) and once as a BackupStore snapshot. Reports the time per backup and
+the disk used after all of them.
+
+Usage: python benchmarks/bench_backup_store.py [--rows N] [--snapshots N] [--changes N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.db
+from src.db import connect_db, init_db
+from src.keys import DatabaseKey
+from src.repos import UserRepo, EmailRepo
+from src.backup import BackupStore, backup_database
+
+PASSPHRASE = "correct horse battery staple"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000, help="Email rows in the scratch database")
+    parser.add_argument('--snapshots', type=int, default=10, help="Backups taken")
+    parser.add_argument('--changes', type=int, default=20, help="Rows updated between backups")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        os.makedirs('data')
+        key = DatabaseKey.unlock(PASSPHRASE, src.db.DB_PATH)
+        init_db(key)
+        conn = connect_db(key)
+        user_id = UserRepo(conn).add(first_name="Bench", last_name="User")
+        emails = EmailRepo(conn)
+        emails.add_many({'user_id': user_id, 'email_address': f"user{i}@example.com", 'source_site': 'bench'}
+                        for i in range(args.rows))
+        conn.commit()
+        size = os.path.getsize(src.db.DB_PATH)
+        print(f"Database: {size / 2**20:.1f} MiB, {args.snapshots} backups, {args.changes} rows changed between them")
+
+        store = BackupStore(os.path.join('data', 'backups'))
+        copy_time = store_time = 0.0
+        copy_bytes = 0
+        for snapshot in range(args.snapshots):
+            step = args.rows // args.changes
+            emails.update_many([(1 + i * step, {'source_site': f"changed-{snapshot}"}) for i in range(args.changes)])
+            conn.commit()
+
+            path = os.path.join('data', f"copy-{snapshot}.db")
+            start = time.perf_counter()
+            backup_database(conn, path, key)
+            copy_time += time.perf_counter() - start
+            copy_bytes += os.path.getsize(path)
+
+            start = time.perf_counter()
+            store.snapshot(conn, src.db.DB_PATH)
+            store_time += time.perf_counter() - start
+        conn.close()
+
+        print(f"{'Full copies':<20} {copy_time / args.snapshots * 1000:8.1f} ms/backup  {copy_bytes / 2**20:8.1f} MiB on disk")
+        print(f"{'Backup store':<20} {store_time / args.snapshots * 1000:8.1f} ms/backup  {store.disk_usage() / 2**20:8.1f} MiB on disk")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Benchmark the automated cleaning pass: a commit per site against UnitOfWork checkpoints.
+
+Runs the real prompt-driven pass of cleaning.py (answers scripted, browser stubbed)
+over every expired broker site of an encrypted scratch database, once with
+checkpoint_every = 1 (the old commit after every site) and once with the default,
+and reports the COMMITs (fsyncs) and time each pass takes.
+
+Usage: python benchmarks/bench_checkpoints.py [--sites N] [--checkpoint-every N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.db
+import src.transactions
+from src.db import init_db
+from src.repos import BrokerRepo, CleaningRepo
+from src.session import Session
+from benchmarks.common import automated_pass
+
+PASSPHRASE = "correct horse battery staple"
+OUTCOMES = 'cvsf'  # Cleaned, verified, skipped and failed sites in turn
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=300, help="Expired broker sites in each pass")
+    parser.add_argument('--checkpoint-every', type=int, default=src.transactions.CHECKPOINT_EVERY,
+                        help="Sites per UnitOfWork commit")
+    args = parser.parse_args()
+    outcomes = (OUTCOMES * args.sites)[:args.sites]
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        os.makedirs('data')
+        with Session(PASSPHRASE, src.db.DB_PATH) as session:
+            init_db(session.key)
+            BrokerRepo(session.conn).add_many({'name': f"Broker {i}", 'url': f"https://broker{i}.example"}
+                                              for i in range(args.sites))
+            session.conn.commit()
+            for label, every in (("Commit per site", 1), ("UnitOfWork checkpoints", args.checkpoint_every)):
+                src.transactions.CHECKPOINT_EVERY = every
+                start = time.perf_counter()
+                commits = automated_pass(session, outcomes)
+                elapsed = time.perf_counter() - start
+                print(f"{label:<28} {commits:5d} commits {elapsed * 1000:9.1f} ms")
+                # Expire the sites again for the next pass
+                session.conn.execute("DELETE FROM cleaning_records")
+                session.conn.commit()
+            assert CleaningRepo(session.conn).status_counts()['expired'] == args.sites
+
+if __name__ == "__main__":
+    main()
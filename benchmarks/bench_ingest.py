@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Benchmark full broker catalog ingestion from a local fixture workbook with zero network.
+
+Builds a PDF from benchmarks/fixtures/workbook_sample.txt in a scratch directory, then times
+populate_broker_sites for a cold parse, a rebuild from the parsed snapshot and an unchanged
+workbook. Any attempt to reach the network fails the run.
+
+Usage: python benchmarks/bench_ingest.py [--copies N] [--workers N]
+"""
+import os
+import sys
+import re
+import time
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import requests
+from src.db import init_db, connect_db, populate_broker_sites
+
+FIXTURE_TEXT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'workbook_sample.txt')
+
+def _pdf_string(line):
+    """Encode a line as a PDF literal string in WinAnsi (unsupported characters become '?')."""
+    raw = line.encode('cp1252', errors='replace')
+    return b'(' + raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+def write_fixture_pdf(path, pages):
+    """Write a minimal text-only PDF with one page per entry in pages."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Title (Personal Data Removal Workbook fixture) /ModDate (D:20241001000000) >>",
+    ]
+    page_refs = []
+    for page in pages:
+        lines = [b"BT /F1 7 Tf 9 TL 36 760 Td"]
+        lines += [_pdf_string(line) + b" Tj T*" for line in page.split('\n')]
+        lines.append(b"ET")
+        content = b"\n".join(lines)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(page_refs) + b"] /Count %d >>" % len(page_refs)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+def _no_network(*args, **kwargs):
+    raise AssertionError("bench_ingest must not touch the network")
+
+def timed(label, conn, pdf_path, workers):
+    start = time.perf_counter()
+    result = populate_broker_sites(conn, workers=workers, sources=[f"pdf:{pdf_path}"], log=lambda message: None)
+    elapsed = time.perf_counter() - start
+    count = conn.execute("SELECT COUNT(*) FROM broker_sites").fetchone()[0]
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms  ({count} broker sites, workbook date {result})")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--copies', type=int, default=20, help="Times the fixture pages are repeated in the PDF")
+    parser.add_argument('--workers', type=int, default=1, help="PDF extraction processes (1 = serial)")
+    args = parser.parse_args()
+
+    requests.get = requests.head = requests.request = _no_network
+    with open(FIXTURE_TEXT, 'r', encoding='utf-8') as f:
+        base_pages = f.read().split('\f')
+    # Give each copy distinct broker names so the catalog grows with --copies
+    pages = [re.sub(r'Service: (?!The name of the service)', f'Service: Copy{copy} ', page)
+             for copy in range(args.copies) for page in base_pages]
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)  # All GHOSTWIPE paths are relative to data/
+        os.makedirs('data')
+        pdf_path = os.path.join(scratch, 'workbook.pdf')
+        write_fixture_pdf(pdf_path, pages)
+        print(f"Fixture PDF: {len(pages)} pages, {os.path.getsize(pdf_path) / 1024:.0f} KiB, workers={args.workers}")
+        init_db('')
+
+        conn = connect_db('')
+        if timed("Cold parse (pdfplumber)", conn, pdf_path, args.workers) is None:
+            sys.exit(1)
+        timed("Unchanged workbook", conn, pdf_path, args.workers)
+        conn.close()
+
+        os.remove(os.path.join('data', 'pii_data.db'))  # Fresh database, parsed snapshot kept
+        init_db('')
+        conn = connect_db('')
+        timed("New DB from snapshot", conn, pdf_path, args.workers)
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Benchmark the workbook entry parser on the fixture workbook text.
+
+The golden-output check lives in tests/test_workbook_parser.py; --update-golden
+rewrites its golden file from the current parser.
+
+Usage: python benchmarks/bench_parser.py [--copies N] [--rounds N] [--update-golden]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.workbook import parse_entries
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURE_TEXT = os.path.join(FIXTURE_DIR, 'workbook_sample.txt')
+GOLDEN_OUTPUT = os.path.join(FIXTURE_DIR, 'workbook_sample.golden.json')
+LAST_UPDATED = "2024-10-01"
+
+def load_pages():
+    """Load the fixture workbook text as a list of pages (form feeds separate pages)."""
+    with open(FIXTURE_TEXT, 'r', encoding='utf-8') as f:
+        return f.read().split('\f')
+
+def parse(pages):
+    """Parse pages into a list of entries, discarding the parser's summary line."""
+    return list(parse_entries(pages, LAST_UPDATED, log=lambda message: None))
+
+def update_golden(pages):
+    """Rewrite the golden file from the current parser's output on the fixture."""
+    entries = parse(pages)
+    with open(GOLDEN_OUTPUT, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(f"Golden output updated: {len(entries)} entries written to {GOLDEN_OUTPUT}")
+
+def run_benchmark(pages, copies, rounds):
+    """Time parsing of the fixture repeated `copies` times; report the best of `rounds`."""
+    workload = pages * copies
+    chars = sum(len(page) for page in workload)
+    best = None
+    entry_count = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        entry_count = len(parse(workload))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"Parsed {entry_count} entries from {len(workload)} pages ({chars / 1e6:.2f} MB of text)")
+    print(f"Best of {rounds}: {best * 1000:.1f} ms, {entry_count / best:,.0f} entries/s, {chars / best / 1e6:.1f} MB/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--copies', type=int, default=200, help="Times the fixture is repeated per round")
+    parser.add_argument('--rounds', type=int, default=5, help="Timed rounds (best is reported)")
+    parser.add_argument('--update-golden', action='store_true', help="Rewrite the golden file from the current parser")
+    args = parser.parse_args()
+
+    pages = load_pages()
+    if args.update_golden:
+        update_golden(pages)
+    run_benchmark(pages, args.copies, args.rounds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Benchmark re-encrypting databases of several sizes with reencrypt_database.
+
+For each size, fills an encrypted scratch database and re-encrypts it to new KDF
+iterations and page size and back, reporting the time and throughput of the
+export + verification + swap (the KDF runs are listed separately).
+
+Usage: python benchmarks/bench_reencrypt.py [--rows N,N,...]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.db
+from src.db import connect_db, init_db
+from src.keys import DatabaseKey, CipherSettings, LEGACY_SETTINGS, read_salt
+from src.repos import UserRepo, EmailRepo
+from src.reencrypt import reencrypt_database
+
+PASSPHRASE = "correct horse battery staple"
+TARGET = CipherSettings(kdf_iter=256000, page_size=8192)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='20000,100000,400000', help="Comma-separated email row counts")
+    args = parser.parse_args()
+
+    for settings in (LEGACY_SETTINGS, TARGET):
+        start = time.perf_counter()
+        DatabaseKey.derive(PASSPHRASE, os.urandom(16), settings)
+        print(f"KDF, kdf_iter={settings.kdf_iter}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for rows in (int(count) for count in args.rows.split(',')):
+        with tempfile.TemporaryDirectory() as scratch:
+            os.chdir(scratch)
+            os.makedirs('data')
+            key = DatabaseKey.unlock(PASSPHRASE, src.db.DB_PATH)
+            init_db(key)
+            conn = connect_db(key)
+            user_id = UserRepo(conn).add(first_name="Bench", last_name="User")
+            EmailRepo(conn).add_many({'user_id': user_id, 'email_address': f"user{i}@example.com", 'source_site': 'bench'}
+                                     for i in range(rows))
+            conn.commit()
+            conn.close()
+            size = os.path.getsize(src.db.DB_PATH) / 2**20
+
+            for settings in (TARGET, LEGACY_SETTINGS):
+                start = time.perf_counter()
+                key = reencrypt_database(src.db.DB_PATH, key, PASSPHRASE, settings)
+                elapsed = time.perf_counter() - start
+                print(f"{rows:>8} rows {size:7.1f} MiB -> page_size={settings.page_size:<5} {elapsed * 1000:8.1f} ms  "
+                      f"({size / elapsed:5.1f} MiB/s, KDF included)")
+            assert read_salt(src.db.DB_PATH) == key.salt
+
+if __name__ == "__main__":
+    main()
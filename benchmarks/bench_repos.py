@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Benchmark the repository layer on an encrypted scratch database.
+
+Times inserting child rows one statement and commit at a time (the old per-menu
+pattern) against one add_many per transaction, and per-user lookups through the
+repos with and without the connection's statement cache.
+
+Usage: python benchmarks/bench_repos.py [--users N] [--rows N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.db
+from src.db import connect_db, init_db
+from src.keys import DatabaseKey
+from src.repos import UserRepo, EmailRepo
+
+PASSPHRASE = "correct horse battery staple"
+
+def timed(label, fn, count):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:9.1f} ms  ({count / elapsed:,.0f}/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200, help="Users to create")
+    parser.add_argument('--rows', type=int, default=2000, help="Email rows inserted per mode")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        os.makedirs('data')
+        key = DatabaseKey.unlock(PASSPHRASE, src.db.DB_PATH)
+        init_db(key)
+        conn = connect_db(key)
+        users = UserRepo(conn)
+        user_ids = [users.add(first_name=f"First{i}", last_name=f"Last{i}") for i in range(args.users)]
+        conn.commit()
+        rows = [{'user_id': user_ids[i % len(user_ids)], 'email_address': f"user{i}@example.com", 'is_active': 1}
+                for i in range(args.rows)]
+        emails = EmailRepo(conn)
+
+        def one_by_one():
+            for row in rows:
+                conn.execute("INSERT INTO emails (user_id, email_address, source_site, is_active) VALUES (?, ?, ?, ?)",
+                             (row['user_id'], row['email_address'], None, row['is_active']))
+                conn.commit()
+
+        def batched():
+            emails.add_many(rows)
+            conn.commit()
+
+        timed("Insert + commit per row", one_by_one, len(rows))
+        timed("add_many, one commit", batched, len(rows))
+
+        lookups = user_ids * 5
+        timed("for_user lookups (statement cache)", lambda: [emails.for_user(user_id) for user_id in lookups], len(lookups))
+        conn.close()
+
+        src.db.STATEMENT_CACHE_SIZE = 0  # Re-prepare every statement
+        conn = connect_db(key)
+        emails = EmailRepo(conn)
+        timed("for_user lookups (no statement cache)", lambda: [emails.for_user(user_id) for user_id in lookups], len(lookups))
+        conn.close()
+
+if __name__ == "__main__":
+    main()
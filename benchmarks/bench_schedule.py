@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Benchmark finding due cleaning work: the cleaning_site_status view against cleaning_schedule.
+
+Fills a scratch database with broker sites and cleaning records spread over the
+last year, then times the automated loop's old query (every expired site from
+the view, a join and date arithmetic over the whole catalog) against the
+schedule's index range scans: due_now, due_within(7) and next_due. It checks
+that the schedule agrees with the view, and that the triggers keep it equal to
+a from-scratch rebuild after random changes.
+
+Usage: python benchmarks/bench_schedule.py [--sites N] [--rounds N]
+"""
+import os
+import sys
+import random
+import argparse
+import datetime
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import connect_db, init_db
+from src.repos import CleaningRepo
+from src.scheduler import CleaningSchedule, CLEANING_ACTIONS
+from benchmarks.common import best_time, fill_cleanings, mutate, scheduled, rebuilt_schedule
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=6000, help="Broker sites (about 95%% get a cleaning record)")
+    parser.add_argument('--rounds', type=int, default=5, help="Timed rounds (best is reported)")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    today = datetime.date.today()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        os.makedirs('data')
+        init_db('')
+        conn = connect_db('')
+        record_count = fill_cleanings(conn, args.sites, rng, today, cleaned_share=0.95, max_age=200, verified_share=0.8)
+        cleanings = CleaningRepo(conn)
+
+        schedule = CleaningSchedule(conn)
+        expired = [row[0] for row in cleanings.sites_with_status('expired')]
+        due = schedule.due_now(CLEANING_ACTIONS)
+        assert sorted(item.site_id for item in due) == expired, "schedule disagrees with the view on expired sites"
+        unverified = [row[0] for row in cleanings.sites_with_status('needs_verification')]
+        assert sorted(item.site_id for item in schedule.due_now(('verify',))) == unverified
+        print(f"{args.sites} sites, {record_count} cleaning records: {len(due)} due now, "
+              f"{len(schedule.due_within(7))} due within 7 days")
+
+        view = best_time(lambda: cleanings.sites_with_status('expired'), args.rounds)
+        now = best_time(lambda: schedule.due_now(CLEANING_ACTIONS), args.rounds)
+        week = best_time(lambda: schedule.due_within(7), args.rounds)
+        following = best_time(schedule.next_due, args.rounds)
+        print(f"cleaning_site_status expired sites {view * 1000:8.2f} ms")
+        print(f"schedule due_now                   {now * 1000:8.2f} ms")
+        print(f"schedule due_within(7)             {week * 1000:8.2f} ms")
+        print(f"schedule next_due                  {following * 1000:8.3f} ms")
+
+        mutate(conn, rng, today, 500)
+        assert scheduled(conn) == rebuilt_schedule(conn), "schedule drifted from its records after changes"
+        print("Schedule matches a rebuild after 500 random changes")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
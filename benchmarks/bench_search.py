@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Benchmark broker catalog search: the old LOWER(...) LIKE scan against the FTS5 index.
+
+Fills a scratch database with the fixture brokers repeated under distinct names, then
+times a few typical searches both ways.
+
+Usage: python benchmarks/bench_search.py [--copies N] [--rounds N]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import connect_db, init_db
+from src.repos import BrokerRepo
+from benchmarks.common import best_time
+
+FIXTURE_GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'workbook_sample.golden.json')
+QUERIES = ['acx', 'opt out', 'email', 'spokeo removal', 'zzznomatch']
+OLD_QUERY = """
+SELECT * FROM broker_sites
+WHERE LOWER(name) LIKE ? OR LOWER(url) LIKE ? OR LOWER(deletion_url) LIKE ?
+OR LOWER(privacy_policy) LIKE ? OR LOWER(contact) LIKE ?
+OR LOWER(requirements) LIKE ? OR LOWER(notes) LIKE ?
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--copies', type=int, default=500, help="Times the fixture brokers are repeated")
+    parser.add_argument('--rounds', type=int, default=5, help="Timed rounds per query (best is reported)")
+    args = parser.parse_args()
+
+    with open(FIXTURE_GOLDEN, 'r', encoding='utf-8') as f:
+        brokers = json.load(f)
+    entries = [dict(entry, name=f"{entry['name']} {copy}") for copy in range(args.copies) for entry in brokers]
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        os.makedirs('data')
+        init_db('')
+        conn = connect_db('')
+        brokers = BrokerRepo(conn)
+        brokers.upsert_many(entries)
+        conn.commit()
+        print(f"{len(entries)} broker sites")
+        cursor = conn.cursor()
+        for query in QUERIES:
+            like = best_time(lambda: cursor.execute(OLD_QUERY, (f'%{query}%',) * 7).fetchall(), args.rounds)
+            fts = best_time(lambda: brokers.search(query), args.rounds)
+            total = brokers.search(query)[0]
+            print(f"{query!r:<18} LIKE scan {like * 1000:8.2f} ms   FTS5 {fts * 1000:8.2f} ms  ({total} matches)")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Benchmark cleaning status counts: Python loop, cleaning_site_status view, trigger-kept summary.
+
+Fills a scratch database with broker sites and cleaning records spread over the
+last year, then times the old classification (fetch every record, parse its
+dates, bucket in Python, plus the untracked-sites subquery), one aggregate over
+the view, and the O(1) read of cleaning_status_summary. It then makes random
+changes (re-cleanings, verifications, deleted records, new and removed sites)
+and rewinds the summary a few weeks to time the daily aging pass, checking the
+summary against the view after each.
+
+Usage: python benchmarks/bench_status.py [--sites N] [--rounds N]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import connect_db, init_db
+from src.repos import CleaningRepo
+from benchmarks.common import best_time, fill_cleanings, mutate, python_counts, view_counts, rewind_summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=6000, help="Broker sites (about 80%% get a cleaning record)")
+    parser.add_argument('--rounds', type=int, default=5, help="Timed rounds (best is reported)")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    today = datetime.date.today()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        os.makedirs('data')
+        init_db('')
+        conn = connect_db('')
+        record_count = fill_cleanings(conn, args.sites, rng, today)
+        cleanings = CleaningRepo(conn)
+
+        expected = python_counts(conn, today)
+        counts = cleanings.status_counts()
+        print(f"{args.sites} sites, {record_count} cleaning records: {counts}")
+        assert view_counts(conn) == expected, f"view {view_counts(conn)} != python {expected}"
+        assert counts == expected, f"summary {counts} != python {expected}"
+        loop = best_time(lambda: python_counts(conn, today), args.rounds)
+        view = best_time(lambda: view_counts(conn), args.rounds)
+        summary = best_time(cleanings.status_counts, args.rounds)
+        print(f"Python loop + untracked subquery {loop * 1000:8.2f} ms")
+        print(f"cleaning_site_status aggregate   {view * 1000:8.2f} ms")
+        print(f"cleaning_status_summary read     {summary * 1000:8.3f} ms")
+
+        mutate(conn, rng, today, 500)
+        assert cleanings.status_counts() == view_counts(conn), "summary drifted from the view after changes"
+        for days in (1, 7, 45, 200):
+            rewind_summary(conn, (today - datetime.timedelta(days=days)).isoformat())
+            start = time.perf_counter()
+            counts = cleanings.status_counts()
+            elapsed = time.perf_counter() - start
+            conn.commit()
+            assert counts == view_counts(conn), f"aging {days} days gave {counts} != view {view_counts(conn)}"
+            print(f"Aging pass over {days:3d} days       {elapsed * 1000:8.3f} ms")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Benchmark unlocking an encrypted database and opening further connections.
+
+Creates an encrypted scratch database, then times opening connections with the
+passphrase (a full KDF run each) against one unlock followed by raw-key opens.
+
+Usage: python benchmarks/bench_unlock.py [--connections N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import connect_db, init_db
+from src.keys import DatabaseKey
+
+PASSPHRASE = "correct horse battery staple"
+
+def open_and_read(key, db_path):
+    """Open a connection and force the key to be checked with a first read."""
+    conn = connect_db(key, db_path)
+    conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    return conn
+
+def time_opens(key, db_path, count):
+    """Return per-connection open times in seconds for count connections kept open together."""
+    timings = []
+    conns = []
+    for _ in range(count):
+        start = time.perf_counter()
+        conns.append(open_and_read(key, db_path))
+        timings.append(time.perf_counter() - start)
+    for conn in conns:
+        conn.close()
+    return timings
+
+def report(label, timings):
+    print(f"{label:<28} first {timings[0] * 1000:8.2f} ms  median {statistics.median(timings) * 1000:8.3f} ms  "
+          f"last (#{len(timings)}) {timings[-1] * 1000:8.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=10, help="Connections opened per mode")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)  # init_db logs under data/
+        os.makedirs('data')
+        db_path = os.path.join('data', 'pii_data.db')
+        init_db(DatabaseKey.unlock(PASSPHRASE, db_path))
+
+        report("Passphrase per connection", time_opens(PASSPHRASE, db_path, args.connections))
+
+        start = time.perf_counter()
+        key = DatabaseKey.unlock(PASSPHRASE, db_path)
+        print(f"{'Unlock (one KDF run)':<28} {(time.perf_counter() - start) * 1000:8.2f} ms")
+        report("Raw key per connection", time_opens(key, db_path, args.connections))
+
+if __name__ == "__main__":
+    main()
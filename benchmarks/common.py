@@ -0,0 +1,125 @@
+"""Scratch data and timing helpers shared by the benchmarks and tests/."""
+import io
+import time
+import datetime
+import contextlib
+from unittest import mock
+from src.repos import BrokerRepo, CleaningRepo, CleaningRunRepo
+from src.migrations import cleaning_status_case, cleaning_schedule_columns
+from src.cleaning import cleaning
+
+STATUSES = ('clean', 'expired', 'needs_verification')
+
+def best_time(fn, rounds):
+    """Run fn rounds times; returns the fastest run in seconds."""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def fill_cleanings(conn, sites, rng, today, cleaned_share=0.8, max_age=400, verified_share=0.6):
+    """Add broker sites, cleaning cleaned_share of them on random days in the last max_age
+    days (verified_share of those verified up to 20 days later); returns the record count."""
+    BrokerRepo(conn).add_many({'name': f"Broker {i}", 'url': f"https://broker{i}.example"} for i in range(sites))
+    records = []
+    for site_id in range(1, sites + 1):
+        if rng.random() < cleaned_share:
+            cleaned = today - datetime.timedelta(days=rng.randrange(max_age))
+            verified = cleaned + datetime.timedelta(days=rng.randrange(20)) if rng.random() < verified_share else None
+            records.append((site_id, f"Broker {site_id - 1}", cleaned.isoformat(),
+                            verified.isoformat() if verified and verified <= today else None))
+    CleaningRepo(conn).record_many(records)
+    conn.commit()
+    return len(records)
+
+def mutate(conn, rng, today, changes):
+    """Apply random re-cleanings, verifications, record deletes and site adds/deletes."""
+    brokers, cleanings = BrokerRepo(conn), CleaningRepo(conn)
+    for _ in range(changes):
+        site_id = rng.choice(brokers.names())[0]
+        action = rng.random()
+        if action < 0.4:
+            cleaned = today - datetime.timedelta(days=rng.randrange(60))
+            cleanings.record(site_id, brokers.name_of(site_id), cleaned.isoformat())
+        elif action < 0.7:
+            cleanings.confirm_deleted(site_id, (today - datetime.timedelta(days=rng.randrange(300))).isoformat())
+        elif action < 0.85:
+            conn.execute("DELETE FROM cleaning_records WHERE site_id = ?", (site_id,))
+        elif action < 0.95:
+            brokers.add(name=f"New broker {rng.random()}")
+        else:
+            conn.execute("DELETE FROM cleaning_records WHERE site_id = ?", (site_id,))
+            brokers.delete(site_id)
+    conn.commit()
+
+def python_counts(conn, today):
+    """The classification cleaning.py did in Python before the cleaning_site_status view."""
+    counts = dict.fromkeys(STATUSES, 0)
+    for _, site_id, _, date_cleaned, date_confirmed_deleted in CleaningRepo(conn).all():
+        cleaned_date = datetime.date.fromisoformat(date_cleaned) if date_cleaned else None
+        verified_date = datetime.date.fromisoformat(date_confirmed_deleted) if date_confirmed_deleted else None
+        if verified_date:
+            counts['clean' if (today - verified_date).days <= 183 else 'expired'] += 1
+        elif cleaned_date:
+            counts['clean' if (today - cleaned_date).days <= 30 else 'needs_verification'] += 1
+        else:
+            counts['expired'] += 1
+    counts['expired'] += conn.execute(
+        "SELECT COUNT(*) FROM broker_sites WHERE site_id NOT IN (SELECT site_id FROM cleaning_records)").fetchone()[0]
+    return counts
+
+def view_counts(conn):
+    """Site counts per status aggregated over the cleaning_site_status view."""
+    counts = dict.fromkeys(STATUSES, 0)
+    counts.update(conn.execute("SELECT status, COUNT(*) FROM cleaning_site_status GROUP BY status").fetchall())
+    return counts
+
+def rewind_summary(conn, as_of):
+    """Recount the summary as it stood on the day as_of, as if it was last aged then."""
+    status = cleaning_status_case('cr.date_cleaned', 'cr.date_confirmed_deleted', '?')
+    conn.execute("UPDATE cleaning_status_summary SET site_count = 0, as_of = ?", (as_of,))
+    for name, count in conn.execute(f"""
+        SELECT COALESCE({status}, 'expired'), COUNT(*) FROM broker_sites bs
+        LEFT JOIN cleaning_records cr ON cr.site_id = bs.site_id GROUP BY 1""", (as_of,) * status.count('?')).fetchall():
+        conn.execute("UPDATE cleaning_status_summary SET site_count = ? WHERE status = ?", (count, name))
+
+def scheduled(conn):
+    """The cleaning_schedule rows, by site."""
+    return conn.execute("SELECT site_id, action, next_action_at FROM cleaning_schedule ORDER BY site_id").fetchall()
+
+def rebuilt_schedule(conn):
+    """The schedule as migration 8 would fill it from the current records."""
+    return conn.execute(f"""
+    SELECT bs.site_id, {cleaning_schedule_columns('cr.date_cleaned', 'cr.date_confirmed_deleted')}
+    FROM broker_sites bs LEFT JOIN cleaning_records cr ON cr.site_id = bs.site_id ORDER BY bs.site_id
+    """).fetchall()
+
+class _Browser:
+    def open_new_tab(self, url):
+        return True
+
+def automated_pass(session, outcomes, resume=False):
+    """Drive the automated cleaning pass through its prompts; returns the COMMITs it issued.
+
+    outcomes holds one answer per site ('c' cleaned, 'f' failed clean, 'v', 's', or 'e' to
+    stop there); an unfinished earlier run is resumed or closed as resume says. The menu
+    prompts around the pass are answered too and all output is dropped.
+    """
+    answers = ['2']
+    if CleaningRunRepo(session.conn).current():
+        answers.append('y' if resume else 'n')
+    for outcome in outcomes:
+        answers += {'c': ['c', 'y'], 'f': ['c', 'n']}.get(outcome, [outcome])
+    answers.append('6')
+    statements = []
+    session.conn.set_trace_callback(statements.append)
+    try:
+        with mock.patch('builtins.input', side_effect=answers), \
+                mock.patch('webbrowser.get', return_value=_Browser()), contextlib.redirect_stdout(io.StringIO()):
+            cleaning(session)
+    finally:
+        session.conn.set_trace_callback(None)
+    return statements.count('COMMIT')
@@ -6,28 +6,25 @@ import datetime
 import sqlite3  # For unencrypted DB checks and unencrypted init
 import signal  # For Ctrl+C trap
 import logging  # For debug logging
-import shutil  # For DB copy in backups
-from src.main import DataDeleteConsole  # Import the CLI class
-import sqlcipher3  # For encrypted operations (rekey)
+import sqlcipher3  # For encryption errors
+from src.reencrypt import reencrypt_database
+from src.backup import BackupStore
 
 # Ctrl+C handler
 def signal_handler(sig, frame):
     print("ctrl+c detected; attempting to close GHOSTWIPE gracefully.")
     sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
-
-# Clear screen at launch for clean UI
-os.system('clear')
-
-# Setup debug logging if --debug flag (file-only, no console)
-if '--debug' in sys.argv:
+def setup_debug_logging():
+    """Setup debug logging if --debug flag (file-only, no console)."""
     debug_dir = os.path.join('data', 'debug')
     os.makedirs(debug_dir, exist_ok=True)
     timestamp = datetime.datetime.now().strftime("%y-%m-%d %H:%M:%S")
     log_file = os.path.join(debug_dir, f"{timestamp} DebugLog")
     logging.basicConfig(filename=log_file, level=logging.DEBUG, format='%(asctime)s %(levelname)s: %(message)s')
     logging.debug("Developer mode enabled. Logging started.")
+    sys.stdout = Tee(sys.stdout)
+    sys.stderr = Tee(sys.stderr)
 
 class Tee(object):
     """Redirect stdout/stderr to logger if debug mode (skip empty lines)."""
@@ -44,10 +41,6 @@ class Tee(object):
     def flush(self):
         self.stream.flush()
 
-if '--debug' in sys.argv:
-    sys.stdout = Tee(sys.stdout)
-    sys.stderr = Tee(sys.stderr)
-
 def log_debug(message):
     if '--debug' in sys.argv:
         logging.debug(message)
@@ -72,65 +65,39 @@ def is_db_encrypted(db_path):
         return True  # Encrypted if access fails without key
 
 def encrypt_existing_db(db_path, passphrase):
-    """Encrypt an existing unencrypted DB using rekey."""
-    conn = sqlcipher3.connect(db_path)
+    """Encrypt an existing unencrypted DB by exporting it into an encrypted copy, then swapping it in.
+
+    Uses the configured cipher settings (src/keys.py), recorded so the passphrase opens the result.
+    """
+    def progress(done, total):
+        print(f"\rEncrypting: {done * 100 // max(total, 1)}%", end='')
     try:
-        key_hex = passphrase.encode('utf-8').hex()
-        conn.execute(f'PRAGMA rekey = "x\'{key_hex}\'"')  # Encrypt with new key as raw hex blob with proper quoting
-        conn.execute("PRAGMA kdf_iter = 640000")  # Set high iterations
-        conn.commit()
-        print("Database encrypted successfully.")
+        reencrypt_database(db_path, None, passphrase, progress=progress)
+        print("\nDatabase encrypted successfully.")
         log_debug("Database encrypted successfully.")
-    except sqlcipher3.Error as e:
+    except (sqlcipher3.Error, RuntimeError) as e:
+        print()
         log_debug(f"Encryption error: {e}")
         raise
+
+def make_backup(db_path, label='manual'):
+    """Snapshot the database into the deduplicating backup store (data/backups); returns the snapshot id."""
+    # Only unencrypted databases reach here; the read transaction keeps the snapshot consistent
+    conn = sqlite3.connect(db_path)
+    try:
+        store = BackupStore()
+        manifest = store.snapshot(conn, db_path, label)
+        store.prune()
     finally:
         conn.close()
-
-def make_backup(db_path, base_backup_name='pii_data.db.bak'):
-    """Make a rotating backup, prompting for overwrite if base exists."""
-    today = datetime.datetime.now().strftime("%y%m%d")
-    base_backup_filename = f"{today}.{base_backup_name}"
-    base_backup_path = os.path.join('data', base_backup_filename)
-
-    if os.path.exists(base_backup_path):
-        overwrite = input("Overwrite existing backup? (y/N): ").lower()
-        log_input("Overwrite existing backup? (y/N): ", overwrite)
-        if overwrite == '' or overwrite == 'n':
-            # Preserve with rotating numbers (lowest most recent)
-            i = 1
-            while True:
-                rot_backup_filename = f"{today}.{base_backup_name}.{i}"
-                rot_backup_path = os.path.join('data', rot_backup_filename)
-                if not os.path.exists(rot_backup_path):
-                    break
-                i += 1
-            # Shift existing backups up
-            j = i
-            while j > 1:
-                prev_rot = os.path.join('data', f"{today}.{base_backup_name}.{j-1}")
-                curr_rot = os.path.join('data', f"{today}.{base_backup_name}.{j}")
-                os.rename(prev_rot, curr_rot)
-                j -= 1
-            # Rename base to .2 if i>1
-            if i > 1:
-                os.rename(base_backup_path, os.path.join('data', f"{today}.{base_backup_name}.2"))
-            # New backup as .1
-            backup_path = os.path.join('data', f"{today}.{base_backup_name}.1")
-        else:
-            # Overwrite base
-            backup_path = base_backup_path
-    else:
-        backup_path = base_backup_path
-
-    shutil.copy(db_path, backup_path)  # Copy for option 1 preservation
-    print(f"Backed up old DB to full path: {os.path.abspath(backup_path)}.")
-    log_debug(f"Backed up DB to {os.path.abspath(backup_path)}.")
-    return backup_path
+    print(f"Backed up old DB as snapshot {manifest['id']} in {os.path.abspath(store.root)} "
+          f"(restore with 'backup restore {manifest['id']} <path>').")
+    log_debug(f"Backed up DB as snapshot {manifest['id']}.")
+    return manifest['id']
 
 def backup_and_create_new(db_path):
     """Backup old DB and prompt for new encrypted one."""
-    backup_path = make_backup(db_path)
+    make_backup(db_path, 'pre_new')
     while True:
         passphrase = getpass.getpass("Enter a strong password for new DB: ")
         confirm_passphrase = getpass.getpass("Confirm password: ")
@@ -147,8 +114,7 @@ def backup_and_create_new(db_path):
         log_input("Try again? (Y/n): ", retry)
         if retry == 'n':
             os.system('clear')  # Clear screen before revert message
-            os.rename(backup_path, db_path)
-            print(f"Reverting database file to {os.path.abspath(db_path)}")
+            print(f"Keeping existing database file at {os.path.abspath(db_path)}")
             print()  # Newline for readability
             return None  # Return to menu
         # Default to Y on enter or other inputs
@@ -156,7 +122,7 @@ def backup_and_create_new(db_path):
 def unencrypt_db(db_path):
     """Hidden dev command: Backup, create new unencrypted DB, proceed without password."""
     if os.path.exists(db_path):
-        make_backup(db_path)
+        make_backup(db_path, 'pre_unencrypt')
     from src.db import init_db  # Import here to avoid circular imports if needed
     init_db('')  # Call db.py to create unencrypted DB
     print("New unencrypted DB created for dev mode.")
@@ -170,6 +136,13 @@ def handle_encryption_error(e):
     print("Returning to main menu.")
 
 if __name__ == "__main__":
+    # Launch-time side effects live here: PDF extraction workers re-import this module as __mp_main__
+    from src.main import DataDeleteConsole  # Import the CLI class
+    signal.signal(signal.SIGINT, signal_handler)
+    os.system('clear')  # Clear screen at launch for clean UI
+    if '--debug' in sys.argv:
+        setup_debug_logging()
+
     db_path = os.path.join('data', 'pii_data.db')
     if not os.path.exists(db_path):
         print("First-time setup: No database found.")
@@ -201,7 +174,7 @@ if __name__ == "__main__":
                     break
                 elif choice == '1':
                     # Backup before encryption (copy, not move)
-                    make_backup(db_path, 'pre_encrypt.bak')
+                    make_backup(db_path, 'pre_encrypt')
                     passphrase = getpass.getpass("Enter a strong password: ")
                     confirm_passphrase = getpass.getpass("Confirm password: ")
                     log_input("Enter a strong password: ", "[masked]")
@@ -211,7 +184,7 @@ if __name__ == "__main__":
                         sys.exit(1)
                     try:
                         encrypt_existing_db(db_path, passphrase)
-                    except sqlcipher3.Error as e:
+                    except (sqlcipher3.Error, RuntimeError) as e:
                         handle_encryption_error(e)
                         continue  # Return to menu on error
                     break
@@ -1,23 +1,15 @@
-import sqlite3
-import sqlcipher3
-import os
 import signal
+from src.repos import AddressRepo
 
 def signal_handler(sig, frame):
     """Handle Ctrl+S to skip input."""
     raise KeyboardInterrupt
 
-def modify_addresses(passphrase, user_id):
+def modify_addresses(session, user_id):
     """Modify address information for a specific user_id."""
-    db_path = os.path.join('data', 'pii_data.db')
-    conn = None
+    conn = session.conn
     try:
-        conn = sqlcipher3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA key = '{passphrase}'")
-        cursor.execute("PRAGMA kdf_iter = 64000")
-        cursor.execute("PRAGMA cipher_page_size = 4096")
-        cursor.execute("PRAGMA foreign_keys = ON")
+        repo = AddressRepo(conn)
         
         while True:
             print("\nAddress Options:")
@@ -61,22 +53,18 @@ def modify_addresses(passphrase, user_id):
                     print("All address fields (street, city, state, ZIP) are required.")
                     continue
                 
-                cursor.execute("""
-                INSERT INTO addresses (user_id, street, city, state, zip, is_current)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """, (user_id, street, city, state, zip_code, is_current))
+                repo.add(user_id=user_id, street=street, city=city, state=state, zip=zip_code, is_current=is_current)
                 conn.commit()
                 print("Address added.")
             
             elif choice == '2':
-                cursor.execute("SELECT address_id, street, city, state, zip, is_current FROM addresses WHERE user_id = ?", (user_id,))
-                addresses = cursor.fetchall()
+                addresses = repo.for_user(user_id)
                 if not addresses:
                     print("No addresses found for this user.")
                 else:
                     print("\nAddresses:")
                     for addr in addresses:
-                        address_id, street, city, state, zip_code, is_current = addr
+                        address_id, _, street, city, state, zip_code, is_current = addr
                         print(f"Address ID: {address_id}")
                         print(f"Street: {street}")
                         print(f"City: {city}")
@@ -86,22 +74,20 @@ def modify_addresses(passphrase, user_id):
                         print()
             
             elif choice == '3':
-                cursor.execute("SELECT address_id, street, city FROM addresses WHERE user_id = ?", (user_id,))
-                addresses = cursor.fetchall()
+                addresses = repo.for_user(user_id)
                 if not addresses:
                     print("No addresses found for this user.")
                     continue
                 print("\nAddresses:")
                 for addr in addresses:
-                    address_id, street, city = addr
+                    address_id, street, city = addr.address_id, addr.street, addr.city
                     print(f"Address ID: {address_id}, {street}, {city}")
                 try:
                     address_id = int(input("Enter address_id to delete: ").strip())
-                    cursor.execute("SELECT 1 FROM addresses WHERE address_id = ? AND user_id = ?", (address_id, user_id))
-                    if not cursor.fetchone():
+                    if not repo.owned_by(address_id, user_id):
                         print(f"No address found with address_id {address_id} for this user.")
                         continue
-                    cursor.execute("DELETE FROM addresses WHERE address_id = ?", (address_id,))
+                    repo.delete(address_id)
                     conn.commit()
                     print(f"Address ID {address_id} deleted.")
                 except ValueError:
@@ -114,6 +100,3 @@ def modify_addresses(passphrase, user_id):
     
     except Exception as e:
         print(f"Error managing addresses: {e}")
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -0,0 +1,356 @@
+import os
+import json
+import time
+import hashlib
+import datetime
+import threading
+import logging
+from src.db import connect_db
+from src.config import get_int_setting
+from src.keys import CipherSettings, read_salt, read_cipher_settings, write_cipher_settings
+
+BACKUP_DIR = os.path.join('data', 'backups')
+BACKUP_PAGES = 256  # Pages copied per backup step (1 MiB at the 4096-byte cipher page size)
+BACKUP_RESTARTS = 3  # Steps without progress (restarts by other connections' writes) before copying in one step
+CHUNK_SIZE = 64 * 1024  # Store chunk size: a whole number of database pages, so unchanged pages dedupe
+SNAPSHOT_FORMAT = 1
+KEEP_LAST = 5
+KEEP_DAILY = 7
+KEEP_MONTHLY = 12
+logger = logging.getLogger(__name__)
+
+class BackupRestarted(Exception):
+    """Raised from the progress callback to stop a stepped backup that keeps restarting."""
+
+def backup_database(conn, target_path, key=None, pages=BACKUP_PAGES, progress=None):
+    """Copy the database behind conn to target_path with the online backup API.
+
+    The copy is taken in steps of pages pages; the source is only read-locked during
+    a step, so other connections keep reading and writing in between. A write from
+    another connection restarts the copy, so the result is always consistent; after
+    BACKUP_RESTARTS restarts the whole copy is taken in one step instead, briefly
+    holding off writers rather than never finishing. The target is keyed with the
+    same DatabaseKey (key and salt) as the source, so the same passphrase opens it;
+    key is None for an unencrypted database. It is written to a .part file, checked
+    and then moved into place. progress(remaining, total) is called after each step.
+    Returns the number of pages copied.
+    """
+    partial_path = target_path + '.part'
+    os.makedirs(os.path.dirname(os.path.abspath(target_path)), exist_ok=True)
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    total_pages = 0
+    restarts = 0
+    last_remaining = None
+
+    def step(status, remaining, total):
+        nonlocal total_pages, restarts, last_remaining
+        total_pages = total
+        if last_remaining is not None and remaining >= last_remaining:
+            restarts += 1
+            if restarts >= BACKUP_RESTARTS:
+                raise BackupRestarted()
+        last_remaining = remaining
+        if progress:
+            progress(remaining, total)
+
+    target = connect_db(key, partial_path)
+    try:
+        try:
+            conn.backup(target, pages=pages, progress=step)
+        except BackupRestarted:
+            logger.info("Backup restarted %d times by concurrent writes; copying in one step", restarts)
+            conn.backup(target, pages=-1)
+            if progress:
+                progress(0, total_pages)
+        result = target.execute("PRAGMA quick_check").fetchone()[0]
+        if result != 'ok':
+            raise RuntimeError(f"Backup failed its integrity check: {result}")
+    except BaseException:
+        target.close()
+        os.remove(partial_path)
+        raise
+    target.close()
+    if key:
+        write_cipher_settings(target_path, key.salt, key.settings, keep_salts=())
+    os.replace(partial_path, target_path)
+    logger.info("Backed up %d pages to %s", total_pages, target_path)
+    return total_pages
+
+class BackupStore:
+    """Content-addressed backup snapshots of the database file under data/backups.
+
+    A snapshot is the raw database file (still encrypted, exactly as on disk) split
+    into CHUNK_SIZE chunks. Each chunk is stored once under chunks/ by its SHA-256;
+    the snapshot itself is a small JSON manifest under snapshots/ listing its chunks.
+    SQLCipher only rewrites the pages that change, so a snapshot of a mostly unchanged
+    database adds just the chunks holding those pages. (The online backup API can't
+    be used here: it re-encrypts every page with a fresh IV, so nothing would dedupe.)
+    """
+    def __init__(self, root=BACKUP_DIR):
+        self.root = root
+        self.chunk_dir = os.path.join(root, 'chunks')
+        self.snapshot_dir = os.path.join(root, 'snapshots')
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def snapshot_path(self, snapshot_id):
+        return os.path.join(self.snapshot_dir, f"{snapshot_id}.json")
+
+    def snapshot(self, conn, db_path, label='manual'):
+        """Store a consistent snapshot of the database at db_path; returns its manifest.
+
+        conn is any connection to that database: it holds a read transaction while
+        the file is read, so no commit can change the file half-way through (writers
+        wait, for about as long as it takes to read the file).
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        now = datetime.datetime.now()
+        snapshot_id = now.strftime("%Y%m%d-%H%M%S-%f")
+        file_hash = hashlib.sha256()
+        chunks = []
+        new_chunks = new_bytes = size = 0
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN")
+        try:
+            conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # Takes the shared lock
+            user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            salt = read_salt(db_path)
+            with open(db_path, 'rb') as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest = hashlib.sha256(chunk).hexdigest()
+                    file_hash.update(chunk)
+                    chunks.append(digest)
+                    size += len(chunk)
+                    if self._store_chunk(digest, chunk):
+                        new_chunks += 1
+                        new_bytes += len(chunk)
+        finally:
+            conn.rollback()
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'id': snapshot_id,
+            'label': label,
+            'created_at': now.isoformat(timespec='seconds'),
+            'size': size,
+            'sha256': file_hash.hexdigest(),
+            'user_version': user_version,
+            'cipher': read_cipher_settings(db_path, salt)._asdict() if salt else None,
+            'chunk_size': CHUNK_SIZE,
+            'chunks': chunks,
+            'new_chunks': new_chunks,
+            'new_bytes': new_bytes,
+        }
+        path = self.snapshot_path(snapshot_id)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+        logger.info("Backup snapshot %s: %d bytes, %d of %d chunks new (%d bytes)",
+                    snapshot_id, size, new_chunks, len(chunks), new_bytes)
+        return manifest
+
+    def _store_chunk(self, digest, chunk):
+        """Write a chunk unless it is already stored; returns True if it was new."""
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(chunk)
+        os.replace(path + '.tmp', path)
+        return True
+
+    def snapshots(self):
+        """Return every snapshot manifest, oldest first."""
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        manifests = []
+        for name in sorted(os.listdir(self.snapshot_dir)):
+            if name.endswith('.json'):
+                manifests.append(self.load(name[:-len('.json')]))
+        return manifests
+
+    def load(self, snapshot_id):
+        """Load one snapshot manifest (KeyError if there is none with that id)."""
+        path = self.snapshot_path(snapshot_id)
+        if not os.path.exists(path):
+            raise KeyError(f"No backup snapshot {snapshot_id}")
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported backup snapshot format {manifest.get('format')!r} in {path}")
+        return manifest
+
+    def restore(self, snapshot_id, target_path):
+        """Reassemble a snapshot into target_path (checked against its SHA-256, then moved into place)."""
+        manifest = self.load(snapshot_id)
+        partial_path = target_path + '.part'
+        os.makedirs(os.path.dirname(os.path.abspath(target_path)), exist_ok=True)
+        file_hash = hashlib.sha256()
+        try:
+            with open(partial_path, 'wb') as out:
+                for digest in manifest['chunks']:
+                    with open(self.chunk_path(digest), 'rb') as f:
+                        chunk = f.read()
+                    if hashlib.sha256(chunk).hexdigest() != digest:
+                        raise ValueError(f"Backup chunk {digest} is corrupt")
+                    file_hash.update(chunk)
+                    out.write(chunk)
+            if file_hash.hexdigest() != manifest['sha256']:
+                raise ValueError(f"Restored snapshot {snapshot_id} does not match its SHA-256")
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        if manifest.get('cipher'):  # So the passphrase opens it with the settings it was made with
+            write_cipher_settings(target_path, read_salt(partial_path), CipherSettings(**manifest['cipher']))
+        os.replace(partial_path, target_path)
+        return manifest
+
+    def prune(self, keep_last=None, keep_daily=None, keep_monthly=None, today=None):
+        """Apply the retention policy, then delete chunks no snapshot uses; returns (snapshots, chunks) deleted.
+
+        Keeps the keep_last newest snapshots, plus the newest snapshot of each of the
+        last keep_daily calendar days and keep_monthly calendar months, counted back
+        from today (included) whether or not a backup was taken on them.
+        """
+        keep_last = get_int_setting('backup_keep_last', KEEP_LAST) if keep_last is None else keep_last
+        keep_daily = get_int_setting('backup_keep_daily', KEEP_DAILY) if keep_daily is None else keep_daily
+        keep_monthly = get_int_setting('backup_keep_monthly', KEEP_MONTHLY) if keep_monthly is None else keep_monthly
+        today = today or datetime.date.today()
+        first_day = (today - datetime.timedelta(days=keep_daily - 1)).isoformat()
+        first_month = today.year * 12 + today.month - keep_monthly  # Months since year 0, zero-based
+        first_month = f"{first_month // 12:04d}-{first_month % 12 + 1:02d}"
+        manifests = self.snapshots()[::-1]  # Newest first
+        keep = {manifest['id'] for manifest in manifests[:max(1, keep_last)]}
+        # created_at prefixes: YYYY-MM-DD, YYYY-MM
+        for period, count, first in ((10, keep_daily, first_day), (7, keep_monthly, first_month)):
+            seen = set()
+            for manifest in manifests:
+                bucket = manifest['created_at'][:period]
+                if count > 0 and bucket >= first and bucket not in seen:
+                    seen.add(bucket)
+                    keep.add(manifest['id'])
+        removed = [manifest for manifest in manifests if manifest['id'] not in keep]
+        for manifest in removed:
+            os.remove(self.snapshot_path(manifest['id']))
+        used = {digest for manifest in manifests if manifest['id'] in keep for digest in manifest['chunks']}
+        removed_chunks = 0
+        if os.path.isdir(self.chunk_dir):
+            for prefix in os.listdir(self.chunk_dir):
+                directory = os.path.join(self.chunk_dir, prefix)
+                for name in os.listdir(directory):
+                    if name not in used:
+                        os.remove(os.path.join(directory, name))
+                        removed_chunks += 1
+        if removed:
+            logger.info("Pruned %d backup snapshots and %d chunks", len(removed), removed_chunks)
+        return len(removed), removed_chunks
+
+    def disk_usage(self):
+        """Return the bytes used by stored chunks."""
+        total = 0
+        if os.path.isdir(self.chunk_dir):
+            for prefix in os.listdir(self.chunk_dir):
+                directory = os.path.join(self.chunk_dir, prefix)
+                total += sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        return total
+
+class BackgroundBackup:
+    """Take a backup on a background thread with its own session connection.
+
+    Without a path the backup is a BackupStore snapshot (followed by a prune);
+    with one it is a full copy made by backup_database.
+    """
+    def __init__(self, session, store=None):
+        self.session = session
+        self.store = store or BackupStore()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.state = 'idle'  # idle, running, done, failed
+        self.path = None
+        self.remaining = None
+        self.total = None
+        self.result = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.announced = True
+
+    def start(self, path=None):
+        """Start a snapshot (or a full copy to path) unless a backup is running; return True if started."""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return False
+            self.state = 'running'
+            self.path = path
+            self.remaining = self.total = None
+            self.result = self.error = None
+            self.started_at = time.monotonic()
+            self.finished_at = None
+            self.announced = False
+            self.thread = threading.Thread(target=self._run, name='backup', daemon=True)
+            self.thread.start()
+            return True
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def wait(self, timeout=None):
+        """Block until the current backup finishes (or timeout); return True if finished."""
+        if self.thread:
+            self.thread.join(timeout)
+        return not self.is_running()
+
+    def _run(self):
+        try:
+            conn = self.session.connection('backup')
+            if self.path:
+                result = backup_database(conn, self.path, self.session.key, progress=self._progress)
+            else:
+                result = self.store.snapshot(conn, self.session.db_path)
+                self.store.prune()
+            state = 'done'
+        except Exception as e:
+            logger.error("Backup failed: %s", e)
+            self.error = e
+            state = 'failed'
+        with self.lock:
+            self.state = state
+            if state == 'done':
+                self.result = result
+            self.finished_at = time.monotonic()
+
+    def _progress(self, remaining, total):
+        with self.lock:
+            self.remaining = remaining
+            self.total = total
+
+    def status_line(self):
+        """Return a one-line description of the backup state."""
+        with self.lock:
+            if self.state == 'idle':
+                return "Backup: none taken this session."
+            if self.state == 'running':
+                elapsed = time.monotonic() - self.started_at
+                detail = f"page {self.total - self.remaining}/{self.total}" if self.total else "reading"
+                return f"Backup: running ({detail}, {elapsed:.0f}s)."
+            elapsed = self.finished_at - self.started_at
+            if self.state == 'failed':
+                return f"Backup: failed after {elapsed:.1f}s: {self.error}"
+            if self.path:
+                return f"Backup: copied to {os.path.abspath(self.path)} in {elapsed:.1f}s ({self.result} pages)."
+            return (f"Backup: snapshot {self.result['id']} stored in {elapsed:.1f}s "
+                    f"({self.result['new_bytes'] // 1024} KiB new of {self.result['size'] // 1024} KiB).")
+
+    def take_announcement(self):
+        """Return the status line once after a backup finishes, else None."""
+        if self.is_running() or self.announced or self.state == 'idle':
+            return None
+        self.announced = True
+        return self.status_line()
@@ -0,0 +1,52 @@
+import os
+import json
+import gzip
+import datetime
+
+SNAPSHOT_DIR = os.path.join('data', 'catalog')
+SNAPSHOT_FORMAT = 1
+BROKER_FIELDS = ('name', 'url', 'deletion_url', 'privacy_policy', 'contact', 'requirements', 'notes', 'last_updated')
+
+def snapshot_path(workbook_sha256):
+    """Return the cache path of the parsed-catalog snapshot for a workbook hash."""
+    return os.path.join(SNAPSHOT_DIR, f"{workbook_sha256}.json.gz")
+
+def save_snapshot(path, entries, workbook_sha256, workbook_date):
+    """Write parsed broker entries to a gzip-compressed JSON snapshot (atomically).
+
+    Entries are stored as rows in BROKER_FIELDS order rather than as dicts to keep it compact.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    snapshot = {
+        'format': SNAPSHOT_FORMAT,
+        'workbook_sha256': workbook_sha256,
+        'workbook_date': workbook_date,
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'fields': list(BROKER_FIELDS),
+        'entries': [[entry.get(field) for field in BROKER_FIELDS] for entry in entries],
+    }
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return len(snapshot['entries'])
+
+def load_snapshot(path):
+    """Load a snapshot; returns its metadata dict with 'entries' as a list of entry dicts."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        snapshot = json.load(f)
+    if snapshot.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported catalog snapshot format {snapshot.get('format')!r} in {path}")
+    fields = snapshot['fields']
+    unknown = set(fields) - set(BROKER_FIELDS)
+    if 'name' not in fields or unknown:
+        raise ValueError(f"Catalog snapshot {path} has unexpected fields: {sorted(unknown) or fields}")
+    snapshot['entries'] = [dict(zip(fields, row)) for row in snapshot['entries']]
+    return snapshot
+
+def find_snapshot(workbook_sha256):
+    """Return the cached snapshot path for a workbook hash, or None."""
+    if not workbook_sha256:
+        return None
+    path = snapshot_path(workbook_sha256)
+    return path if os.path.exists(path) else None
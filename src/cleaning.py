@@ -1,45 +1,111 @@
 import sqlite3
-import sqlcipher3
-import os
 import datetime
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor
+from src.config import get_int_setting
+from src.repos import BrokerRepo, CleaningRepo, CleaningRunRepo
+from src.scheduler import CleaningSchedule, CLEANING_ACTIONS
 
-def cleaning(passphrase):
+CLEANING_BATCH_SIZE = 10  # Deletion pages batch cleaning opens at once
+
+STATUS_LABELS = {'clean': "Clean", 'expired': "Expired", 'needs_verification': "Needs Verification"}
+STATUS_KEYS = {'c': 'clean', 'e': 'expired', 'n': 'needs_verification'}
+
+def print_status_counts(counts):
+    """Print the number of broker sites in each cleaning status."""
+    print("\nStatus Counts:")
+    for status, label in STATUS_LABELS.items():
+        print(f"{label}: {counts[status]}")
+
+def open_tab(url, label):
+    """Open url in a new Firefox tab; returns False (after saying so) if it couldn't."""
+    try:
+        webbrowser.get('firefox').open_new_tab(url)
+        return True
+    except webbrowser.Error:
+        print(f"Error opening Firefox. Please visit the {label} manually: {url}")
+        return False
+
+def batch_cleaning(session, cleanings):
+    """Work through the expired sites N at a time: open their deletion pages together,
+    take every outcome from one checklist line and record the batch in one transaction.
+
+    The next batch is read from the schedule on a separate connection while the operator
+    works through the current one, so it is ready as soon as the outcomes are in.
+    """
+    conn = session.conn
+    default_size = get_int_setting('cleaning_batch_size', CLEANING_BATCH_SIZE)
+    try:
+        batch_size = max(1, int(input(f"Sites per batch [{default_size}]: ").strip() or default_size))
+    except ValueError:
+        print("Invalid batch size. Please enter a number.")
+        return
+    schedule = CleaningSchedule(session.connection('cleaning-prefetch'))
+    today = datetime.date.today().isoformat()
+    totals = {'c': 0, 'v': 0, 's': 0}
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='cleaning-prefetch') as prefetch:
+        upcoming = prefetch.submit(schedule.due_now, CLEANING_ACTIONS, today, batch_size)
+        while True:
+            batch = upcoming.result()
+            if not batch:
+                print("No more expired sites to clean.")
+                break
+            upcoming = prefetch.submit(schedule.due_now, CLEANING_ACTIONS, today, batch_size, batch[-1])
+
+            print(f"\nBatch of {len(batch)} expired sites:")
+            for number, site in enumerate(batch, 1):
+                page = site.deletion_url if site.deletion_url and site.deletion_url != 'None' else site.url
+                opened = page and page != 'None' and open_tab(page, 'deletion page')
+                print(f"{number:3}. {site.name} (site_id: {site.site_id}) {page if page and page != 'None' else 'No URL'}"
+                      f"{'' if opened else ' [not opened]'}")
+
+            while True:
+                outcomes = input("\nOutcomes, one letter per site in order: (C)leaned, (V)erified, (S)kip; "
+                                 "one letter for all; (E)xit without recording this batch: ").strip().lower()
+                outcomes = outcomes * len(batch) if len(outcomes) == 1 and outcomes != 'e' else outcomes
+                if outcomes == 'e' or (len(outcomes) == len(batch) and set(outcomes) <= set(totals)):
+                    break
+                print(f"Please enter {len(batch)} letters from C, V and S (or one letter for the whole batch), or E.")
+            if outcomes == 'e':
+                print("Exiting batch cleaning; this batch was not recorded.")
+                break
+
+            records = [(site.site_id, site.name, today, today if outcome == 'v' else None)
+                       for site, outcome in zip(batch, outcomes) if outcome != 's']
+            cleanings.record_many(records)
+            conn.commit()  # The whole batch in one transaction
+            for outcome in outcomes:
+                totals[outcome] += 1
+            print(f"Recorded {outcomes.count('c')} cleaned, {outcomes.count('v')} verified, "
+                  f"{outcomes.count('s')} skipped.")
+    print(f"Batch cleaning: {totals['c']} cleaned, {totals['v']} verified, {totals['s']} skipped.")
+
+def cleaning(session):
     """Manage cleaning requests for broker sites."""
-    db_path = os.path.join('data', 'pii_data.db')
-    conn = None
+    conn = session.conn
     try:
-        conn = sqlcipher3.connect(db_path)
-        cursor = conn.cursor()
-        if passphrase:
-            conn.execute(f"PRAGMA key = '{passphrase}'")
-            conn.execute("PRAGMA kdf_iter = 64000")
-            conn.execute("PRAGMA cipher_page_size = 4096")
-        conn.execute("PRAGMA foreign_keys = ON")
+        brokers = BrokerRepo(conn)
+        cleanings = CleaningRepo(conn)
         
         while True:
             print("\nCleaning Options:")
             print("1: Add cleaning request")
             print("2: Automated cleaning")
-            print("3: Confirm deletion")
-            print("4: Show status counts (Clean, Expired, Needs Verification)")
-            print("5: Back to main menu")
-            choice = input("Enter choice (1-5): ").strip()
+            print("3: Batch cleaning (open several deletion pages at once)")
+            print("4: Confirm deletion")
+            print("5: Show status counts (Clean, Expired, Needs Verification)")
+            print("6: Back to main menu")
+            choice = input("Enter choice (1-6): ").strip()
             
             if choice == '1':
                 try:
                     site_id = int(input("Enter site_id (use 'database > view entries' to find): ").strip())
-                    cursor.execute("SELECT name FROM broker_sites WHERE site_id = ?", (site_id,))
-                    site = cursor.fetchone()
-                    if not site:
+                    site_name = brokers.name_of(site_id)
+                    if site_name is None:
                         print(f"No site found with site_id {site_id}.")
                         continue
-                    site_name = site[0]
                     date_cleaned = datetime.date.today().isoformat()
-                    cursor.execute("""
-                    INSERT OR REPLACE INTO cleaning_records (site_id, site_name, date_cleaned, date_confirmed_deleted)
-                    VALUES (?, ?, ?, NULL)
-                    """, (site_id, site_name, date_cleaned))
+                    cleanings.record(site_id, site_name, date_cleaned)
                     conn.commit()
                     print(f"Cleaning request added for {site_name} (site_id: {site_id}).")
                 except ValueError:
@@ -48,176 +114,135 @@ def cleaning(passphrase):
                     print(f"Cleaning request already exists for site_id {site_id}.")
             
             elif choice == '2':
-                today = datetime.date.today()
-                # Get expired entries
-                cursor.execute("""
-                SELECT bs.site_id, bs.name, bs.url, bs.deletion_url
-                FROM broker_sites bs
-                LEFT JOIN cleaning_records cr ON bs.site_id = cr.site_id
-                WHERE cr.site_id IS NULL
-                   OR cr.date_confirmed_deleted IS NULL AND cr.date_cleaned IS NULL
-                   OR (cr.date_confirmed_deleted IS NOT NULL AND julianday(?) - julianday(cr.date_confirmed_deleted) > 183)
-                """, (today.isoformat(),))
-                expired_entries = cursor.fetchall()
-                
-                # Get status counts
-                clean_count = 0
-                expired_count = len(expired_entries)
-                needs_verification_count = 0
-                
-                cursor.execute("SELECT site_id, site_name, date_cleaned, date_confirmed_deleted FROM cleaning_records")
-                records = cursor.fetchall()
-                for record in records:
-                    site_id, site_name, date_cleaned, date_confirmed_deleted = record
-                    cleaned_date = datetime.date.fromisoformat(date_cleaned) if date_cleaned else None
-                    verified_date = datetime.date.fromisoformat(date_confirmed_deleted) if date_confirmed_deleted else None
-                    
-                    if verified_date:
-                        days_since_verified = (today - verified_date).days
-                        if days_since_verified <= 183:
-                            clean_count += 1
-                        else:
-                            expired_count += 1
-                    elif cleaned_date:
-                        days_since_cleaned = (today - cleaned_date).days
-                        if days_since_cleaned <= 30:
-                            clean_count += 1
-                        else:
-                            needs_verification_count += 1
-                
-                print("\nStatus Counts:")
-                print(f"Clean: {clean_count}")
-                print(f"Expired: {expired_count}")
-                print(f"Needs Verification: {needs_verification_count}")
-                
-                if not expired_entries:
-                    print("No expired entries to clean.")
-                    continue
+                print_status_counts(cleanings.status_counts())
+                conn.commit()  # The first read of a day ages the counts
+                runs = CleaningRunRepo(conn)
+                run = runs.current()
+                if run:
+                    resume = input(f"\nResume the automated cleaning run started {run.started_at} "
+                                   f"at {run.position}/{run.total}? (Y/n): ").strip().lower()
+                    if resume not in ('y', ''):
+                        runs.finish(run.run_id, datetime.datetime.now().isoformat(timespec='seconds'))
+                        conn.commit()
+                        print("Earlier run closed; starting a new one.")
+                        run = None
+                if run is None:
+                    # Expired sites are exactly those with a clean/reclean due: an index range scan
+                    expired_entries = CleaningSchedule(conn).due_now(CLEANING_ACTIONS)
+                    if not expired_entries:
+                        print("No expired entries to clean.")
+                        continue
+                    # Persist the queue so an exit or crash resumes here instead of starting over
+                    run = runs.start((site.site_id for site in expired_entries),
+                                     datetime.datetime.now().isoformat(timespec='seconds'))
+                    conn.commit()
                 
-                for site_id, site_name, url, deletion_url in expired_entries:
-                    print(f"\nProcessing Expired Entry:")
-                    print(f"Site ID: {site_id}")
-                    print(f"Name: {site_name}")
-                    print(f"URL: {url or 'None'}")
-                    print(f"Deletion URL: {deletion_url or 'None'}")
+                today = datetime.date.today().isoformat()
+                work = session.unit_of_work()  # Commits every checkpoint_every sites, not after each one
+                try:
+                    for position, site_id, site_name, url, deletion_url, due in runs.remaining(run):
+                        progress = f"{position + 1}/{run.total}"
+                        if due and due > today:
+                            # Cleaned or verified elsewhere (e.g. batch cleaning) since the run was queued
+                            print(f"\n[{progress}] {site_name} (site_id: {site_id}) is no longer due; skipping.")
+                            runs.advance(run.run_id, position, 'not_due')
+                            work.changed()
+                            continue
+                        print(f"\nProcessing Expired Entry {progress}:")
+                        print(f"Site ID: {site_id}")
+                        print(f"Name: {site_name}")
+                        print(f"Due since: {due}")
+                        print(f"URL: {url or 'None'}")
+                        print(f"Deletion URL: {deletion_url or 'None'}")
                     
-                    # Open URL in Firefox
-                    if url and url != 'None':
-                        try:
-                            webbrowser.get('firefox').open_new_tab(url)
-                            print(f"Opened {url} in new Firefox tab")
-                        except webbrowser.Error:
-                            print("Error opening Firefox. Please visit the URL manually.")
+                        # Open URL in Firefox
+                        if url and url != 'None':
+                            try:
+                                webbrowser.get('firefox').open_new_tab(url)
+                                print(f"Opened {url} in new Firefox tab")
+                            except webbrowser.Error:
+                                print("Error opening Firefox. Please visit the URL manually.")
                     
-                    # Prompt for action
-                    while True:
-                        action = input("\nChoose action: (C)lean, (V)erified, (S)kip, (E)xit: ").strip().lower()
-                        if action == 'c':
-                            if deletion_url and deletion_url != 'None':
-                                try:
-                                    webbrowser.get('firefox').open_new_tab(deletion_url)
-                                    print(f"Opened deletion URL {deletion_url} in new Firefox tab")
-                                except webbrowser.Error:
-                                    print(f"Error opening Firefox. Please visit deletion URL manually: {deletion_url}")
+                        # Prompt for action
+                        while True:
+                            action = work.prompt("\nChoose action: (C)lean, (V)erified, (S)kip, (E)xit: ").strip().lower()
+                            if action == 'c':
+                                if deletion_url and deletion_url != 'None':
+                                    try:
+                                        webbrowser.get('firefox').open_new_tab(deletion_url)
+                                        print(f"Opened deletion URL {deletion_url} in new Firefox tab")
+                                    except webbrowser.Error:
+                                        print(f"Error opening Firefox. Please visit deletion URL manually: {deletion_url}")
+                                else:
+                                    print(f"No deletion URL available for {site_name}")
+                                success = work.prompt("Success? (Y/n): ").strip().lower()
+                                if success in ('y', ''):
+                                    outcome = 'cleaned'
+                                    print(f"Marked as cleaned for {site_name} (site_id: {site_id}).")
+                                else:
+                                    outcome = 'failed'
+                                break
+                            elif action == 'v':
+                                outcome = 'verified'
+                                print(f"Marked as verified for {site_name} (site_id: {site_id}).")
+                                break
+                            elif action == 's':
+                                outcome = 'skipped'
+                                print(f"Skipped {site_name} (site_id: {site_id}).")
+                                break
+                            elif action == 'e':
+                                print(f"Exiting automated cleaning at {position}/{run.total}; "
+                                      "the next automated cleaning resumes here.")
+                                return
                             else:
-                                print(f"No deletion URL available for {site_name}")
-                            success = input("Success? (Y/n): ").strip().lower()
-                            if success in ('y', ''):
-                                date_cleaned = datetime.date.today().isoformat()
-                                cursor.execute("""
-                                INSERT OR REPLACE INTO cleaning_records (site_id, site_name, date_cleaned, date_confirmed_deleted)
-                                VALUES (?, ?, ?, NULL)
-                                """, (site_id, site_name, date_cleaned))
-                                conn.commit()
-                                print(f"Marked as cleaned for {site_name} (site_id: {site_id}).")
-                            break
-                        elif action == 'v':
-                            date_cleaned = datetime.date.today().isoformat()
-                            date_confirmed_deleted = datetime.date.today().isoformat()
-                            cursor.execute("""
-                            INSERT OR REPLACE INTO cleaning_records (site_id, site_name, date_cleaned, date_confirmed_deleted)
-                            VALUES (?, ?, ?, ?)
-                            """, (site_id, site_name, date_cleaned, date_confirmed_deleted))
-                            conn.commit()
-                            print(f"Marked as verified for {site_name} (site_id: {site_id}).")
-                            break
-                        elif action == 's':
-                            print(f"Skipped {site_name} (site_id: {site_id}).")
-                            break
-                        elif action == 'e':
-                            print("Exiting automated cleaning.")
-                            return
-                        else:
-                            print("Invalid action. Please choose C, V, S, or E.")
+                                print("Invalid action. Please choose C, V, S, or E.")
+                        with work.savepoint():  # The record and the queue position apply together
+                            handled_on = datetime.date.today().isoformat()
+                            if outcome in ('cleaned', 'verified'):
+                                cleanings.record(site_id, site_name, handled_on, handled_on if outcome == 'verified' else None)
+                            runs.advance(run.run_id, position, outcome)
+                    
+                    counts = runs.outcome_counts(run.run_id)
+                    runs.finish(run.run_id, datetime.datetime.now().isoformat(timespec='seconds'))
+                    summary = ', '.join(f"{count} {outcome.replace('_', ' ')}" for outcome, count in sorted(counts.items()))
+                    print(f"\nAutomated cleaning run finished: {run.total} sites ({summary or 'none handled'}).")
+                finally:
+                    work.checkpoint()  # Keep the sites already handled, even on Ctrl+C
             
             elif choice == '3':
+                batch_cleaning(session, cleanings)
+            
+            elif choice == '4':
                 try:
                     site_id = int(input("Enter site_id to confirm deletion: ").strip())
-                    cursor.execute("SELECT name FROM broker_sites WHERE site_id = ?", (site_id,))
-                    site = cursor.fetchone()
-                    if not site:
+                    site_name = brokers.name_of(site_id)
+                    if site_name is None:
                         print(f"No site found with site_id {site_id}.")
                         continue
-                    site_name = site[0]
-                    cursor.execute("SELECT record_id FROM cleaning_records WHERE site_id = ?", (site_id,))
-                    record = cursor.fetchone()
-                    if not record:
+                    if not cleanings.for_site(site_id):
                         print(f"No cleaning request found for {site_name} (site_id: {site_id}).")
                         continue
                     date_confirmed_deleted = datetime.date.today().isoformat()
-                    cursor.execute("""
-                    UPDATE cleaning_records
-                    SET date_confirmed_deleted = ?
-                    WHERE site_id = ?
-                    """, (date_confirmed_deleted, site_id))
+                    cleanings.confirm_deleted(site_id, date_confirmed_deleted)
                     conn.commit()
                     print(f"Deletion confirmed for {site_name} (site_id: {site_id}).")
                 except ValueError:
                     print("Invalid site_id. Please enter a numeric value.")
             
-            elif choice == '4':
-                today = datetime.date.today()
-                clean_count = 0
-                expired_count = 0
-                needs_verification_count = 0
-                
-                cursor.execute("SELECT site_id, site_name, date_cleaned, date_confirmed_deleted FROM cleaning_records")
-                records = cursor.fetchall()
-                
-                for record in records:
-                    site_id, site_name, date_cleaned, date_confirmed_deleted = record
-                    cleaned_date = datetime.date.fromisoformat(date_cleaned) if date_cleaned else None
-                    verified_date = datetime.date.fromisoformat(date_confirmed_deleted) if date_confirmed_deleted else None
-                    
-                    if verified_date:
-                        days_since_verified = (today - verified_date).days
-                        if days_since_verified <= 183:
-                            clean_count += 1
-                        else:
-                            expired_count += 1
-                    elif cleaned_date:
-                        days_since_cleaned = (today - cleaned_date).days
-                        if days_since_cleaned <= 30:
-                            clean_count += 1
-                        else:
-                            needs_verification_count += 1
-                
-                cursor.execute("SELECT COUNT(*) FROM broker_sites WHERE site_id NOT IN (SELECT site_id FROM cleaning_records)")
-                untracked_count = cursor.fetchone()[0]
-                expired_count += untracked_count
-                
-                print("\nStatus Counts:")
-                print(f"Clean: {clean_count}")
-                print(f"Expired: {expired_count}")
-                print(f"Needs Verification: {needs_verification_count}")
-            
             elif choice == '5':
+                print_status_counts(cleanings.status_counts())
+                conn.commit()  # The first read of a day ages the counts
+                bucket = input("\nList the sites in a status? (C)lean, (E)xpired, (N)eeds verification, Enter to skip: ").strip().lower()
+                if bucket in STATUS_KEYS:
+                    sites = cleanings.sites_with_status(STATUS_KEYS[bucket])
+                    print(f"\n{STATUS_LABELS[STATUS_KEYS[bucket]]} ({len(sites)}):")
+                    for site_id, site_name, _, _ in sites:
+                        print(f"Site ID: {site_id}, {site_name}")
+            
+            elif choice == '6':
                 break
             else:
-                print("Invalid choice. Please enter 1-5.")
+                print("Invalid choice. Please enter 1-6.")
     
     except Exception as e:
         print(f"Error managing cleaning records: {e}")
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
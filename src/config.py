@@ -0,0 +1,33 @@
+import os
+import sys
+import json
+
+CONFIG_PATH = os.path.join('data', 'config.json')
+
+def load_config():
+    """Load data/config.json (empty if missing or unreadable)."""
+    if not os.path.exists(CONFIG_PATH):
+        return {}
+    try:
+        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable {CONFIG_PATH}: {e}")
+        return {}
+
+def get_setting(name, default=None):
+    """Look up a setting; a --name=value command-line flag wins over data/config.json."""
+    flag = '--' + name.replace('_', '-') + '='
+    for arg in sys.argv[1:]:
+        if arg.startswith(flag):
+            return arg[len(flag):]
+    return load_config().get(name, default)
+
+def get_int_setting(name, default):
+    """Look up an integer setting, falling back to default on bad values."""
+    value = get_setting(name, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        print(f"Warning: Invalid value for {name}: {value!r}; using {default}")
+        return default
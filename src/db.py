@@ -1,30 +1,54 @@
 import os
 import sqlite3  # For unencrypted mode
 import sqlcipher3  # For encrypted mode
-import requests
-import pdfplumber
-import re
+import time
 import datetime
-import unicodedata
-import io
+import logging
+from src.sources import open_workbook_source
+from src.workbook import save_cache_meta, workbook_date, open_pdf, iter_page_texts, parse_entries
+from src.catalog import BROKER_FIELDS, find_snapshot, load_snapshot, save_snapshot, snapshot_path
+from src.keys import DatabaseKey, describe_unlock_failure
+from src.repos import BrokerRepo
+from src.migrations import migrate, pending_lossy_migrations, schema_version
+from src.logs import debug_enabled, with_logger, write_debug_archive
 
-def init_db(passphrase):
-    """Initialize SQLite database for GHOSTWIPE (encrypted or unencrypted)."""
-    db_path = os.path.join('data', 'pii_data.db')
-    if passphrase:
-        sqlite = sqlcipher3
+DB_PATH = os.path.join('data', 'pii_data.db')
+WRITE_RETRY_SECONDS = 2  # Pause before a catalog refresh retries a write another connection blocked
+STATEMENT_CACHE_SIZE = 256  # Prepared statements kept per connection (repos reuse identical SQL text)
+logger = logging.getLogger(__name__)
+
+def connect_db(key, db_path=DB_PATH, check_same_thread=True):
+    """Open a connection to the GHOSTWIPE database with the cipher and foreign key PRAGMAs applied.
+
+    key is a DatabaseKey (raw key, no KDF), a passphrase (derives the key for this one
+    connection) or '' / None for an unencrypted database.
+    """
+    if key:
+        if not isinstance(key, DatabaseKey):
+            key = DatabaseKey.unlock(key, db_path)
+        conn = sqlcipher3.connect(db_path, check_same_thread=check_same_thread, cached_statements=STATEMENT_CACHE_SIZE)
+        key.apply(conn)
     else:
-        sqlite = sqlite3
-    conn = sqlite.connect(db_path)
-    debug_output = []
+        conn = sqlite3.connect(db_path, check_same_thread=check_same_thread, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+def init_db(key):
+    """Initialize SQLite database for GHOSTWIPE (encrypted or unencrypted).
+
+    key is as for connect_db. Only creates the schema; broker_sites is filled by a
+    catalog refresh (see src/refresh.py).
+    """
+    conn = connect_db(key)
     try:
-        if passphrase:
-            conn.execute(f"PRAGMA key = '{passphrase}'")  # Use raw passphrase
-            conn.execute("PRAGMA kdf_iter = 64000")  # Reduced iterations for compatibility
-            conn.execute("PRAGMA cipher_page_size = 4096")
-            debug_output.append("SQLCipher PRAGMA settings applied: key, kdf_iter=64000, cipher_page_size=4096")
-        conn.execute("PRAGMA foreign_keys = ON")
-        debug_output.append("Foreign keys enabled")
+        if key:
+            try:
+                conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # First read checks the key
+            except sqlcipher3.DatabaseError as e:
+                raise sqlcipher3.DatabaseError(describe_unlock_failure(DB_PATH)) from e
+            logger.debug("SQLCipher PRAGMA settings applied: raw key, cipher_page_size=%s",
+                         conn.execute("PRAGMA cipher_page_size").fetchone()[0])
+        logger.debug("Foreign keys enabled")
         
         # Create tables if they don't exist (no dropping to preserve data)
         conn.execute('''
@@ -47,7 +71,7 @@ def init_db(passphrase):
             state TEXT,
             zip TEXT,
             is_current BOOLEAN,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
         )
         ''')
         conn.execute('''
@@ -57,7 +81,7 @@ def init_db(passphrase):
             email_address TEXT,
             source_site TEXT,
             is_active BOOLEAN,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
         )
         ''')
         conn.execute('''
@@ -67,7 +91,7 @@ def init_db(passphrase):
             phone_number TEXT,
             source_site TEXT,
             is_active BOOLEAN,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
         )
         ''')
         conn.execute('''
@@ -77,7 +101,7 @@ def init_db(passphrase):
             username TEXT,
             platform TEXT,
             is_tied BOOLEAN,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
         )
         ''')
         conn.execute('''
@@ -100,7 +124,7 @@ def init_db(passphrase):
             site_id INTEGER,
             status TEXT,  -- pending, resolved
             request_date TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE,
             FOREIGN KEY (site_id) REFERENCES broker_sites (site_id)
         )
         ''')
@@ -114,228 +138,155 @@ def init_db(passphrase):
             FOREIGN KEY (site_id) REFERENCES broker_sites (site_id)
         )
         ''')
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''')
         conn.commit()
-        debug_output.append("Database tables created or verified")
-        
-        # Populate broker_sites and get update date
-        last_updated = populate_broker_sites(conn)
-        print(f"Workbook last updated: {last_updated if last_updated else 'Unknown'}")
-        conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        debug_output.append("Database initialization completed")
-        print("Database initialized successfully (encrypted: {})".format(bool(passphrase)))
-        
-        # Write debug output to file
-        debug_file = os.path.join('data', 'debug_init_output.txt')
-        debug_file = backup_existing_file(debug_file)
-        with open(debug_file, 'w', encoding='utf-8') as f:
-            f.write("\n".join(debug_output))
-        print(f"Initialization debug output written to {debug_file}")
+        logger.debug("Database tables created or verified")
+        previous_version = schema_version(conn)
+        lossy = pending_lossy_migrations(conn)
+        if lossy:
+            # These migrations drop rows the new constraints reject; keep a copy of the database first
+            from src.backup import BackupStore  # src.backup imports this module
+            snapshot = BackupStore().snapshot(conn, DB_PATH, 'pre_migration')
+            print(f"Backed up the database as snapshot {snapshot['id']} before schema migration "
+                  f"{', '.join(map(str, lossy))}.")
+        version = migrate(conn)
+        if version != previous_version:
+            print(f"Database schema upgraded from version {previous_version} to {version}.")
+        print("Database initialized successfully (encrypted: {})".format(bool(key)))
+        if debug_enabled():
+            print(f"Initialization debug output written to {write_debug_archive('init')}")
         
     except Exception as e:
-        debug_output.append(f"Error initializing database: {e}")
-        debug_file = os.path.join('data', 'debug_init_output.txt')
-        debug_file = backup_existing_file(debug_file)
-        with open(debug_file, 'w', encoding='utf-8') as f:
-            f.write("\n".join(debug_output))
-        print(f"Error initializing database: {e}. Debug output written to {debug_file}")
+        logger.error("Error initializing database: %s", e)
+        print(f"Error initializing database: {e}. Debug output written to {write_debug_archive('init')}")
         raise
     finally:
         conn.close()
 
-def backup_existing_file(file_path):
-    """Create a backup of an existing file with a rotating number."""
-    if not os.path.exists(file_path):
-        return file_path
-    base, ext = os.path.splitext(file_path)
-    i = 1
-    while True:
-        backup_path = f"{base}.bak.{i}{ext}"
-        if not os.path.exists(backup_path):
-            print(f"Backing up existing {file_path} to {backup_path}")
-            os.rename(file_path, backup_path)
-            return file_path
-        i += 1
+def get_catalog_meta(conn, key):
+    """Read a value from the catalog_meta table."""
+    row = conn.execute("SELECT value FROM catalog_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def set_catalog_meta(conn, key, value):
+    """Write a value to the catalog_meta table (caller commits)."""
+    conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES (?, ?)", (key, value))
+
+def _collect(entries, collected):
+    """Pass entries through while keeping a copy of each in collected."""
+    for entry in entries:
+        collected.append(entry)
+        yield entry
+
+def populate_broker_sites(conn, workers=None, force=False, progress=None, log=print, sources=None):
+    """Populate broker_sites table from IntelTechniques PDF. Updates existing entries.
 
-def populate_broker_sites(conn):
-    """Populate broker_sites table from IntelTechniques PDF. Updates existing entries."""
-    cursor = conn.cursor()
-    debug_output = []
+    sources is the workbook source chain (default: workbook_sources setting, see src/sources.py).
+    workers sets the number of PDF extraction processes (default: pdf_workers setting, 1 = serial).
+    force re-checks the server and re-parses even an already imported PDF. progress, if given,
+    is called as progress(stage, done, total); log receives status messages. All changes are
+    committed in one transaction, so other connections keep seeing the old catalog until then.
+    """
+    def report(stage, done=None, total=None):
+        if progress:
+            progress(stage, done, total)
+
+    log = with_logger(log, logger)
     try:
-        url = "https://inteltechniques.com/data/workbook.pdf"
-        # Check connectivity
-        print("Checking connectivity to PDF source...")
-        response = requests.head(url, timeout=5)
-        if response.status_code != 200:
-            debug_output.append(f"Error: Unable to connect to {url} (status code: {response.status_code})")
-            print(f"Error: Unable to connect to {url} (status code: {response.status_code})")
-            debug_file = os.path.join('data', 'debug_parse_output.txt')
-            debug_file = backup_existing_file(debug_file)
-            with open(debug_file, 'w', encoding='utf-8') as f:
-                f.write("\n".join(debug_output))
-            print(f"Debug output written to {debug_file}. Table unchanged; check connectivity.")
+        report('checking')
+        source = open_workbook_source(sources, force=force, log=log)
+        if source is None:
+            log(f"Error: No workbook source available. Table unchanged; check connectivity or workbook_sources. "
+                f"Debug output written to {write_debug_archive('parse')}")
             return None
+        workbook_sha256 = source['sha256']
 
-        print("Populating broker_sites from https://inteltechniques.com/data/workbook.pdf...")
-        # Load PDF
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        with pdfplumber.open(io.BytesIO(response.content)) as pdf:
-            raw_text = ""
-            for page in pdf.pages:
-                page_text = page.extract_text() or ""
-                raw_text += page_text + "\n"
-        
-        raw_text = unicodedata.normalize('NFKD', raw_text).strip()
-        debug_output.append("Raw text (first 1000 chars):\n" + raw_text[:1000] + "...")
-        print("Raw text (first 500 chars):", raw_text[:500] + "...")
-        
-        # Hardcode update date to October 2024
-        update_str = "October 2024"
-        last_updated = "2024-10-01"
-        
-        # Split into entries
-        entries = []
-        field_map = {
-            "Service:": "name",
-            "Website:": "url",
-            "Removal Link:": "deletion_url",
-            "Privacy Policy:": "privacy_policy",
-            "Contact:": "contact",
-            "Requirements:": "requirements",
-            "Notes:": "notes"
-        }
-        
-        # Split raw text into entry blocks
-        entry_blocks = re.split(r'\n*\s*Service:\s*', raw_text)[1:]
-        debug_output.append(f"Found entry blocks: {len(entry_blocks)}")
-        print(f"Found entry blocks: {len(entry_blocks)}")
-        
-        for i, block in enumerate(entry_blocks):
-            block = block.strip()
-            if not block or any(keyword in block for keyword in ['Book', 'Guide', 'Data Request', 'Credit Freeze']):
-                debug_output.append(f"Skipping block {i+1}: {block[:50]}...")
-                print(f"Skipping block {i+1}: {block[:50]}...")
-                continue
-            current_entry = {}
-            # Set name from the block's first content
-            name_match = re.match(r'^(.*?)(?=\n*\s*(Website:|Removal Link:|Privacy Policy:|Contact:|Requirements:|Notes:|$))', block, re.DOTALL)
-            if name_match:
-                name = name_match.group(1).strip()
-                if name == "The name of the service":
-                    debug_output.append(f"Skipping block {i+1} (placeholder name): {block[:50]}...")
-                    print(f"Skipping block {i+1} (placeholder name): {block[:50]}...")
-                    continue
-                current_entry['name'] = name
-            # Split block into fields
-            fields = re.split(r'\n*\s*(Website:|Removal Link:|Privacy Policy:|Contact:|Requirements:|Notes:)', block)
-            field_iter = iter(fields)
-            for part in field_iter:
-                part = part.strip()
-                if not part or part == current_entry.get('name', ''):
-                    continue
-                if part in field_map:
-                    try:
-                        value = next(field_iter).strip()
-                        key = field_map[part]
-                        value = unicodedata.normalize('NFKD', value)
-                        if key in ["url", "deletion_url", "privacy_policy"]:
-                            value = value.strip('[] ')
-                        elif key == "contact":
-                            if '[email' in value or '@' not in value:
-                                value = "Email protected (requires manual retrieval)"
-                            else:
-                                value = re.sub(r'\(/cdn-cgi/.*?\)', '', value).strip('[] ,')
-                                value = re.sub(r'\[|\]', '', value)
-                        elif key == "notes":
-                            value = re.sub(r'\n*Date:.*?Verified Removal:.*?(?=\n|$)', '', value, flags=re.DOTALL)
-                            value = re.sub(r'\n*(Copyright © \d{4} by IntelTechniques|EXTREME PRIVACY \| PERSONAL DATA REMOVAL WORKBOOK \| INTELTECHNIQUES\.COM).*', '', value, flags=re.DOTALL)
-                            value = value.strip()
-                        current_entry[key] = value
-                    except StopIteration:
-                        debug_output.append(f"Warning: Incomplete field for {part} in block {i+1}: {block[:50]}...")
-                        print(f"Warning: Incomplete field for {part} in block {i+1}: {block[:50]}...")
-                elif current_entry and "notes" in current_entry:
-                    current_entry["notes"] += " " + part
-            if current_entry and "name" in current_entry and current_entry["name"]:
-                current_entry['last_updated'] = last_updated
-                debug_output.append(f"Parsed entry {i+1}: {current_entry}")
-                print(f"Parsed entry {i+1}: {current_entry}")
-                entries.append(current_entry)
-            else:
-                debug_output.append(f"Skipping invalid entry {i+1} (missing or empty name): {block[:50]}...")
-                print(f"Skipping invalid entry {i+1} (missing or empty name): {block[:50]}...")
-        
-        # Get existing entries
-        cursor.execute("SELECT site_id, name, url, deletion_url, privacy_policy, contact, requirements, notes, last_updated FROM broker_sites")
-        existing_entries = {row[1]: row for row in cursor.fetchall()}
-        debug_output.append(f"Found {len(existing_entries)} existing broker_sites entries")
-        print(f"Found {len(existing_entries)} existing broker_sites entries")
-        
-        # Update or insert entries
-        updated_count = 0
-        inserted_count = 0
-        for i, entry in enumerate(entries):
-            if "name" not in entry or not entry["name"]:
-                debug_output.append(f"Skipping insertion {i+1} (no name): {entry}")
-                print(f"Skipping insertion {i+1} (no name): {entry}")
-                continue
-            name = entry["name"]
-            if name in existing_entries:
-                # Compare fields
-                existing = existing_entries[name]
-                fields_to_update = []
-                update_values = []
-                for field in ['url', 'deletion_url', 'privacy_policy', 'contact', 'requirements', 'notes', 'last_updated']:
-                    existing_value = existing[existing_entries[name][0:].index(field) + 1] or ''
-                    new_value = entry.get(field, '') or ''
-                    if existing_value != new_value:
-                        fields_to_update.append(f"{field} = ?")
-                        update_values.append(new_value)
-                if fields_to_update:
-                    update_values.append(existing[0])  # site_id
-                    cursor.execute(f"""
-                    UPDATE broker_sites
-                    SET {', '.join(fields_to_update)}
-                    WHERE site_id = ?
-                    """, update_values)
-                    updated_count += 1
-                    debug_output.append(f"Updated entry {i+1}: {name}")
-                    print(f"Updated entry {i+1}: {name}")
-            else:
-                cursor.execute('''
-                INSERT OR IGNORE INTO broker_sites 
-                (name, url, deletion_url, privacy_policy, contact, requirements, notes, last_updated)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    entry.get("name"),
-                    entry.get("url"),
-                    entry.get("deletion_url"),
-                    entry.get("privacy_policy"),
-                    entry.get("contact"),
-                    entry.get("requirements"),
-                    entry.get("notes"),
-                    last_updated
-                ))
-                inserted_count += 1
-                debug_output.append(f"Inserted entry {i+1}: {name}")
-                print(f"Inserted entry {i+1}: {name}")
-        
-        conn.commit()
-        # Write debug output to file
-        debug_file = os.path.join('data', 'debug_parse_output.txt')
-        debug_file = backup_existing_file(debug_file)
-        with open(debug_file, 'w', encoding='utf-8') as f:
-            f.write("\n".join(debug_output))
-        print(f"Debug output written to {debug_file}")
-        
-        print(f"Updated {updated_count} and inserted {inserted_count} broker sites successfully.")
-        return update_str or last_updated
+        # Skip the parse and upsert entirely if this exact workbook was already imported
+        if not force and get_catalog_meta(conn, 'workbook_sha256') == workbook_sha256:
+            log("Workbook unchanged since last import; broker_sites is up to date.")
+            return get_catalog_meta(conn, 'workbook_date')
+
+        # A snapshot parsed from this exact PDF lets us skip pdfplumber entirely
+        parsed_entries = None
+        snapshot = source.get('snapshot')
+        snapshot_file = source.get('snapshot_path') or (None if force else find_snapshot(workbook_sha256))
+        if snapshot or snapshot_file:
+            log(f"Loading parsed catalog snapshot {snapshot_file}...")
+            snapshot = snapshot or load_snapshot(snapshot_file)
+            last_updated = snapshot['workbook_date']
+            entries = snapshot['entries']
+        else:
+            pdf_path, meta = source['pdf_path'], source['meta']
+            log(f"Populating broker_sites from {source['label']}...")
+            last_updated = meta.get('workbook_date')
+            if not last_updated:
+                with open_pdf(pdf_path) as pdf:
+                    last_updated = workbook_date(pdf, meta)
+            if source['cached'] and last_updated and meta.get('workbook_date') != last_updated:
+                meta['workbook_date'] = last_updated
+                save_cache_meta(meta)
+            
+            # Entries are parsed lazily as pages are extracted, so staging writes overlap with extraction
+            pages = iter_page_texts(pdf_path, workers, lambda done, total: report('extracting', done, total), log)
+            parsed_entries = []
+            entries = _collect(parse_entries(pages, last_updated, log), parsed_entries)
+        while True:
+            try:
+                inserted_count, updated_count, unchanged_count = BrokerRepo(conn).upsert_many(entries)
+                report('writing')
+                set_catalog_meta(conn, 'workbook_sha256', workbook_sha256)
+                set_catalog_meta(conn, 'workbook_date', last_updated)
+                conn.commit()
+                break
+            except (sqlite3.OperationalError, sqlcipher3.OperationalError) as e:
+                # The console's unit of work holds the write lock until its next checkpoint; having
+                # read broker_sites already, this transaction gets no busy wait, so back off and retry
+                if 'locked' not in str(e):
+                    raise
+                conn.rollback()
+                if parsed_entries is not None:
+                    for _ in entries:
+                        pass  # Parse whatever the failed attempt didn't reach; _collect keeps every entry
+                    entries = parsed_entries
+                report('waiting for the write lock')
+                time.sleep(WRITE_RETRY_SECONDS)
+        if parsed_entries is not None:
+            save_snapshot(snapshot_path(workbook_sha256), parsed_entries, workbook_sha256, last_updated)
+            log(f"Saved parsed catalog snapshot for workbook {workbook_sha256[:12]}.")
+        log(f"Updated {updated_count}, inserted {inserted_count} and left {unchanged_count} broker sites unchanged.")
+        if debug_enabled():
+            log(f"Debug output written to {write_debug_archive('parse')}")
+        return last_updated
     except Exception as e:
-        debug_output.append(f"Error populating broker_sites: {e}")
-        debug_file = os.path.join('data', 'debug_parse_output.txt')
-        debug_file = backup_existing_file(debug_file)
-        with open(debug_file, 'w', encoding='utf-8') as f:
-            f.write("\n".join(debug_output))
-        print(f"Error populating broker_sites: {e}. Debug output written to {debug_file}. Table unchanged; check connectivity.")
-        return None
\ No newline at end of file
+        conn.rollback()  # Leave broker_sites exactly as it was
+        logger.exception("Error populating broker_sites")
+        log(f"Error populating broker_sites: {e}. Table unchanged; check connectivity. Debug output written to {write_debug_archive('parse')}")
+        return None
+
+def export_catalog_snapshot(conn, path):
+    """Write the current broker_sites catalog to a snapshot file; returns the entry count."""
+    rows = conn.execute(f"SELECT {', '.join(BROKER_FIELDS)} FROM broker_sites ORDER BY site_id").fetchall()
+    entries = [dict(zip(BROKER_FIELDS, row)) for row in rows]
+    return save_snapshot(path, entries, get_catalog_meta(conn, 'workbook_sha256'), get_catalog_meta(conn, 'workbook_date'))
+
+def import_catalog_snapshot(conn, path):
+    """Load a snapshot file into broker_sites in one transaction; returns (inserted, updated, unchanged)."""
+    snapshot = load_snapshot(path)
+    try:
+        counts = BrokerRepo(conn).upsert_many(snapshot['entries'])
+        if snapshot.get('workbook_sha256'):
+            set_catalog_meta(conn, 'workbook_sha256', snapshot['workbook_sha256'])
+            set_catalog_meta(conn, 'workbook_date', snapshot['workbook_date'])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    # Keep a copy keyed by hash so later rebuilds of other databases can reuse it
+    if snapshot.get('workbook_sha256') and not find_snapshot(snapshot['workbook_sha256']):
+        save_snapshot(snapshot_path(snapshot['workbook_sha256']), snapshot['entries'], snapshot['workbook_sha256'], snapshot['workbook_date'])
+    return counts
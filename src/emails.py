@@ -1,23 +1,15 @@
-import sqlite3
-import sqlcipher3
-import os
 import signal
+from src.repos import EmailRepo
 
 def signal_handler(sig, frame):
     """Handle Ctrl+S to skip input."""
     raise KeyboardInterrupt
 
-def modify_emails(passphrase, user_id):
+def modify_emails(session, user_id):
     """Modify email information for a specific user_id."""
-    db_path = os.path.join('data', 'pii_data.db')
-    conn = None
+    conn = session.conn
     try:
-        conn = sqlcipher3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA key = '{passphrase}'")
-        cursor.execute("PRAGMA kdf_iter = 64000")
-        cursor.execute("PRAGMA cipher_page_size = 4096")
-        cursor.execute("PRAGMA foreign_keys = ON")
+        repo = EmailRepo(conn)
         
         while True:
             print("\nEmail Options:")
@@ -51,22 +43,18 @@ def modify_emails(passphrase, user_id):
                     print("Email address is required.")
                     continue
                 
-                cursor.execute("""
-                INSERT INTO emails (user_id, email_address, source_site, is_active)
-                VALUES (?, ?, ?, ?)
-                """, (user_id, email_address, source_site, is_active))
+                repo.add(user_id=user_id, email_address=email_address, source_site=source_site, is_active=is_active)
                 conn.commit()
                 print("Email added.")
             
             elif choice == '2':
-                cursor.execute("SELECT email_id, email_address, source_site, is_active FROM emails WHERE user_id = ?", (user_id,))
-                emails = cursor.fetchall()
+                emails = repo.for_user(user_id)
                 if not emails:
                     print("No emails found for this user.")
                 else:
                     print("\nEmails:")
                     for email in emails:
-                        email_id, email_address, source_site, is_active = email
+                        email_id, _, email_address, source_site, is_active = email
                         print(f"Email ID: {email_id}")
                         print(f"Email Address: {email_address}")
                         print(f"Source Site: {source_site or 'None'}")
@@ -74,22 +62,20 @@ def modify_emails(passphrase, user_id):
                         print()
             
             elif choice == '3':
-                cursor.execute("SELECT email_id, email_address FROM emails WHERE user_id = ?", (user_id,))
-                emails = cursor.fetchall()
+                emails = repo.for_user(user_id)
                 if not emails:
                     print("No emails found for this user.")
                     continue
                 print("\nEmails:")
                 for email in emails:
-                    email_id, email_address = email
+                    email_id, email_address = email.email_id, email.email_address
                     print(f"Email ID: {email_id}, {email_address}")
                 try:
                     email_id = int(input("Enter email_id to delete: ").strip())
-                    cursor.execute("SELECT 1 FROM emails WHERE email_id = ? AND user_id = ?", (email_id, user_id))
-                    if not cursor.fetchone():
+                    if not repo.owned_by(email_id, user_id):
                         print(f"No email found with email_id {email_id} for this user.")
                         continue
-                    cursor.execute("DELETE FROM emails WHERE email_id = ?", (email_id,))
+                    repo.delete(email_id)
                     conn.commit()
                     print(f"Email ID {email_id} deleted.")
                 except ValueError:
@@ -102,6 +88,3 @@ def modify_emails(passphrase, user_id):
     
     except Exception as e:
         print(f"Error managing emails: {e}")
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+from typing import NamedTuple
+from src.config import get_int_setting
+
+# SQLCipher settings of databases without a settings file entry (every database made
+# before settings could change); new databases use the cipher_kdf_iter and
+# cipher_page_size settings, which default to these
+KDF_ITER = 64000  # Reduced iterations for compatibility
+KDF_ALGORITHM = 'sha512'  # PBKDF2-HMAC-SHA512, SQLCipher 4's default KDF
+CIPHER_PAGE_SIZE = 4096
+KEY_BYTES = 32
+SALT_BYTES = 16  # SQLCipher stores the KDF salt in the first 16 bytes of the file
+PLAINTEXT_HEADER = b'SQLite format 3\x00'
+CIPHER_SETTINGS_SUFFIX = '.cipher.json'
+
+class CipherSettings(NamedTuple):
+    kdf_iter: int = KDF_ITER
+    page_size: int = CIPHER_PAGE_SIZE
+
+LEGACY_SETTINGS = CipherSettings()
+
+def configured_settings():
+    """Return the cipher settings new (or re-encrypted) databases get."""
+    return CipherSettings(get_int_setting('cipher_kdf_iter', KDF_ITER), get_int_setting('cipher_page_size', CIPHER_PAGE_SIZE))
+
+def _settings_path(db_path):
+    return db_path + CIPHER_SETTINGS_SUFFIX
+
+def _load_settings_file(db_path):
+    try:
+        with open(_settings_path(db_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def read_cipher_settings(db_path, salt):
+    """Return the cipher settings recorded for the database with this salt (legacy defaults if none).
+
+    Settings live next to the database in <db>.cipher.json, keyed by salt: a
+    re-encrypted database gets a new salt, so its entry can be written before the
+    new file is swapped in and whichever file ends up in place finds its own entry.
+    """
+    entry = _load_settings_file(db_path).get(salt.hex())
+    return CipherSettings(**entry) if entry else LEGACY_SETTINGS
+
+def write_cipher_settings(db_path, salt, settings, keep_salts=None):
+    """Record settings for salt in db_path's settings file.
+
+    Entries of other salts are kept, or only those in keep_salts if it is given.
+    """
+    entries = _load_settings_file(db_path)
+    if keep_salts is not None:
+        kept = {kept_salt.hex() for kept_salt in keep_salts}
+        entries = {salt_hex: entry for salt_hex, entry in entries.items() if salt_hex in kept}
+    if settings != LEGACY_SETTINGS:
+        entries[salt.hex()] = settings._asdict()
+    path = _settings_path(db_path)
+    if not entries:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def describe_unlock_failure(db_path):
+    """Explain why a keyed database could not be read, naming a missing settings file if that may be why."""
+    salt = read_salt(db_path)
+    path = _settings_path(db_path)
+    if salt and salt.hex() not in _load_settings_file(db_path):
+        found = "has no entry for this database" if os.path.exists(path) else "is missing"
+        return (f"Unable to decrypt {db_path}: wrong password, or its cipher settings file {path} {found}. "
+                f"A database with non-default cipher_kdf_iter/cipher_page_size only opens with that file next to "
+                f"it ('backup copy' and 'backup restore' write it); without it the default settings were tried.")
+    return f"Unable to decrypt {db_path}: wrong password."
+
+def read_salt(db_path):
+    """Return the KDF salt of an encrypted database, or None if it is missing, empty or unencrypted."""
+    try:
+        with open(db_path, 'rb') as f:
+            header = f.read(SALT_BYTES)
+    except FileNotFoundError:
+        return None
+    if len(header) < SALT_BYTES or header == PLAINTEXT_HEADER:
+        return None
+    return header
+
+def derive_key(passphrase, salt, kdf_iter=KDF_ITER):
+    """Run the same PBKDF2 SQLCipher runs for PRAGMA key = '<passphrase>'."""
+    return hashlib.pbkdf2_hmac(KDF_ALGORITHM, passphrase.encode('utf-8'), salt, kdf_iter, KEY_BYTES)
+
+class DatabaseKey:
+    """A SQLCipher key derived once from the passphrase and the database's salt.
+
+    Connections are keyed with the raw x'<key><salt>' form, which skips the KDF, so only
+    unlock() pays for PBKDF2. Databases created with this key (new databases, backups,
+    exports) get the same salt, so the same key opens them and the passphrase still works.
+    """
+    def __init__(self, key, salt, settings=LEGACY_SETTINGS):
+        self.key = key
+        self.salt = salt
+        self.settings = settings
+
+    @classmethod
+    def unlock(cls, passphrase, db_path):
+        """Derive the key for db_path with its recorded cipher settings.
+
+        A database that doesn't exist yet gets a new random salt and the configured
+        settings (recorded in its settings file if they aren't the legacy defaults).
+        """
+        salt = read_salt(db_path)
+        if salt:
+            settings = read_cipher_settings(db_path, salt)
+        else:
+            salt, settings = os.urandom(SALT_BYTES), configured_settings()
+            if settings != LEGACY_SETTINGS:
+                write_cipher_settings(db_path, salt, settings, keep_salts=())
+        return cls.derive(passphrase, salt, settings)
+
+    @classmethod
+    def derive(cls, passphrase, salt, settings):
+        return cls(derive_key(passphrase, salt, settings.kdf_iter), salt, settings)
+
+    def raw_key(self):
+        """Return the key as a SQLCipher raw key literal (for PRAGMA key or ATTACH ... KEY ?)."""
+        return f"x'{self.key.hex()}{self.salt.hex()}'"
+
+    def apply(self, conn, schema='main'):
+        """Key a freshly opened (or attached) database; must run before its first read."""
+        conn.execute(f'PRAGMA {schema}.key = "{self.raw_key()}"')
+        conn.execute(f"PRAGMA {schema}.cipher_page_size = {int(self.settings.page_size)}")
+
+    def __repr__(self):
+        return f"DatabaseKey(salt={self.salt.hex()[:8]}...)"  # Never show the key itself
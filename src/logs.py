@@ -0,0 +1,91 @@
+import os
+import sys
+import gzip
+import json
+import logging
+import datetime
+import collections
+from src.config import get_int_setting
+
+DEBUG_DIR = os.path.join('data', 'debug')  # Same directory ghwi.py --debug logs to
+RING_CAPACITY = 2000
+DEBUG_ARCHIVES_KEPT = 5
+
+def debug_enabled():
+    """True when GHOSTWIPE was started with --debug."""
+    return '--debug' in sys.argv
+
+class RingBufferHandler(logging.Handler):
+    """Keep the most recent log records as structured dicts in a bounded deque.
+
+    Fields passed as extra={'fields': {...}} are merged into the record dict, so
+    archives can be filtered by event without parsing message text.
+    """
+    def __init__(self, capacity=RING_CAPACITY, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = collections.deque(maxlen=capacity)
+
+    def emit(self, record):
+        item = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            item['exception'] = logging.Formatter().formatException(record.exc_info)
+        item.update(getattr(record, 'fields', None) or {})
+        self.records.append(item)
+
+    def snapshot(self):
+        """Return a copy of the buffered records, oldest first."""
+        with self.lock:
+            return list(self.records)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+def _install():
+    """Attach the ring buffer to the src logger (DEBUG with --debug, else INFO)."""
+    logger = logging.getLogger('src')
+    for handler in logger.handlers:
+        if isinstance(handler, RingBufferHandler):
+            return handler
+    handler = RingBufferHandler()
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG if debug_enabled() else logging.INFO)
+    return handler
+
+RING_BUFFER = _install()
+
+def with_logger(log, logger):
+    """Wrap a status callable so each message is also recorded at INFO on logger."""
+    def emit(message):
+        logger.info(message)
+        if log:
+            log(message)
+    return emit
+
+def write_debug_archive(kind, records=None):
+    """Write records (default: the ring buffer) to a gzip JSON-lines archive; returns its path.
+
+    Only the newest debug_archives_kept archives of each kind are kept.
+    """
+    records = RING_BUFFER.snapshot() if records is None else records
+    os.makedirs(DEBUG_DIR, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(DEBUG_DIR, f"{kind}-{timestamp}.jsonl.gz")
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    prune_debug_archives(kind, get_int_setting('debug_archives_kept', DEBUG_ARCHIVES_KEPT))
+    return path
+
+def prune_debug_archives(kind, keep):
+    """Delete all but the newest keep archives of one kind (at least one is kept)."""
+    prefix = kind + '-'
+    archives = sorted(name for name in os.listdir(DEBUG_DIR) if name.startswith(prefix) and name.endswith('.jsonl.gz'))
+    for name in archives[:-max(keep, 1)]:
+        os.remove(os.path.join(DEBUG_DIR, name))
@@ -2,16 +2,21 @@ import cmd
 import getpass
 import os
 import sys
-from datetime import datetime
+from datetime import date, timedelta
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src.db import init_db
-import sqlite3
-import sqlcipher3
+from src.db import init_db, export_catalog_snapshot, import_catalog_snapshot, get_catalog_meta
 import gnureadline as readline
 readline.parse_and_bind("tab: complete")
 from src.view_db import view_db
 from src.cleaning import cleaning
 from src.userinfo import userinfo
+from src.refresh import CatalogRefresher
+from src.backup import BackgroundBackup, BackupStore
+from src.keys import CipherSettings, DatabaseKey, configured_settings
+from src.reencrypt import reencrypt_database
+from src.session import Session
+from src.repos import BrokerRepo
+from src.scheduler import CleaningSchedule, SCHEDULE_ACTIONS, SCHEDULE_LIST_LIMIT, UPCOMING_DAYS
 
 class DataDeleteConsole(cmd.Cmd):
     intro = 'Welcome to GHOSTWIPE (GHWI). Type help or ? for commands. Type quit to exit.\n'
@@ -19,16 +24,14 @@ class DataDeleteConsole(cmd.Cmd):
 
     def __init__(self, passphrase):
         super().__init__()
-        self.passphrase = passphrase
-        init_db(self.passphrase)
-        if self.passphrase:
-            self.conn = sqlcipher3.connect(os.path.join('data', 'pii_data.db'))
-            self.conn.execute(f"PRAGMA key = '{self.passphrase}'")
-            self.conn.execute("PRAGMA kdf_iter = 64000")
-            self.conn.execute("PRAGMA cipher_page_size = 4096")
-        else:
-            self.conn = sqlite3.connect(os.path.join('data', 'pii_data.db'))
-        self.cursor = self.conn.cursor()
+        # One session per unlock: the key is derived once and every menu reuses its connections
+        self.session = Session(passphrase)
+        init_db(self.session.key)
+        self.conn = self.session.conn
+        # Refresh the broker catalog in the background; the cached broker_sites serves reads meanwhile
+        self.refresher = CatalogRefresher(self.session)
+        self.refresher.start()
+        self.backup = BackgroundBackup(self.session)
         self.show_menu()
 
     def show_menu(self):
@@ -37,6 +40,11 @@ class DataDeleteConsole(cmd.Cmd):
         print("2: database - Manage broker sites and opt-out links")
         print("3: scan - Scan data brokers for PII")
         print("4: start_cleaning - Manage data broker cleaning requests")
+        print("refresh - Refresh the broker catalog from the workbook (refresh status | refresh force)")
+        print("catalog - Export or import a parsed broker catalog snapshot (catalog export|import <path>)")
+        print("rekey - Change the password and/or cipher settings (rekey [kdf_iter=N] [page_size=N])")
+        print("schedule - Show the upcoming cleaning work queue (schedule [days])")
+        print("backup - Snapshot the database in the background (backup [status|list|copy <path>|restore <id> <path>|prune])")
         print("Type a number (1-4) or command name (partial + tab to autocomplete).")
 
     def precmd(self, line):
@@ -50,9 +58,15 @@ class DataDeleteConsole(cmd.Cmd):
             return 'start_cleaning'
         return line
 
+    def postcmd(self, stop, line):
+        for announcement in (self.refresher.take_announcement(), self.backup.take_announcement()):
+            if announcement and not stop:
+                print(announcement)
+        return stop
+
     def do_user_info(self, arg):
         """Populate or modify user PII in the database."""
-        userinfo(self.passphrase)
+        self.session.run_menu(userinfo)
         self.show_menu()
 
     def do_database(self, arg):
@@ -67,7 +81,7 @@ class DataDeleteConsole(cmd.Cmd):
             choice = input("Enter choice (1-5): ").strip()
             
             if choice == '1':
-                view_db(self.passphrase)
+                self.session.run_menu(view_db)
             elif choice == '2':
                 print("Delete entries not implemented yet.")
             elif choice == '3':
@@ -80,11 +94,10 @@ class DataDeleteConsole(cmd.Cmd):
                 contact = input("Enter contact info (optional): ")
                 requirements = input("Enter requirements (optional): ")
                 notes = input("Enter notes (optional): ")
-                last_updated = datetime.date.today().isoformat()
-                self.cursor.execute("""
-                INSERT INTO broker_sites (name, url, deletion_url, privacy_policy, contact, requirements, notes, last_updated)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (name, url, deletion_url, privacy_policy or None, contact or None, requirements or None, notes or None, last_updated))
+                last_updated = date.today().isoformat()
+                BrokerRepo(self.conn).add(name=name, url=url, deletion_url=deletion_url, privacy_policy=privacy_policy or None,
+                                          contact=contact or None, requirements=requirements or None, notes=notes or None,
+                                          last_updated=last_updated)
                 self.conn.commit()
                 print("Broker site added.")
             elif choice == '5':
@@ -100,17 +113,203 @@ class DataDeleteConsole(cmd.Cmd):
 
     def do_start_cleaning(self, arg):
         """Manage data broker cleaning requests."""
-        cleaning(self.passphrase)
+        self.session.run_menu(cleaning)
         self.show_menu()
 
+    def do_refresh(self, arg):
+        """Refresh the broker catalog in the background. Usage: refresh [status|force|wait]"""
+        arg = arg.strip().lower()
+        if arg == 'status':
+            print(self.refresher.status_line())
+        elif arg == 'wait':
+            print("Waiting for catalog refresh to finish (Ctrl+C to exit GHOSTWIPE)...")
+            self.refresher.wait()
+            print(self.refresher.status_line())
+            self.refresher.announced = True
+        elif arg in ('', 'force'):
+            if self.refresher.start(force=(arg == 'force')):
+                print("Catalog refresh started in the background. Type 'refresh status' for progress.")
+            else:
+                print(self.refresher.status_line())
+        else:
+            print("Usage: refresh [status|force|wait]")
+
+    def do_catalog(self, arg):
+        """Share parsed broker catalogs between databases. Usage: catalog [export <path>|import <path>]"""
+        parts = arg.split(maxsplit=1)
+        if not parts:
+            count = BrokerRepo(self.conn).count()
+            workbook_hash = get_catalog_meta(self.conn, 'workbook_sha256')
+            print(f"Broker catalog: {count} sites, workbook {workbook_hash[:12] if workbook_hash else 'unknown'} "
+                  f"(last updated: {get_catalog_meta(self.conn, 'workbook_date') or 'Unknown'}).")
+            print("Usage: catalog export <path> | catalog import <path>")
+            return
+        if len(parts) != 2 or parts[0].lower() not in ('export', 'import'):
+            print("Usage: catalog export <path> | catalog import <path>")
+            return
+        action, path = parts[0].lower(), os.path.expanduser(parts[1].strip())
+        try:
+            if action == 'export':
+                count = export_catalog_snapshot(self.conn, path)
+                print(f"Exported {count} broker sites to {os.path.abspath(path)}.")
+            else:
+                if self.refresher.is_running():
+                    print("A catalog refresh is running; try again when 'refresh status' shows it finished.")
+                    return
+                inserted, updated, unchanged = import_catalog_snapshot(self.conn, path)
+                print(f"Imported catalog from {path}: inserted {inserted}, updated {updated}, unchanged {unchanged}.")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: Unable to {action} catalog snapshot: {e}")
+
+    def do_schedule(self, arg):
+        """Show cleaning work due now and in the next days. Usage: schedule [days]"""
+        try:
+            days = int(arg) if arg.strip() else UPCOMING_DAYS
+        except ValueError:
+            print("Usage: schedule [days]")
+            return
+        schedule = CleaningSchedule(self.conn)
+        today = date.today().isoformat()
+
+        def summary(rows):
+            totals = dict.fromkeys(SCHEDULE_ACTIONS, 0)
+            for _, action, count in rows:
+                totals[action] += count
+            return sum(totals.values()), ', '.join(f"{action} {count}" for action, count in totals.items() if count)
+
+        total, detail = summary(schedule.counts_by_day(today))
+        print(f"\nDue now: {total}{f' ({detail})' if total else ''}")
+        upcoming = schedule.counts_by_day((date.today() + timedelta(days=days)).isoformat(), after=today)
+        print(f"Due in the next {days} days:" if upcoming else f"Nothing falls due in the next {days} days.")
+        for day in sorted({row[0] for row in upcoming}):
+            total, detail = summary(row for row in upcoming if row[0] == day)
+            print(f"  {day}: {total} ({detail})")
+        queue = schedule.due_now(limit=SCHEDULE_LIST_LIMIT)
+        if len(queue) < SCHEDULE_LIST_LIMIT:
+            queue += schedule.due_within(days, limit=SCHEDULE_LIST_LIMIT - len(queue))
+        if queue:
+            print(f"\nNext {len(queue)} in the queue:")
+            for item in queue:
+                print(f"  {item.next_action_at} {item.action:<8} {item.name} (site_id: {item.site_id})")
+        if not upcoming:
+            later = schedule.next_due()
+            if later:
+                print(f"Next scheduled: {later.action} {later.name} on {later.next_action_at}.")
+
+    def do_backup(self, arg):
+        """Back up the database. Usage: backup [status|wait|list|copy <path>|restore <id> <path>|prune]"""
+        parts = arg.split(maxsplit=1)
+        action = parts[0].lower() if parts else ''
+        store = self.backup.store
+        if action == 'status':
+            print(self.backup.status_line())
+        elif action == 'wait':
+            print("Waiting for the backup to finish...")
+            self.backup.wait()
+            print(self.backup.status_line())
+            self.backup.announced = True
+        elif action == 'list':
+            snapshots = store.snapshots()
+            if not snapshots:
+                print("No backup snapshots.")
+                return
+            for manifest in snapshots:
+                print(f"{manifest['id']}  {manifest['created_at']}  {manifest['label']:<12} "
+                      f"{manifest['size'] // 1024:>8} KiB  ({manifest['new_bytes'] // 1024} KiB new)")
+            logical = sum(manifest['size'] for manifest in snapshots)
+            print(f"{len(snapshots)} snapshots, {logical // 1024} KiB total, {store.disk_usage() // 1024} KiB on disk.")
+        elif action == 'prune':
+            if self.backup.is_running():
+                print(self.backup.status_line())
+                return
+            snapshots, chunks = store.prune()
+            print(f"Pruned {snapshots} snapshots and {chunks} unused chunks.")
+        elif action == 'restore':
+            restore_args = parts[1].split(maxsplit=1) if len(parts) == 2 else []
+            if len(restore_args) != 2:
+                print("Usage: backup restore <snapshot id> <path> (see 'backup list')")
+                return
+            snapshot_id, path = restore_args[0], os.path.expanduser(restore_args[1].strip())
+            if os.path.abspath(path) == os.path.abspath(self.session.db_path):
+                print("Cannot restore over the open database. Restore to another path, exit GHOSTWIPE, then "
+                      f"replace {self.session.db_path} with it.")
+                return
+            try:
+                manifest = store.restore(snapshot_id, path)
+                print(f"Restored snapshot {snapshot_id} ({manifest['created_at']}) to {os.path.abspath(path)}.")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error: Unable to restore backup snapshot: {e}")
+        elif action in ('', 'copy'):
+            if action == 'copy' and len(parts) != 2:
+                print("Usage: backup copy <path>")
+                return
+            path = os.path.expanduser(parts[1].strip()) if action == 'copy' else None
+            if self.backup.start(path):
+                print("Backup started in the background. Type 'backup status' for progress.")
+            else:
+                print(self.backup.status_line())
+        else:
+            print("Usage: backup [status|wait|list|copy <path>|restore <id> <path>|prune]")
+
+    def do_rekey(self, arg):
+        """Re-encrypt the database with a new password and/or cipher settings. Usage: rekey [kdf_iter=N] [page_size=N]"""
+        old_key = self.session.key
+        if not old_key:
+            print("The database is not encrypted; encrypt it from the launcher (ghwi.py).")
+            return
+        if self.refresher.is_running() or self.backup.is_running():
+            print("Wait for the catalog refresh and backup to finish ('refresh status', 'backup status').")
+            return
+        settings = configured_settings()._asdict()
+        for part in arg.split():
+            name, _, value = part.partition('=')
+            if name not in settings or not value.isdigit():
+                print("Usage: rekey [kdf_iter=N] [page_size=N]")
+                return
+            settings[name] = int(value)
+        settings = CipherSettings(**settings)
+        if settings.page_size < 512 or settings.page_size > 65536 or settings.page_size & (settings.page_size - 1):
+            print("page_size must be a power of two between 512 and 65536.")
+            return
+        current = getpass.getpass("Current password: ")
+        if DatabaseKey.derive(current, old_key.salt, old_key.settings).key != old_key.key:
+            print("Incorrect password.")
+            return
+        passphrase = getpass.getpass("New password (blank to keep the current one): ") or current
+        if passphrase != current and getpass.getpass("Confirm new password: ") != passphrase:
+            print("Passwords do not match.")
+            return
+        db_path = self.session.db_path
+        snapshot = BackupStore().snapshot(self.conn, db_path, 'pre_rekey')
+        print(f"Backed up the current database as snapshot {snapshot['id']}.")
+        self.session.close()
+        try:
+            key = reencrypt_database(db_path, old_key, passphrase, settings, progress=lambda done, total: print(
+                f"\rRe-encrypting: {done * 100 // max(total, 1)}% ({done / 2**20:.1f}/{total / 2**20:.1f} MiB)", end=''))
+            print(f"\nDatabase re-encrypted (kdf_iter={settings.kdf_iter}, page_size={settings.page_size}).")
+        except Exception as e:
+            key = old_key
+            print(f"\nError: Re-encryption failed, database left unchanged: {e}")
+        self.session = Session(None, db_path, key=key)
+        self.conn = self.session.conn
+        self.refresher = CatalogRefresher(self.session)
+        self.backup = BackgroundBackup(self.session)
+
     def do_quit(self, arg):
         """Exit the tool."""
+        if self.refresher.is_running():
+            print("Abandoning catalog refresh in progress; broker_sites is left unchanged.")
+            self.refresher.abandon()
+        if self.backup.is_running():
+            print("Finishing the backup in progress before exiting...")
+            self.backup.wait()
+            print(self.backup.status_line())
         print("Exiting GHOSTWIPE.")
-        self.conn.close()
+        self.session.close()
         return True
 
     def complete(self, text, state):
-        options = ['user_info', 'database', 'scan', 'start_cleaning', 'quit']
+        options = ['user_info', 'database', 'scan', 'start_cleaning', 'refresh', 'catalog', 'schedule', 'rekey', 'backup', 'quit']
         matches = [opt for opt in options if opt.startswith(text)]
         if state < len(matches):
             return matches[state]
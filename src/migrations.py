@@ -0,0 +1,401 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+BROKER_FTS_COLUMNS = ('name', 'url', 'deletion_url', 'privacy_policy', 'contact', 'requirements', 'notes')
+
+def create_broker_search_index(conn):
+    """Create the broker_sites_fts full-text index, kept in sync by triggers.
+
+    Skipped (with a warning) if this SQLite build lacks FTS5; search then falls back to LIKE.
+    """
+    columns = ', '.join(BROKER_FTS_COLUMNS)
+    old_values = ', '.join('old.' + column for column in BROKER_FTS_COLUMNS)
+    new_values = ', '.join('new.' + column for column in BROKER_FTS_COLUMNS)
+    try:
+        conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS broker_sites_fts USING fts5(
+            {columns},
+            content='broker_sites', content_rowid='site_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """)
+    except Exception as e:
+        if 'fts5' not in str(e):
+            raise
+        logger.warning("FTS5 unavailable (%s); broker search will use LIKE", e)
+        print(f"Warning: This SQLite build has no full-text search (FTS5): {e}. Broker search will be slower.")
+        return
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS broker_sites_fts_insert AFTER INSERT ON broker_sites BEGIN
+        INSERT INTO broker_sites_fts (rowid, {columns}) VALUES (new.site_id, {new_values});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS broker_sites_fts_delete AFTER DELETE ON broker_sites BEGIN
+        INSERT INTO broker_sites_fts (broker_sites_fts, rowid, {columns}) VALUES ('delete', old.site_id, {old_values});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS broker_sites_fts_update AFTER UPDATE OF {columns} ON broker_sites BEGIN
+        INSERT INTO broker_sites_fts (broker_sites_fts, rowid, {columns}) VALUES ('delete', old.site_id, {old_values});
+        INSERT INTO broker_sites_fts (rowid, {columns}) VALUES (new.site_id, {new_values});
+    END
+    """)
+    conn.execute("INSERT INTO broker_sites_fts (broker_sites_fts) VALUES ('rebuild')")
+
+# Per-user tables as of migration 5: primary key, other columns, foreign keys besides
+# user_id, and the indexes the rebuild has to recreate. Frozen with the migration.
+USER_CHILD_TABLES = {
+    'addresses': ("address_id", ["street TEXT", "city TEXT", "state TEXT", "zip TEXT", "is_current BOOLEAN"], [], [
+        "CREATE INDEX IF NOT EXISTS idx_addresses_user_id ON addresses (user_id)",
+    ]),
+    'emails': ("email_id", ["email_address TEXT", "source_site TEXT", "is_active BOOLEAN"], [], [
+        "CREATE INDEX IF NOT EXISTS idx_emails_user_id ON emails (user_id)",
+    ]),
+    'phone_numbers': ("phone_id", ["phone_number TEXT", "source_site TEXT", "is_active BOOLEAN"], [], [
+        "CREATE INDEX IF NOT EXISTS idx_phone_numbers_user_id ON phone_numbers (user_id)",
+    ]),
+    'usernames': ("username_id", ["username TEXT", "platform TEXT", "is_tied BOOLEAN"], [], [
+        "CREATE INDEX IF NOT EXISTS idx_usernames_user_id ON usernames (user_id)",
+    ]),
+    'opt_out_requests': ("request_id", ["site_id INTEGER", "status TEXT", "request_date TEXT"],
+                         ["FOREIGN KEY (site_id) REFERENCES broker_sites (site_id)"], [
+        "CREATE INDEX IF NOT EXISTS idx_opt_out_requests_user_id ON opt_out_requests (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_opt_out_requests_site_id ON opt_out_requests (site_id)",
+        "CREATE INDEX IF NOT EXISTS idx_opt_out_requests_status_date ON opt_out_requests (status, request_date)",
+    ]),
+}
+
+def cascade_user_deletes(conn):
+    """Rebuild the per-user tables so their user_id foreign keys are ON DELETE CASCADE.
+
+    SQLite can't alter a foreign key in place: each table is copied into a new one and
+    swapped in (the runner turns foreign_keys off for this). Rows of users that no
+    longer exist are dropped, since the new constraint would reject them. AUTOINCREMENT
+    counters are carried over so deleted ids are never reused.
+    """
+    for table, (key, columns, foreign_keys, indexes) in USER_CHILD_TABLES.items():
+        definitions = ([f"{key} INTEGER PRIMARY KEY AUTOINCREMENT", "user_id INTEGER"] + columns
+                       + ["FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE"] + foreign_keys)
+        conn.execute(f"CREATE TABLE {table}_cascade ({', '.join(definitions)})")
+        names = ', '.join([key, 'user_id'] + [column.split()[0] for column in columns])
+        copied = conn.execute(f"""
+        INSERT INTO {table}_cascade ({names})
+        SELECT {names} FROM {table}
+        WHERE user_id IS NULL OR user_id IN (SELECT user_id FROM users)
+        """).rowcount
+        orphans = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - copied
+        if orphans:
+            logger.warning("Dropped %d %s rows of users that no longer exist", orphans, table)
+            print(f"Warning: Dropped {orphans} {table} rows of users that no longer exist "
+                  "(they are kept in the pre-migration backup snapshot).")
+        sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_cascade RENAME TO {table}")
+        if sequence:
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, sequence[0]))
+        for index in indexes:
+            conn.execute(index)
+
+def dedupe_cleaning_records(conn):
+    """Keep only the newest cleaning record of each broker site, reporting how many were dropped."""
+    dropped = conn.execute("""
+    DELETE FROM cleaning_records
+    WHERE site_id IS NOT NULL
+      AND record_id NOT IN (SELECT MAX(record_id) FROM cleaning_records WHERE site_id IS NOT NULL GROUP BY site_id)
+    """).rowcount
+    if dropped:
+        logger.warning("Dropped %d duplicate cleaning_records rows", dropped)
+        print(f"Warning: Dropped {dropped} older duplicate cleaning_records rows, keeping each site's newest "
+              "(they are kept in the pre-migration backup snapshot).")
+
+def cleaning_status_case(date_cleaned, date_confirmed_deleted, as_of):
+    """SQL CASE giving a cleaning record's status on the day as_of (SQL expressions).
+
+    The same rule as the cleaning_site_status view; a site without a record is 'expired'.
+    """
+    return f"""CASE
+        WHEN {date_cleaned} IS NULL AND {date_confirmed_deleted} IS NULL
+          OR julianday({as_of}) - julianday({date_confirmed_deleted}) > 183 THEN 'expired'
+        WHEN {date_confirmed_deleted} IS NULL AND julianday({as_of}) - julianday({date_cleaned}) > 30 THEN 'needs_verification'
+        ELSE 'clean'
+    END"""
+
+def create_cleaning_status_summary(conn):
+    """Create cleaning_status_summary, per-status site counts kept current by triggers.
+
+    Counts are as of the summary's as_of day: triggers on cleaning_records and
+    broker_sites move a site between statuses when its record changes, and
+    CleaningRepo ages the counts across the 30 and 183 day thresholds when the day
+    changes. Records are upserted, not INSERT OR REPLACEd: a REPLACE deletes the old
+    row without firing the delete trigger, which would count that site twice.
+    """
+    as_of = "(SELECT as_of FROM cleaning_status_summary LIMIT 1)"
+    old_status = cleaning_status_case('old.date_cleaned', 'old.date_confirmed_deleted', as_of)
+    new_status = cleaning_status_case('new.date_cleaned', 'new.date_confirmed_deleted', as_of)
+
+    def move(site, from_status, to_status):
+        # One site changes status; a no-op unless it is a broker site
+        exists = f"EXISTS (SELECT 1 FROM broker_sites WHERE site_id = {site})"
+        return f"""
+        UPDATE cleaning_status_summary SET site_count = site_count - 1 WHERE status = {from_status} AND {exists};
+        UPDATE cleaning_status_summary SET site_count = site_count + 1 WHERE status = {to_status} AND {exists};"""
+
+    def site_status(site):
+        record_status = cleaning_status_case('cr.date_cleaned', 'cr.date_confirmed_deleted', as_of)
+        return f"COALESCE((SELECT {record_status} FROM cleaning_records cr WHERE cr.site_id = {site}), 'expired')"
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS cleaning_status_summary (
+        status TEXT PRIMARY KEY,
+        site_count INTEGER NOT NULL,
+        as_of TEXT NOT NULL
+    )
+    """)
+    conn.execute("""
+    INSERT INTO cleaning_status_summary (status, site_count, as_of)
+    SELECT status, (SELECT COUNT(*) FROM cleaning_site_status v WHERE v.status = s.status), date('now', 'localtime')
+    FROM (SELECT 'clean' AS status UNION ALL SELECT 'expired' UNION ALL SELECT 'needs_verification') s
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS cleaning_status_insert AFTER INSERT ON cleaning_records BEGIN
+        {move('new.site_id', "'expired'", new_status)}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS cleaning_status_delete AFTER DELETE ON cleaning_records BEGIN
+        {move('old.site_id', old_status, "'expired'")}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS cleaning_status_update
+    AFTER UPDATE OF site_id, date_cleaned, date_confirmed_deleted ON cleaning_records BEGIN
+        {move('old.site_id', old_status, "'expired'")}
+        {move('new.site_id', "'expired'", new_status)}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS cleaning_status_site_insert AFTER INSERT ON broker_sites BEGIN
+        UPDATE cleaning_status_summary SET site_count = site_count + 1 WHERE status = {site_status('new.site_id')};
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS cleaning_status_site_delete AFTER DELETE ON broker_sites BEGIN
+        UPDATE cleaning_status_summary SET site_count = site_count - 1 WHERE status = {site_status('old.site_id')};
+    END
+    """)
+    # The daily aging pass finds threshold crossings by date range: verified ones on the first
+    # column, unverified ones (date_confirmed_deleted IS NULL) on the second
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cleaning_records_dates ON cleaning_records (date_confirmed_deleted, date_cleaned)")
+
+def cleaning_schedule_columns(date_cleaned, date_confirmed_deleted):
+    """SQL for a cleaning record's next action and the day it falls due (SQL expressions).
+
+    A record without dates is due a 'clean' from today, a verified one a 'reclean' on the
+    day the cleaning_site_status view calls it expired, and an unverified one a 'verify'
+    on the day the view says it needs verification.
+    """
+    today = "date('now', 'localtime')"
+    undated = f"{date_cleaned} IS NULL AND {date_confirmed_deleted} IS NULL"
+    return f"""CASE
+        WHEN {undated} THEN 'clean'
+        WHEN {date_confirmed_deleted} IS NOT NULL THEN 'reclean'
+        ELSE 'verify'
+    END, COALESCE(CASE
+        WHEN {undated} THEN {today}
+        WHEN {date_confirmed_deleted} IS NOT NULL THEN date({date_confirmed_deleted}, '+184 days')
+        ELSE date({date_cleaned}, '+31 days')
+    END, {today})"""
+
+def create_cleaning_schedule(conn):
+    """Create cleaning_schedule, every broker site's next action and due day, kept by triggers.
+
+    One row per broker site, indexed on next_action_at so the work due in any window is
+    a range scan. Sites never cleaned are due a 'clean' from the day they were scheduled.
+    Triggers reschedule a site when its cleaning record changes and add or drop its row
+    with the site itself.
+    """
+    unscheduled = "'clean', date('now', 'localtime')"
+    record_columns = cleaning_schedule_columns('new.date_cleaned', 'new.date_confirmed_deleted')
+
+    # An upsert, not INSERT OR REPLACE: the upsert of a cleaning record that fires these
+    # triggers would override a REPLACE here with ABORT
+    reschedule = "ON CONFLICT(site_id) DO UPDATE SET action = excluded.action, next_action_at = excluded.next_action_at"
+
+    def schedule(site, columns, condition='1'):
+        return f"""
+        INSERT INTO cleaning_schedule (site_id, action, next_action_at)
+        SELECT {site}, {columns} WHERE {condition} AND EXISTS (SELECT 1 FROM broker_sites WHERE site_id = {site})
+        {reschedule};"""
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS cleaning_schedule (
+        site_id INTEGER PRIMARY KEY,
+        action TEXT NOT NULL,
+        next_action_at TEXT NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cleaning_schedule_due ON cleaning_schedule (next_action_at)")
+    conn.execute(f"""
+    INSERT INTO cleaning_schedule (site_id, action, next_action_at)
+    SELECT bs.site_id, {cleaning_schedule_columns('cr.date_cleaned', 'cr.date_confirmed_deleted')}
+    FROM broker_sites bs
+    LEFT JOIN cleaning_records cr ON cr.site_id = bs.site_id
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS cleaning_schedule_insert AFTER INSERT ON cleaning_records BEGIN
+        {schedule('new.site_id', record_columns)}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS cleaning_schedule_delete AFTER DELETE ON cleaning_records BEGIN
+        {schedule('old.site_id', unscheduled)}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS cleaning_schedule_update
+    AFTER UPDATE OF site_id, date_cleaned, date_confirmed_deleted ON cleaning_records BEGIN
+        {schedule('old.site_id', unscheduled, 'old.site_id IS NOT new.site_id')}
+        {schedule('new.site_id', record_columns)}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS cleaning_schedule_site_insert AFTER INSERT ON broker_sites BEGIN
+        INSERT INTO cleaning_schedule (site_id, action, next_action_at)
+        SELECT new.site_id, {unscheduled} WHERE NOT EXISTS (SELECT 1 FROM cleaning_records WHERE site_id = new.site_id)
+        UNION ALL
+        SELECT new.site_id, {cleaning_schedule_columns('cr.date_cleaned', 'cr.date_confirmed_deleted')}
+        FROM cleaning_records cr WHERE cr.site_id = new.site_id
+        {reschedule};
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS cleaning_schedule_site_delete AFTER DELETE ON broker_sites BEGIN
+        DELETE FROM cleaning_schedule WHERE site_id = old.site_id;
+    END
+    """)
+
+# Ordered schema migrations: (user_version, description, steps). A step is a SQL string
+# or a function taking the connection. Never edit or reorder a released migration;
+# append a new one instead.
+MIGRATIONS = [
+    (1, "Index child tables on user_id", [
+        "CREATE INDEX IF NOT EXISTS idx_addresses_user_id ON addresses (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_emails_user_id ON emails (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_phone_numbers_user_id ON phone_numbers (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_usernames_user_id ON usernames (user_id)",
+    ]),
+    (2, "One cleaning record per broker site", [
+        # INSERT OR REPLACE in cleaning.py assumed this constraint; keep the newest duplicate
+        dedupe_cleaning_records,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_cleaning_records_site_id ON cleaning_records (site_id)",
+    ]),
+    (3, "Index opt-out requests by user, site and status/date", [
+        "CREATE INDEX IF NOT EXISTS idx_opt_out_requests_user_id ON opt_out_requests (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_opt_out_requests_site_id ON opt_out_requests (site_id)",
+        "CREATE INDEX IF NOT EXISTS idx_opt_out_requests_status_date ON opt_out_requests (status, request_date)",
+    ]),
+    (4, "Full-text search index for broker_sites", [create_broker_search_index]),
+    (5, "Cascade user deletes to per-user tables", [cascade_user_deletes]),
+    (6, "Cleaning status of every broker site as a view", [
+        # Days are whole local-calendar days, as datetime.date arithmetic counted them
+        """CREATE VIEW IF NOT EXISTS cleaning_site_status AS
+        SELECT bs.site_id, bs.name, bs.url, bs.deletion_url, cr.date_cleaned, cr.date_confirmed_deleted,
+               CASE
+                   WHEN cr.site_id IS NULL
+                     OR cr.date_cleaned IS NULL AND cr.date_confirmed_deleted IS NULL
+                     OR julianday(date('now', 'localtime')) - julianday(cr.date_confirmed_deleted) > 183 THEN 'expired'
+                   WHEN cr.date_confirmed_deleted IS NULL
+                    AND julianday(date('now', 'localtime')) - julianday(cr.date_cleaned) > 30 THEN 'needs_verification'
+                   ELSE 'clean'
+               END AS status
+        FROM broker_sites bs
+        LEFT JOIN cleaning_records cr ON cr.site_id = bs.site_id""",
+    ]),
+    (7, "Cleaning status counts maintained by triggers", [create_cleaning_status_summary]),
+    (8, "Due-date schedule of cleaning actions", [create_cleaning_schedule]),
+    (9, "Resumable automated cleaning runs", [
+        # position: the next queue entry to work on; outcome stays NULL until an entry is handled
+        """CREATE TABLE IF NOT EXISTS cleaning_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            total INTEGER NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS cleaning_run_queue (
+            run_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            site_id INTEGER NOT NULL,
+            outcome TEXT,
+            PRIMARY KEY (run_id, position),
+            FOREIGN KEY (run_id) REFERENCES cleaning_runs (run_id) ON DELETE CASCADE
+        ) WITHOUT ROWID""",
+    ]),
+]
+
+# Migrations that rebuild tables: run with foreign_keys OFF (it can't change inside a
+# transaction) and checked with foreign_key_check before they commit.
+REBUILD_MIGRATIONS = {5}
+
+# Migrations that can delete rows, with the tables they delete from: init_db takes a
+# backup snapshot before applying them to a database with rows in those tables
+LOSSY_MIGRATIONS = {2: ['cleaning_records'], 5: list(USER_CHILD_TABLES)}
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    """Return the schema version recorded in PRAGMA user_version."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def pending_lossy_migrations(conn):
+    """Return the row-deleting migrations migrate() would apply to non-empty tables of this database."""
+    version = schema_version(conn)
+    return sorted(target for target, tables in LOSSY_MIGRATIONS.items() if target > version
+                  and any(conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() for table in tables))
+
+def migrate(conn):
+    """Apply every migration newer than the database's user_version, in order.
+
+    Each migration and its user_version bump commit together, so an interrupted
+    upgrade resumes at the first migration that didn't finish. Returns the new version.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    version = schema_version(conn)
+    if version > LATEST_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this GHOSTWIPE (supports {LATEST_VERSION})")
+    for target, description, steps in MIGRATIONS:
+        if target <= version:
+            continue
+        logger.info("Applying schema migration %d: %s", target, description)
+        rebuild = target in REBUILD_MIGRATIONS
+        if rebuild:
+            foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+            conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("BEGIN")
+        try:
+            if rebuild:
+                # Pre-existing violations (e.g. requests for a since-deleted broker) aren't the rebuild's to fix
+                violations_before = len(conn.execute("PRAGMA foreign_key_check").fetchall())
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            if rebuild:
+                violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+                if len(violations) > violations_before:
+                    raise RuntimeError(f"Schema migration {target} would add foreign key violations: {violations[:3]}")
+            conn.execute(f"PRAGMA user_version = {int(target)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if rebuild:
+                conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+        version = target
+    return version
@@ -1,31 +1,22 @@
-import sqlite3
-import sqlcipher3
-import os
 import signal
+from src.repos import UserRepo
 
 def signal_handler(sig, frame):
     """Handle Ctrl+S to skip input."""
     raise KeyboardInterrupt
 
-def modify_names(passphrase, user_id):
+def modify_names(session, user_id):
     """Modify name information for a specific user_id."""
-    db_path = os.path.join('data', 'pii_data.db')
-    conn = None
+    conn = session.conn
     try:
-        conn = sqlcipher3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA key = '{passphrase}'")
-        cursor.execute("PRAGMA kdf_iter = 64000")
-        cursor.execute("PRAGMA cipher_page_size = 4096")
-        cursor.execute("PRAGMA foreign_keys = ON")
+        users = UserRepo(conn)
         
-        cursor.execute("SELECT first_name, last_name FROM users WHERE user_id = ?", (user_id,))
-        user = cursor.fetchone()
+        user = users.get(user_id)
         if not user:
             print(f"No user found with user_id {user_id}.")
             return
         
-        first_name, last_name = user
+        first_name, last_name = user.first_name, user.last_name
         print(f"\nCurrent Name: {first_name or ''} {last_name or ''}")
         print("Enter new details (Ctrl+S to skip, leave blank to keep current):")
         
@@ -51,16 +42,9 @@ def modify_names(passphrase, user_id):
             print("At least one of First Name or Last Name is required.")
             return
         
-        cursor.execute("""
-        UPDATE users
-        SET first_name = ?, middle_name = ?, last_name = ?
-        WHERE user_id = ?
-        """, (new_first_name, new_middle_name, new_last_name, user_id))
+        users.update(user_id, first_name=new_first_name, middle_name=new_middle_name, last_name=new_last_name)
         conn.commit()
         print(f"Name updated for user_id {user_id}.")
     
     except Exception as e:
         print(f"Error modifying names: {e}")
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -1,23 +1,15 @@
-import sqlite3
-import sqlcipher3
-import os
 import signal
+from src.repos import PhoneNumberRepo
 
 def signal_handler(sig, frame):
     """Handle Ctrl+S to skip input."""
     raise KeyboardInterrupt
 
-def modify_phone_numbers(passphrase, user_id):
+def modify_phone_numbers(session, user_id):
     """Modify phone number information for a specific user_id."""
-    db_path = os.path.join('data', 'pii_data.db')
-    conn = None
+    conn = session.conn
     try:
-        conn = sqlcipher3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA key = '{passphrase}'")
-        cursor.execute("PRAGMA kdf_iter = 64000")
-        cursor.execute("PRAGMA cipher_page_size = 4096")
-        cursor.execute("PRAGMA foreign_keys = ON")
+        repo = PhoneNumberRepo(conn)
         
         while True:
             print("\nPhone Number Options:")
@@ -51,22 +43,18 @@ def modify_phone_numbers(passphrase, user_id):
                     print("Phone number is required.")
                     continue
                 
-                cursor.execute("""
-                INSERT INTO phone_numbers (user_id, phone_number, source_site, is_active)
-                VALUES (?, ?, ?, ?)
-                """, (user_id, phone_number, source_site, is_active))
+                repo.add(user_id=user_id, phone_number=phone_number, source_site=source_site, is_active=is_active)
                 conn.commit()
                 print("Phone number added.")
             
             elif choice == '2':
-                cursor.execute("SELECT phone_id, phone_number, source_site, is_active FROM phone_numbers WHERE user_id = ?", (user_id,))
-                phones = cursor.fetchall()
+                phones = repo.for_user(user_id)
                 if not phones:
                     print("No phone numbers found for this user.")
                 else:
                     print("\nPhone Numbers:")
                     for phone in phones:
-                        phone_id, phone_number, source_site, is_active = phone
+                        phone_id, _, phone_number, source_site, is_active = phone
                         print(f"Phone ID: {phone_id}")
                         print(f"Phone Number: {phone_number}")
                         print(f"Source Site: {source_site or 'None'}")
@@ -74,22 +62,20 @@ def modify_phone_numbers(passphrase, user_id):
                         print()
             
             elif choice == '3':
-                cursor.execute("SELECT phone_id, phone_number FROM phone_numbers WHERE user_id = ?", (user_id,))
-                phones = cursor.fetchall()
+                phones = repo.for_user(user_id)
                 if not phones:
                     print("No phone numbers found for this user.")
                     continue
                 print("\nPhone Numbers:")
                 for phone in phones:
-                    phone_id, phone_number = phone
+                    phone_id, phone_number = phone.phone_id, phone.phone_number
                     print(f"Phone ID: {phone_id}, {phone_number}")
                 try:
                     phone_id = int(input("Enter phone_id to delete: ").strip())
-                    cursor.execute("SELECT 1 FROM phone_numbers WHERE phone_id = ? AND user_id = ?", (phone_id, user_id))
-                    if not cursor.fetchone():
+                    if not repo.owned_by(phone_id, user_id):
                         print(f"No phone number found with phone_id {phone_id} for this user.")
                         continue
-                    cursor.execute("DELETE FROM phone_numbers WHERE phone_id = ?", (phone_id,))
+                    repo.delete(phone_id)
                     conn.commit()
                     print(f"Phone ID {phone_id} deleted.")
                 except ValueError:
@@ -102,6 +88,3 @@ def modify_phone_numbers(passphrase, user_id):
     
     except Exception as e:
         print(f"Error managing phone numbers: {e}")
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import os
+import logging
+import sqlcipher3
+from src.keys import SALT_BYTES, DatabaseKey, configured_settings, write_cipher_settings
+
+PROGRESS_OPS = 50000  # SQLite VM instructions between progress reports during the export
+logger = logging.getLogger(__name__)
+
+def table_counts(conn, schema='main'):
+    """Return {table: row count} for a schema's ordinary tables (virtual tables read their shadow tables)."""
+    names = [row[0] for row in conn.execute(
+        f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+        "AND sql NOT LIKE 'CREATE VIRTUAL TABLE%' ORDER BY name")]
+    return {name: conn.execute(f'SELECT COUNT(*) FROM {schema}."{name}"').fetchone()[0] for name in names}
+
+def reencrypt_database(db_path, source_key, passphrase, settings=None, progress=None):
+    """Re-encrypt db_path under passphrase with new cipher settings; returns the new DatabaseKey.
+
+    source_key opens the current database (None if it is unencrypted). The database is
+    exported with sqlcipher_export into <db>.reencrypting, keyed with a new salt and
+    settings (default: the configured cipher_kdf_iter / cipher_page_size), which can
+    change KDF iterations and page size as well as the passphrase. The copy's
+    user_version is carried over and its per-table row counts, sqlite_sequence and
+    quick_check are verified before it replaces the original with os.replace. The
+    original is untouched until then, so an interrupted run is simply run again.
+    progress(bytes_written, source_bytes) is called periodically during the export.
+    """
+    settings = settings or configured_settings()
+    salt = os.urandom(SALT_BYTES)
+    key = DatabaseKey.derive(passphrase, salt, settings)
+    target_path = db_path + '.reencrypting'
+    for stale in (target_path, target_path + '-journal'):
+        if os.path.exists(stale):
+            os.remove(stale)
+    source_bytes = os.path.getsize(db_path)
+
+    def report():
+        try:
+            progress(min(os.path.getsize(target_path), source_bytes), source_bytes)
+        except OSError:
+            pass
+        return 0
+
+    conn = sqlcipher3.connect(db_path)
+    try:
+        if source_key:
+            source_key.apply(conn)
+        conn.execute("ATTACH DATABASE ? AS reencrypted KEY ?", (target_path, key.raw_key()))
+        conn.execute(f"PRAGMA reencrypted.cipher_page_size = {int(settings.page_size)}")
+        if progress:
+            conn.set_progress_handler(report, PROGRESS_OPS)
+        conn.execute("SELECT sqlcipher_export('reencrypted')")
+        conn.set_progress_handler(None, 0)
+        user_version = conn.execute("PRAGMA main.user_version").fetchone()[0]
+        conn.execute(f"PRAGMA reencrypted.user_version = {int(user_version)}")
+
+        source_counts, target_counts = table_counts(conn, 'main'), table_counts(conn, 'reencrypted')
+        if source_counts != target_counts:
+            different = sorted(name for name in source_counts.keys() | target_counts.keys()
+                               if source_counts.get(name) != target_counts.get(name))
+            raise RuntimeError(f"Re-encrypted copy has different row counts in: {', '.join(different)}")
+        sequence_sql = "SELECT name, seq FROM {}.sqlite_sequence ORDER BY name"
+        has_sequence = conn.execute("SELECT 1 FROM main.sqlite_master WHERE name = 'sqlite_sequence'").fetchone()
+        if has_sequence and (conn.execute(sequence_sql.format('main')).fetchall()
+                             != conn.execute(sequence_sql.format('reencrypted')).fetchall()):
+            raise RuntimeError("Re-encrypted copy has different AUTOINCREMENT counters")
+        check = conn.execute("PRAGMA reencrypted.quick_check").fetchone()[0]
+        if check != 'ok':
+            raise RuntimeError(f"Re-encrypted copy failed its integrity check: {check}")
+        conn.execute("DETACH DATABASE reencrypted")
+    except BaseException:
+        conn.close()
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        raise
+    conn.close()
+    if progress:
+        progress(source_bytes, source_bytes)
+
+    # Record the new salt's settings first: until the swap the old entry still serves the old file
+    write_cipher_settings(db_path, salt, settings)
+    os.replace(target_path, db_path)
+    write_cipher_settings(db_path, salt, settings, keep_salts=(salt,))
+    logger.info("Re-encrypted %s (%d tables; kdf_iter=%d, page_size=%d)",
+                db_path, len(source_counts), settings.kdf_iter, settings.page_size)
+    return key
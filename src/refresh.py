@@ -0,0 +1,106 @@
+import threading
+import collections
+import time
+from src.db import populate_broker_sites
+from src.workbook import cancel_page_extraction
+
+class CatalogRefresher:
+    """Refresh broker_sites from the workbook on a background thread with its own session connection.
+
+    The console keeps reading the existing broker_sites rows while a refresh runs; the
+    refresh commits its changes in a single transaction at the end.
+    """
+    def __init__(self, session):
+        self.session = session
+        self.thread = None
+        self.lock = threading.Lock()
+        self.state = 'idle'  # idle, running, done, failed
+        self.stage = None
+        self.done = None
+        self.total = None
+        self.messages = collections.deque(maxlen=20)  # Most recent status messages
+        self.result = None
+        self.started_at = None
+        self.finished_at = None
+        self.announced = True
+
+    def start(self, force=False):
+        """Start a refresh unless one is already running; return True if started."""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return False
+            self.state = 'running'
+            self.stage = 'starting'
+            self.done = self.total = None
+            self.messages.clear()
+            self.result = None
+            self.started_at = time.monotonic()
+            self.finished_at = None
+            self.announced = False
+            self.thread = threading.Thread(target=self._run, args=(force,), name='catalog-refresh', daemon=True)
+            self.thread.start()
+            return True
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def wait(self, timeout=None):
+        """Block until the current refresh finishes (or timeout); return True if finished."""
+        if self.thread:
+            self.thread.join(timeout)
+        return not self.is_running()
+
+    def abandon(self):
+        """Cancel outstanding PDF extraction so exiting does not wait for the refresh to finish.
+
+        The refresh fails and rolls back, leaving broker_sites unchanged.
+        """
+        if self.is_running():
+            cancel_page_extraction()
+
+    def _run(self, force):
+        try:
+            conn = self.session.connection('catalog-refresh')
+            self.result = populate_broker_sites(conn, force=force, progress=self._progress, log=self._log)
+            state = 'done' if self.result is not None else 'failed'
+        except Exception as e:
+            self._log(f"Error refreshing broker catalog: {e}")
+            state = 'failed'
+        with self.lock:
+            self.state = state
+            self.stage = None
+            self.finished_at = time.monotonic()
+
+    def _progress(self, stage, done=None, total=None):
+        with self.lock:
+            self.stage = stage
+            self.done = done
+            self.total = total
+
+    def _log(self, message):
+        with self.lock:
+            self.messages.append(message)
+
+    def status_line(self):
+        """Return a one-line description of the refresh state."""
+        with self.lock:
+            if self.state == 'idle':
+                return "Catalog refresh: not started."
+            if self.state == 'running':
+                elapsed = time.monotonic() - self.started_at
+                detail = self.stage
+                if self.done is not None and self.total:
+                    detail += f" page {self.done}/{self.total}"
+                return f"Catalog refresh: running ({detail}, {elapsed:.0f}s)."
+            elapsed = self.finished_at - self.started_at
+            last = self.messages[-1] if self.messages else ''
+            if self.state == 'done':
+                return f"Catalog refresh: finished in {elapsed:.1f}s (workbook last updated: {self.result}). {last}"
+            return f"Catalog refresh: failed after {elapsed:.1f}s; existing broker_sites kept. {last}"
+
+    def take_announcement(self):
+        """Return the status line once after a refresh finishes, else None."""
+        if self.is_running() or self.announced or self.state == 'idle':
+            return None
+        self.announced = True
+        return self.status_line()
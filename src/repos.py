@@ -0,0 +1,493 @@
+import re
+import json
+import sys
+import logging
+import datetime
+from typing import NamedTuple, Optional
+from src.catalog import BROKER_FIELDS
+from src.migrations import BROKER_FTS_COLUMNS
+
+# True when any non-key column differs between two broker_sites rows (NULL and '' compare equal)
+BROKER_CHANGED_SQL = ' OR '.join(f"IFNULL({{old}}.{field}, '') <> IFNULL({{new}}.{field}, '')" for field in BROKER_FIELDS[1:])
+SEARCH_LIMIT = 25
+SEARCH_TERM_RE = re.compile(r'\w+')
+# bm25 column weights, in broker_sites_fts column order: a name match outranks a notes match
+SEARCH_WEIGHTS = (10.0, 4.0, 2.0, 1.0, 2.0, 1.0, 1.0)
+logger = logging.getLogger(__name__)
+
+class BrokerSite(NamedTuple):
+    site_id: int
+    name: str
+    url: Optional[str]
+    deletion_url: Optional[str]
+    privacy_policy: Optional[str]
+    contact: Optional[str]
+    requirements: Optional[str]
+    notes: Optional[str]
+    last_updated: Optional[str]
+
+class User(NamedTuple):
+    user_id: int
+    first_name: Optional[str]
+    middle_name: Optional[str]
+    last_name: Optional[str]
+    primary_email: Optional[str]
+    primary_phone: Optional[str]
+    state: Optional[str]
+
+    @property
+    def display_name(self):
+        return f"{self.first_name or ''} {self.last_name or ''}".strip()
+
+class Address(NamedTuple):
+    address_id: int
+    user_id: int
+    street: Optional[str]
+    city: Optional[str]
+    state: Optional[str]
+    zip: Optional[str]
+    is_current: Optional[int]
+
+class Email(NamedTuple):
+    email_id: int
+    user_id: int
+    email_address: Optional[str]
+    source_site: Optional[str]
+    is_active: Optional[int]
+
+class PhoneNumber(NamedTuple):
+    phone_id: int
+    user_id: int
+    phone_number: Optional[str]
+    source_site: Optional[str]
+    is_active: Optional[int]
+
+class Username(NamedTuple):
+    username_id: int
+    user_id: int
+    username: Optional[str]
+    platform: Optional[str]
+    is_tied: Optional[int]
+
+class OptOutRequest(NamedTuple):
+    request_id: int
+    user_id: int
+    site_id: int
+    status: Optional[str]
+    request_date: Optional[str]
+
+class CleaningRecord(NamedTuple):
+    record_id: int
+    site_id: int
+    site_name: Optional[str]
+    date_cleaned: Optional[str]
+    date_confirmed_deleted: Optional[str]
+
+class CleaningRun(NamedTuple):
+    run_id: int
+    started_at: str
+    finished_at: Optional[str]
+    total: int
+    position: int
+
+class QueuedSite(NamedTuple):
+    position: int
+    site_id: int
+    name: str
+    url: Optional[str]
+    deletion_url: Optional[str]
+    next_action_at: Optional[str]
+
+class Repo:
+    """Owns the SQL for one table and returns rows as its row_type.
+
+    The SQL text of each statement is built once per class, so every call passes the
+    identical string and sqlite3's per-connection statement cache reuses the prepared
+    statement. Repos never commit; the caller owns the transaction.
+    """
+    table = None
+    row_type = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.table is None:
+            return
+        fields = cls.row_type._fields
+        cls.key = fields[0]
+        cls.insert_columns = fields[1:]
+        cls.select_sql = f"SELECT {', '.join(fields)} FROM {cls.table}"
+        cls.get_sql = f"{cls.select_sql} WHERE {cls.key} = ?"
+        cls.insert_sql = (f"INSERT INTO {cls.table} ({', '.join(cls.insert_columns)}) "
+                          f"VALUES ({', '.join('?' * len(cls.insert_columns))})")
+        cls.delete_sql = f"DELETE FROM {cls.table} WHERE {cls.key} = ?"
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _rows(self, sql, params=()):
+        return [self.row_type._make(row) for row in self.conn.execute(sql, params)]
+
+    def get(self, key):
+        """Return the row with this primary key, or None."""
+        row = self.conn.execute(self.get_sql, (key,)).fetchone()
+        return self.row_type._make(row) if row else None
+
+    def all(self):
+        return self._rows(f"{self.select_sql} ORDER BY {self.key}")
+
+    def add(self, **values):
+        """Insert one row (missing columns are NULL); returns its primary key."""
+        return self.conn.execute(self.insert_sql, tuple(values.get(column) for column in self.insert_columns)).lastrowid
+
+    def add_many(self, rows):
+        """Insert many rows (dicts; missing columns are NULL) with one executemany; returns the count."""
+        cursor = self.conn.executemany(self.insert_sql, (tuple(row.get(column) for column in self.insert_columns) for row in rows))
+        return cursor.rowcount
+
+    def update(self, key, **values):
+        """Update some columns of one row; returns True if it exists."""
+        return self.update_many([(key, values)]) > 0
+
+    def update_many(self, changes):
+        """Apply (key, {column: value}) changes; one executemany per distinct column set. Returns rows updated."""
+        batches = {}
+        for key, values in changes:
+            unknown = set(values) - set(self.insert_columns)
+            if unknown:
+                raise ValueError(f"Unknown {self.table} columns: {sorted(unknown)}")
+            columns = tuple(sorted(values))
+            batches.setdefault(columns, []).append(tuple(values[column] for column in columns) + (key,))
+        updated = 0
+        for columns, params in batches.items():
+            sql = f"UPDATE {self.table} SET {', '.join(f'{column} = ?' for column in columns)} WHERE {self.key} = ?"
+            updated += self.conn.executemany(sql, params).rowcount
+        return updated
+
+    def delete(self, key):
+        """Delete one row; returns True if it existed."""
+        return self.conn.execute(self.delete_sql, (key,)).rowcount > 0
+
+    def delete_many(self, keys):
+        return self.conn.executemany(self.delete_sql, ((key,) for key in keys)).rowcount
+
+class UserRepo(Repo):
+    table = 'users'
+    row_type = User
+
+    # Deleting a user cascades to its addresses, emails, phone numbers, usernames and
+    # opt-out requests (ON DELETE CASCADE, through their user_id indexes).
+    purge_sql = "DELETE FROM users WHERE user_id IN (SELECT value FROM json_each(?))"
+
+    def matching(self, name=None, state=None):
+        """Return users whose first, middle or last name contains name and/or whose state is state."""
+        conditions, params = [], []
+        if name:
+            conditions.append("(first_name LIKE ? OR middle_name LIKE ? OR last_name LIKE ?)")
+            params += [f"%{name}%"] * 3
+        if state:
+            conditions.append("state = ? COLLATE NOCASE")
+            params.append(state)
+        if not conditions:
+            raise ValueError("matching() needs a name or state filter")
+        return self._rows(f"{self.select_sql} WHERE {' AND '.join(conditions)} ORDER BY user_id", params)
+
+    def purge(self, user_ids):
+        """Delete these users and all their records with one statement; returns users deleted."""
+        return self.conn.execute(self.purge_sql, (json.dumps(list(user_ids)),)).rowcount
+
+class UserChildRepo(Repo):
+    """A table of per-user rows (addresses, emails, ...), looked up through its user_id index."""
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.for_user_sql = f"{cls.select_sql} WHERE user_id = ? ORDER BY {cls.key}"
+        cls.owned_by_sql = f"SELECT 1 FROM {cls.table} WHERE {cls.key} = ? AND user_id = ?"
+
+    def for_user(self, user_id):
+        return self._rows(self.for_user_sql, (user_id,))
+
+    def owned_by(self, key, user_id):
+        """True if the row exists and belongs to user_id."""
+        return self.conn.execute(self.owned_by_sql, (key, user_id)).fetchone() is not None
+
+class AddressRepo(UserChildRepo):
+    table = 'addresses'
+    row_type = Address
+
+class EmailRepo(UserChildRepo):
+    table = 'emails'
+    row_type = Email
+
+class PhoneNumberRepo(UserChildRepo):
+    table = 'phone_numbers'
+    row_type = PhoneNumber
+
+class UsernameRepo(UserChildRepo):
+    table = 'usernames'
+    row_type = Username
+
+class OptOutRepo(UserChildRepo):
+    table = 'opt_out_requests'
+    row_type = OptOutRequest
+
+    def for_user_with_sites(self, user_id):
+        """Return (request_id, broker name, status, request_date) for a user's requests."""
+        return self.conn.execute("""
+        SELECT oor.request_id, bs.name, oor.status, oor.request_date
+        FROM opt_out_requests oor
+        JOIN broker_sites bs ON oor.site_id = bs.site_id
+        WHERE oor.user_id = ?
+        """, (user_id,)).fetchall()
+
+CLEANING_STATUSES = ('clean', 'expired', 'needs_verification')
+
+class CleaningRepo(Repo):
+    table = 'cleaning_records'
+    row_type = CleaningRecord
+    # One record per site (unique index), so recording a site again overwrites its record. An
+    # upsert rather than INSERT OR REPLACE, so the status summary triggers see an update
+    record_sql = """
+    INSERT INTO cleaning_records (site_id, site_name, date_cleaned, date_confirmed_deleted)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(site_id) DO UPDATE SET
+        site_name = excluded.site_name,
+        date_cleaned = excluded.date_cleaned,
+        date_confirmed_deleted = excluded.date_confirmed_deleted
+    """
+    confirm_sql = "UPDATE cleaning_records SET date_confirmed_deleted = ? WHERE site_id = ?"
+
+    def for_site(self, site_id):
+        rows = self._rows(f"{self.select_sql} WHERE site_id = ?", (site_id,))
+        return rows[0] if rows else None
+
+    def record(self, site_id, site_name, date_cleaned, date_confirmed_deleted=None):
+        """Record a cleaning (and optionally its verification) for a site, replacing any earlier record."""
+        self.conn.execute(self.record_sql, (site_id, site_name, date_cleaned, date_confirmed_deleted))
+
+    def record_many(self, records):
+        """Record many (site_id, site_name, date_cleaned, date_confirmed_deleted) tuples at once."""
+        return self.conn.executemany(self.record_sql, records).rowcount
+
+    def confirm_deleted(self, site_id, date_confirmed_deleted):
+        """Mark a site's cleaning as verified; returns True if it had a record."""
+        return self.conn.execute(self.confirm_sql, (date_confirmed_deleted, site_id)).rowcount > 0
+
+    def confirm_many(self, confirmations):
+        """Apply many (site_id, date_confirmed_deleted) confirmations at once."""
+        return self.conn.executemany(self.confirm_sql, ((date, site_id) for site_id, date in confirmations)).rowcount
+
+    def for_user(self, user_id):
+        """Return cleaning records for the sites a user has opt-out requests with."""
+        return self._rows("""
+        SELECT cr.record_id, cr.site_id, cr.site_name, cr.date_cleaned, cr.date_confirmed_deleted
+        FROM cleaning_records cr
+        JOIN broker_sites bs ON cr.site_id = bs.site_id
+        WHERE cr.site_id IN (SELECT site_id FROM opt_out_requests WHERE user_id = ?)
+        """, (user_id,))
+
+    # Statuses of the cleaning_site_status view (see migration 6): 'expired' covers sites never
+    # cleaned and verifications over 183 days old; 'needs_verification' unverified cleanings
+    # over 30 days old
+    status_sql = "SELECT site_id, name, url, deletion_url FROM cleaning_site_status WHERE status = ? ORDER BY site_id"
+    # Cleanings whose date crossed a threshold between two days: range scans of the
+    # (date_confirmed_deleted, date_cleaned) index (see migration 7)
+    aged_unverified_sql = """
+    SELECT COUNT(*) FROM cleaning_records cr JOIN broker_sites bs ON bs.site_id = cr.site_id
+    WHERE cr.date_confirmed_deleted IS NULL AND cr.date_cleaned >= date(?, '-30 days') AND cr.date_cleaned < date(?, '-30 days')
+    """
+    aged_verified_sql = """
+    SELECT COUNT(*) FROM cleaning_records cr JOIN broker_sites bs ON bs.site_id = cr.site_id
+    WHERE cr.date_confirmed_deleted >= date(?, '-183 days') AND cr.date_confirmed_deleted < date(?, '-183 days')
+    """
+
+    def status_counts(self, today=None):
+        """Return {status: number of broker sites} for every status in CLEANING_STATUSES.
+
+        Reads the trigger-maintained cleaning_status_summary, aging it to today first
+        if it was last aged on an earlier day (the caller commits that).
+        """
+        today = today or datetime.date.today().isoformat()
+        rows = self.conn.execute("SELECT status, site_count, as_of FROM cleaning_status_summary").fetchall()
+        if rows and rows[0][2] != today:
+            self.age_status_summary(rows[0][2], today)
+            rows = self.conn.execute("SELECT status, site_count, as_of FROM cleaning_status_summary").fetchall()
+        counts = dict.fromkeys(CLEANING_STATUSES, 0)
+        counts.update((status, site_count) for status, site_count, _ in rows)
+        return counts
+
+    def age_status_summary(self, as_of, today):
+        """Move the summary's counts from the day as_of to today; returns the sites moved (None if rebuilt).
+
+        Going forward only clean sites change: unverified cleanings turn 'needs_verification'
+        and verifications turn 'expired' as they pass 30 and 183 days, so only records
+        dated in the days that just crossed are counted. If the clock went backwards the
+        counts are rebuilt from the cleaning_site_status view instead.
+        """
+        if today < as_of:
+            self.conn.execute("""
+            UPDATE cleaning_status_summary
+            SET site_count = (SELECT COUNT(*) FROM cleaning_site_status v WHERE v.status = cleaning_status_summary.status),
+                as_of = ?
+            """, (today,))
+            logger.info("Rebuilt cleaning status counts (clock moved back from %s to %s)", as_of, today)
+            return None
+        unverified = self.conn.execute(self.aged_unverified_sql, (as_of, today)).fetchone()[0]
+        verified = self.conn.execute(self.aged_verified_sql, (as_of, today)).fetchone()[0]
+        self.conn.execute("""
+        UPDATE cleaning_status_summary
+        SET site_count = site_count + CASE status WHEN 'clean' THEN -? WHEN 'needs_verification' THEN ? ELSE ? END,
+            as_of = ?
+        """, (unverified + verified, unverified, verified, today))
+        logger.debug("Aged cleaning status counts from %s to %s: %d sites moved", as_of, today, unverified + verified)
+        return unverified + verified
+
+    def sites_with_status(self, status):
+        """Return (site_id, name, url, deletion_url) for the broker sites currently in status."""
+        return self.conn.execute(self.status_sql, (status,)).fetchall()
+
+# Outcomes of a cleaning run's queue entries; 'not_due' entries were handled elsewhere after
+# the run was queued (e.g. by batch cleaning) and are passed over
+RUN_OUTCOMES = ('cleaned', 'verified', 'failed', 'skipped', 'not_due')
+
+class CleaningRunRepo(Repo):
+    """Automated cleaning runs: the ordered queue of sites a run works through and its position.
+
+    The position moves in the same transaction as each site's cleaning record, so a run
+    resumed after an exit or crash starts at the first site whose outcome isn't saved.
+    """
+    table = 'cleaning_runs'
+    row_type = CleaningRun
+    advance_sql = "UPDATE cleaning_run_queue SET outcome = ? WHERE run_id = ? AND position = ?"
+
+    def current(self):
+        """Return the newest unfinished run, or None."""
+        rows = self._rows(f"{self.select_sql} WHERE finished_at IS NULL ORDER BY run_id DESC LIMIT 1")
+        return rows[0] if rows else None
+
+    def start(self, site_ids, started_at):
+        """Queue site_ids in order as a new run; returns the run."""
+        site_ids = list(site_ids)
+        run_id = self.add(started_at=started_at, total=len(site_ids), position=0)
+        self.conn.executemany("INSERT INTO cleaning_run_queue (run_id, position, site_id) VALUES (?, ?, ?)",
+                              ((run_id, position, site_id) for position, site_id in enumerate(site_ids)))
+        return self.get(run_id)
+
+    def remaining(self, run):
+        """Return the run's unhandled entries as QueuedSites, in queue order.
+
+        next_action_at is the site's current due day in the schedule; entries of broker
+        sites deleted since the run was queued are left out.
+        """
+        return [QueuedSite._make(row) for row in self.conn.execute("""
+        SELECT q.position, q.site_id, bs.name, bs.url, bs.deletion_url, cs.next_action_at
+        FROM cleaning_run_queue q
+        JOIN broker_sites bs ON bs.site_id = q.site_id
+        LEFT JOIN cleaning_schedule cs ON cs.site_id = q.site_id
+        WHERE q.run_id = ? AND q.position >= ?
+        ORDER BY q.position
+        """, (run.run_id, run.position))]
+
+    def advance(self, run_id, position, outcome):
+        """Save an entry's outcome (one of RUN_OUTCOMES) and move the run past it."""
+        if outcome not in RUN_OUTCOMES:
+            raise ValueError(f"Unknown cleaning run outcome: {outcome!r}")
+        self.conn.execute(self.advance_sql, (outcome, run_id, position))
+        self.conn.execute("UPDATE cleaning_runs SET position = ? WHERE run_id = ?", (position + 1, run_id))
+
+    def outcome_counts(self, run_id):
+        """Return {outcome: entries} for the run's handled entries."""
+        return dict(self.conn.execute(
+            "SELECT outcome, COUNT(*) FROM cleaning_run_queue WHERE run_id = ? AND outcome IS NOT NULL GROUP BY outcome",
+            (run_id,)).fetchall())
+
+    def finish(self, run_id, finished_at):
+        """Close the run; its queue is dropped, the run row stays as a record."""
+        self.conn.execute("UPDATE cleaning_runs SET finished_at = ? WHERE run_id = ?", (finished_at, run_id))
+        self.conn.execute("DELETE FROM cleaning_run_queue WHERE run_id = ?", (run_id,))
+
+class BrokerRepo(Repo):
+    table = 'broker_sites'
+    row_type = BrokerSite
+
+    def names(self):
+        """Return (site_id, name) for every broker site in site_id order."""
+        return self.conn.execute("SELECT site_id, name FROM broker_sites ORDER BY site_id").fetchall()
+
+    def name_of(self, site_id):
+        row = self.conn.execute("SELECT name FROM broker_sites WHERE site_id = ?", (site_id,)).fetchone()
+        return row[0] if row else None
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM broker_sites").fetchone()[0]
+
+    def upsert_many(self, entries):
+        """Apply parsed entries to broker_sites with a staging table and one set-based upsert.
+
+        Entries are streamed into a temp staging table with executemany, then a single
+        INSERT ... ON CONFLICT(name) DO UPDATE writes only new or changed rows.
+        Returns (inserted, updated, unchanged) counts.
+        """
+        conn = self.conn
+        conn.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS broker_sites_staging (
+            name TEXT PRIMARY KEY,
+            {', '.join(f'{field} TEXT' for field in BROKER_FIELDS[1:])}
+        )
+        """)
+        conn.execute("DELETE FROM broker_sites_staging")
+        # A name repeated in the workbook keeps its last occurrence
+        conn.executemany(
+            f"INSERT OR REPLACE INTO broker_sites_staging ({', '.join(BROKER_FIELDS)}) VALUES ({', '.join('?' * len(BROKER_FIELDS))})",
+            (tuple(entry.get(field) for field in BROKER_FIELDS) for entry in entries if entry.get('name'))
+        )
+        staged_count = conn.execute("SELECT COUNT(*) FROM broker_sites_staging").fetchone()[0]
+        inserted_count = conn.execute("""
+        SELECT COUNT(*) FROM broker_sites_staging s
+        WHERE NOT EXISTS (SELECT 1 FROM broker_sites b WHERE b.name = s.name)
+        """).fetchone()[0]
+        updated_count = conn.execute(f"""
+        SELECT COUNT(*) FROM broker_sites_staging s
+        JOIN broker_sites b ON b.name = s.name
+        WHERE {BROKER_CHANGED_SQL.format(old='b', new='s')}
+        """).fetchone()[0]
+        # Existing rows carry their own site_id so conflicts don't burn AUTOINCREMENT values
+        conn.execute(f"""
+        INSERT INTO broker_sites (site_id, {', '.join(BROKER_FIELDS)})
+        SELECT b.site_id, {', '.join('s.' + field for field in BROKER_FIELDS)}
+        FROM broker_sites_staging s LEFT JOIN broker_sites b ON b.name = s.name WHERE true
+        ON CONFLICT(name) DO UPDATE SET
+            {', '.join(f'{field} = excluded.{field}' for field in BROKER_FIELDS[1:])}
+        WHERE {BROKER_CHANGED_SQL.format(old='broker_sites', new='excluded')}
+        """)
+        conn.execute("DELETE FROM broker_sites_staging")
+        return inserted_count, updated_count, staged_count - inserted_count - updated_count
+
+    def search(self, search_text, limit=SEARCH_LIMIT):
+        """Search broker_sites; returns (total, [(site_id, name, snippet), ...]) best match first.
+
+        Uses the broker_sites_fts index with prefix matching on every word (all words must
+        match). Falls back to a LIKE scan if the index is missing or the text has no words.
+        """
+        conn = self.conn
+        terms = SEARCH_TERM_RE.findall(search_text)
+        has_index = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'broker_sites_fts'").fetchone()
+        if terms and has_index:
+            match = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+            start, end = ('\033[1m', '\033[0m') if sys.stdout.isatty() else ('[', ']')  # Bold in a terminal
+            total = conn.execute("SELECT COUNT(*) FROM broker_sites_fts WHERE broker_sites_fts MATCH ?", (match,)).fetchone()[0]
+            results = conn.execute(f"""
+            SELECT rowid, highlight(broker_sites_fts, 0, ?, ?), snippet(broker_sites_fts, -1, ?, ?, '...', 12)
+            FROM broker_sites_fts
+            WHERE broker_sites_fts MATCH ?
+            ORDER BY bm25(broker_sites_fts, {', '.join(map(str, SEARCH_WEIGHTS))})
+            LIMIT ?
+            """, (start, end, start, end, match, limit)).fetchall()
+            return total, results
+        # LIKE is case-insensitive for ASCII, so no per-row LOWER() is needed
+        where = ' OR '.join(f"{column} LIKE ? ESCAPE '\\'" for column in BROKER_FTS_COLUMNS)
+        pattern = '%' + re.sub(r'([%_\\])', r'\\\1', search_text) + '%'
+        params = (pattern,) * len(BROKER_FTS_COLUMNS)
+        total = conn.execute(f"SELECT COUNT(*) FROM broker_sites WHERE {where}", params).fetchone()[0]
+        results = conn.execute(f"SELECT site_id, name, NULL FROM broker_sites WHERE {where} ORDER BY name LIMIT ?",
+                               params + (limit,)).fetchall()
+        return total, results
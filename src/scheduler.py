@@ -0,0 +1,86 @@
+import datetime
+from typing import NamedTuple, Optional
+
+# Actions in cleaning_schedule (see migration 8): 'clean' a site never cleaned, 'reclean' one
+# whose verification is over 183 days old, 'verify' a cleaning unverified after 30 days
+SCHEDULE_ACTIONS = ('clean', 'reclean', 'verify')
+CLEANING_ACTIONS = ('clean', 'reclean')
+UPCOMING_DAYS = 7  # Window the schedule command shows by default
+SCHEDULE_LIST_LIMIT = 20  # Queue entries it lists
+
+class ScheduledAction(NamedTuple):
+    site_id: int
+    name: str
+    url: Optional[str]
+    deletion_url: Optional[str]
+    action: str
+    next_action_at: str
+
+class CleaningSchedule:
+    """Read the due-date schedule of cleaning work, one next action per broker site.
+
+    cleaning_schedule is kept current by triggers on cleaning_records and broker_sites,
+    so every query here is a range scan of its next_action_at index rather than a pass
+    over the catalog. Dates are ISO strings; today defaults to the local date.
+    """
+    select_sql = """
+    SELECT cs.site_id, bs.name, bs.url, bs.deletion_url, cs.action, cs.next_action_at
+    FROM cleaning_schedule cs
+    JOIN broker_sites bs ON bs.site_id = cs.site_id
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    @staticmethod
+    def _today(today):
+        return today or datetime.date.today().isoformat()
+
+    def _actions_sql(self, actions):
+        if not actions:
+            return '', ()
+        return f" AND cs.action IN ({', '.join('?' * len(actions))})", tuple(actions)
+
+    def _between(self, after, until, actions, limit=None, cursor=None):
+        actions_sql, params = self._actions_sql(actions)
+        start_sql, start = "cs.next_action_at > ?", (after,)
+        if cursor:
+            # Keyset paging (the cursor came from this range): seek to its day, skip the sites returned
+            start_sql = "cs.next_action_at >= ? AND (cs.next_action_at, cs.site_id) > (?, ?)"
+            start = (cursor[0],) + tuple(cursor)
+        sql = (f"{self.select_sql} WHERE {start_sql} AND cs.next_action_at <= ?{actions_sql} "
+               "ORDER BY cs.next_action_at, cs.site_id")
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [ScheduledAction(*row) for row in self.conn.execute(sql, start + (until,) + params)]
+
+    def due_now(self, actions=None, today=None, limit=None, cursor=None):
+        """Return the actions due today or overdue, most overdue first.
+
+        With limit, pass the last returned action as cursor to get the next page; sites
+        rescheduled in between (e.g. just cleaned) are no longer due and drop out.
+        """
+        return self._between('', self._today(today), actions, limit,
+                             cursor and (cursor.next_action_at, cursor.site_id))
+
+    def due_within(self, days, actions=None, today=None, limit=None):
+        """Return the actions falling due after today and within the next days days."""
+        today = self._today(today)
+        until = (datetime.date.fromisoformat(today) + datetime.timedelta(days=days)).isoformat()
+        return self._between(today, until, actions, limit)
+
+    def next_due(self, actions=None, today=None):
+        """Return the first action falling due after today, or None if nothing is scheduled."""
+        actions_sql, params = self._actions_sql(actions)
+        row = self.conn.execute(
+            f"{self.select_sql} WHERE cs.next_action_at > ?{actions_sql} ORDER BY cs.next_action_at, cs.site_id LIMIT 1",
+            (self._today(today),) + params).fetchone()
+        return ScheduledAction(*row) if row else None
+
+    def counts_by_day(self, until, after=''):
+        """Return (next_action_at, action, count) for actions due after after, up to until."""
+        return self.conn.execute("""
+        SELECT next_action_at, action, COUNT(*) FROM cleaning_schedule
+        WHERE next_action_at > ? AND next_action_at <= ?
+        GROUP BY next_action_at, action ORDER BY next_action_at, action
+        """, (after, until)).fetchall()
@@ -0,0 +1,62 @@
+import threading
+from src.db import DB_PATH, connect_db
+from src.keys import DatabaseKey
+from src.transactions import UnitOfWork
+
+class Session:
+    """Database connections for one unlocked GHOSTWIPE session.
+
+    Created once after the passphrase is accepted and passed to every menu module, so
+    entering a submenu reuses an open, already keyed connection (and its page cache)
+    instead of connecting and running the key derivation again. The key itself is
+    derived once here; any further connection opens with the raw key.
+    """
+    def __init__(self, passphrase, db_path=DB_PATH, key=None):
+        # key: an already derived DatabaseKey (e.g. after re-encryption) instead of the passphrase
+        self.key = key or (DatabaseKey.unlock(passphrase, db_path) if passphrase else None)
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connections = {}
+        self.conn = self.connection('main')
+
+    def connection(self, name='main'):
+        """Return the named connection, opening it on first use.
+
+        'main' belongs to the console thread. Other names are for background workers
+        (e.g. the catalog refresh); those may be used from any one thread at a time.
+        """
+        with self.lock:
+            conn = self.connections.get(name)
+            if conn is None:
+                conn = connect_db(self.key, self.db_path, check_same_thread=(name == 'main'))
+                self.connections[name] = conn
+            return conn
+
+    def unit_of_work(self, name='main'):
+        """Return a UnitOfWork batching commits on the named connection (see src/transactions.py)."""
+        return UnitOfWork(self.connection(name))
+
+    def run_menu(self, menu, *args):
+        """Run menu(session, *args), then roll back anything it left uncommitted on 'main'.
+
+        The main connection outlives every menu, so changes a menu abandoned (e.g. after
+        an error) must not be committed later by whatever runs next.
+        """
+        try:
+            return menu(self, *args)
+        finally:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+
+    def close(self):
+        """Close every connection opened by this session."""
+        with self.lock:
+            connections, self.connections = self.connections, {}
+        for conn in connections.values():
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,67 @@
+import os
+from src.config import get_setting
+from src.workbook import WORKBOOK_URL, fetch_workbook, sha256_file
+from src.catalog import load_snapshot
+
+# Parsed catalog for air-gapped installs. Not shipped: create it with
+# "catalog export src/catalog_snapshot.json.gz" on a machine that can fetch the workbook
+BUNDLED_SNAPSHOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog_snapshot.json.gz')
+DEFAULT_SOURCES = ['url'] + (['snapshot'] if os.path.exists(BUNDLED_SNAPSHOT) else [])
+
+def configured_sources():
+    """Return the workbook source chain from the workbook_sources setting.
+
+    Accepts a list (data/config.json) or a comma-separated string
+    (--workbook-sources=pdf:/path/workbook.pdf,url,snapshot).
+    """
+    sources = get_setting('workbook_sources', DEFAULT_SOURCES)
+    if isinstance(sources, str):
+        sources = [source.strip() for source in sources.split(',') if source.strip()]
+    return sources or DEFAULT_SOURCES
+
+def resolve_source(spec, force=False, log=print):
+    """Resolve one source spec to a source dict, or None if it is unavailable.
+
+    Specs: "url" or "url:<address>" (cached download), "pdf:<path>" (local PDF) and
+    "snapshot" or "snapshot:<path>" (parsed catalog snapshot; BUNDLED_SNAPSHOT by default).
+    A source dict has kind ('pdf' or 'snapshot'), label, sha256 and pdf_path/meta or snapshot.
+    """
+    kind, _, value = spec.partition(':')
+    kind = kind.strip().lower()
+    value = value.strip()
+    if kind == 'url':
+        pdf_path, meta = fetch_workbook(value or get_setting('workbook_url', WORKBOOK_URL), force=force, log=log)
+        if pdf_path is None:
+            return None
+        return {'kind': 'pdf', 'label': meta.get('url') or pdf_path, 'sha256': meta['sha256'],
+                'pdf_path': pdf_path, 'meta': meta, 'cached': True}
+    if kind == 'pdf':
+        path = os.path.expanduser(value)
+        if not value or not os.path.isfile(path):
+            log(f"Workbook PDF not found: {path or '(no path given)'}")
+            return None
+        return {'kind': 'pdf', 'label': path, 'sha256': sha256_file(path),
+                'pdf_path': path, 'meta': {}, 'cached': False}
+    if kind == 'snapshot':
+        path = os.path.expanduser(value) if value else BUNDLED_SNAPSHOT
+        if not os.path.isfile(path):
+            log(f"Catalog snapshot not found: {path}")
+            return None
+        try:
+            snapshot = load_snapshot(path)
+        except (OSError, ValueError, KeyError) as e:
+            log(f"Unable to read catalog snapshot {path}: {e}")
+            return None
+        return {'kind': 'snapshot', 'label': path, 'sha256': snapshot.get('workbook_sha256') or sha256_file(path),
+                'snapshot': snapshot, 'snapshot_path': path}
+    log(f"Unknown workbook source '{spec}' (expected url, pdf:<path> or snapshot[:<path>])")
+    return None
+
+def open_workbook_source(sources=None, force=False, log=print):
+    """Try each source in the chain in order and return the first available one (or None)."""
+    for spec in sources or configured_sources():
+        source = resolve_source(spec, force=force, log=log)
+        if source:
+            return source
+        log(f"Workbook source '{spec}' unavailable; trying the next one.")
+    return None
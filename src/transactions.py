@@ -0,0 +1,105 @@
+import time
+import logging
+import contextlib
+from src.config import get_int_setting
+
+CHECKPOINT_EVERY = 25  # Changes per commit inside a unit of work
+CHECKPOINT_SECONDS = 60  # ...or commit once the oldest pending change is this old
+logger = logging.getLogger(__name__)
+
+class UnitOfWork:
+    """Group many single-row changes on one connection into a few commits.
+
+    Each commit on the encrypted database is an fsync, so a menu pass that changes
+    hundreds of rows should not commit after every row. Call changed() after each
+    change (or group changes with savepoint()); the unit commits (a checkpoint) once
+    checkpoint_every changes are pending or the oldest pending change is
+    checkpoint_seconds old, and once more on a clean exit. An exception rolls back
+    only the changes since the last checkpoint.
+
+    Pending changes hold the database's write lock until the next checkpoint, also
+    across prompt(); the catalog refresh retries its final write until then (see
+    populate_broker_sites). Single edits in interactive menus should simply commit.
+    """
+    def __init__(self, conn, checkpoint_every=None, checkpoint_seconds=None):
+        self.conn = conn
+        self.checkpoint_every = max(1, checkpoint_every if checkpoint_every is not None
+                                    else get_int_setting('checkpoint_every', CHECKPOINT_EVERY))
+        self.checkpoint_seconds = (checkpoint_seconds if checkpoint_seconds is not None
+                                   else get_int_setting('checkpoint_seconds', CHECKPOINT_SECONDS))
+        self.pending = 0
+        self.first_pending_at = None
+        self.commits = 0
+        self.savepoints = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.checkpoint()
+        else:
+            self.rollback()
+        return False
+
+    def changed(self, count=1):
+        """Record count changes made through the connection; commits if a checkpoint is due."""
+        if count <= 0:
+            return
+        if not self.pending:
+            self.first_pending_at = time.monotonic()
+        self.pending += count
+        if self.pending >= self.checkpoint_every or self._overdue():
+            self.checkpoint()
+
+    def _overdue(self):
+        return bool(self.pending) and time.monotonic() - self.first_pending_at >= self.checkpoint_seconds
+
+    def checkpoint(self):
+        """Commit every pending change now."""
+        if self.conn.in_transaction:
+            self.conn.commit()
+            self.commits += 1
+            logger.debug("Checkpoint committed %d changes", self.pending)
+        self.pending = 0
+        self.first_pending_at = None
+
+    def rollback(self):
+        """Drop the changes made since the last checkpoint."""
+        if self.conn.in_transaction:
+            self.conn.rollback()
+        if self.pending:
+            logger.debug("Rolled back %d uncommitted changes", self.pending)
+        self.pending = 0
+        self.first_pending_at = None
+
+    def prompt(self, text):
+        """input(text), committing first if the oldest pending change is checkpoint_seconds old.
+
+        Pending changes otherwise stay batched across prompts; checking here too keeps
+        changes that aged while the operator answered from waiting out another prompt.
+        """
+        if self._overdue():
+            self.checkpoint()
+        return input(text)
+
+    @contextlib.contextmanager
+    def savepoint(self):
+        """Make the enclosed statements one change: all of them apply, or none do.
+
+        Runs inside the unit's open transaction (starting one if needed, since
+        releasing an outermost SAVEPOINT would commit on its own); counts as one change.
+        """
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        self.savepoints += 1
+        name = f"uow_{self.savepoints}"
+        self.conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute(f"ROLLBACK TO {name}")
+            self.conn.execute(f"RELEASE {name}")
+            raise
+        self.conn.execute(f"RELEASE {name}")
+        self.changed()
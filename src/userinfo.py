@@ -1,31 +1,75 @@
-import sqlite3
-import sqlcipher3
-import os
 import signal
+from src.repos import UserRepo, AddressRepo, EmailRepo, PhoneNumberRepo, UsernameRepo, OptOutRepo, CleaningRepo
 
 def signal_handler(sig, frame):
     """Handle Ctrl+S to skip input."""
     raise KeyboardInterrupt
 
-def userinfo(passphrase):
+def confirm_delete_user(conn, repo, user):
+    """Ask for 'DELETE' and delete the user (its records cascade); returns True if deleted."""
+    name = f"{user.first_name or ''} {user.last_name or ''}".strip()
+    confirmation = input(f"Are you sure you want to Delete {name} from the database? Type 'DELETE': ").strip()
+    if confirmation != 'DELETE':
+        print("Deletion cancelled. Confirmation must be exactly 'DELETE'.")
+        return False
+    repo.delete(user.user_id)
+    conn.commit()
+    print(f"User {name} (user_id: {user.user_id}) and associated records deleted.")
+    return True
+
+def purge_users(conn, repo):
+    """Delete several users, picked by user_id or by a name/state filter, in one transaction."""
+    print("\nEnter user_ids separated by commas (e.g. 3, 7, 12), or a filter: name:<text> and/or state:<XX>.")
+    selection = input("Users to purge: ").strip()
+    if not selection:
+        return
+    if ':' in selection:
+        filters = {}
+        for part in selection.split():
+            field, _, value = part.partition(':')
+            if field.lower() not in ('name', 'state') or not value:
+                print("Invalid filter. Use name:<text> and/or state:<XX>.")
+                return
+            filters[field.lower()] = value
+        users = repo.matching(**filters)
+    else:
+        try:
+            user_ids = {int(part) for part in selection.split(',') if part.strip()}
+        except ValueError:
+            print("Invalid user_id list. Please enter numeric values separated by commas.")
+            return
+        users = [user for user in map(repo.get, sorted(user_ids)) if user]
+        missing = len(user_ids) - len(users)
+        if missing:
+            print(f"{missing} of the given user_ids do not exist and will be ignored.")
+    if not users:
+        print("No matching users found.")
+        return
+    print(f"\nUsers to purge ({len(users)}):")
+    for user in users:
+        print(f"User ID: {user.user_id}, Name: {user.display_name}")
+    confirmation = input(f"Delete these {len(users)} users and all their records? Type 'DELETE': ").strip()
+    if confirmation != 'DELETE':
+        print("Purge cancelled. Confirmation must be exactly 'DELETE'.")
+        return
+    deleted = repo.purge(user.user_id for user in users)
+    conn.commit()
+    print(f"Purged {deleted} users and their associated records.")
+
+def userinfo(session):
     """Manage user information in the GHOSTWIPE database."""
-    db_path = os.path.join('data', 'pii_data.db')
-    conn = None
+    conn = session.conn
     try:
-        conn = sqlcipher3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA key = '{passphrase}'")
-        cursor.execute("PRAGMA kdf_iter = 64000")
-        cursor.execute("PRAGMA cipher_page_size = 4096")
-        cursor.execute("PRAGMA foreign_keys = ON")
+        repo = UserRepo(conn)
         
         while True:
             print("\nUser Info Options:")
             print("1: Add new name")
             print("2: Modify existing user information")
             print("3: Delete user information")
-            print("4: Back to main menu")
-            choice = input("Enter choice (1-4): ").strip()
+            print("4: Purge several users (by user_id list or name/state filter)")
+            print("5: Back to main menu")
+            choice = input("Enter choice (1-5): ").strip()
             
             if choice == '1':
                 while True:
@@ -52,12 +96,8 @@ def userinfo(passphrase):
                         print("At least one of First Name or Last Name is required.")
                         continue
                     
-                    cursor.execute("""
-                    INSERT INTO users (first_name, middle_name, last_name)
-                    VALUES (?, ?, ?)
-                    """, (first_name, middle_name, last_name))
+                    user_id = repo.add(first_name=first_name, middle_name=middle_name, last_name=last_name)
                     conn.commit()
-                    user_id = cursor.lastrowid
                     print(f"User added with user_id: {user_id}")
                     
                     add_another = input("Would you like to add another user (y/N)? ").strip().lower()
@@ -65,25 +105,21 @@ def userinfo(passphrase):
                         break
             
             elif choice == '2':
-                cursor.execute("SELECT user_id, first_name, last_name FROM users")
-                users = cursor.fetchall()
+                users = repo.all()
                 if not users:
                     print("No users found in the database.")
                     continue
                 print("\nExisting Users:")
                 for user in users:
-                    user_id, first_name, last_name = user
-                    name = f"{first_name or ''} {last_name or ''}".strip()
-                    print(f"User ID: {user_id}, Name: {name}")
+                    print(f"User ID: {user.user_id}, Name: {user.display_name}")
                 
                 try:
                     user_id = int(input("Enter user_id to modify: ").strip())
-                    cursor.execute("SELECT first_name, last_name FROM users WHERE user_id = ?", (user_id,))
-                    user = cursor.fetchone()
+                    user = repo.get(user_id)
                     if not user:
                         print(f"No user found with user_id {user_id}.")
                         continue
-                    first_name, last_name = user
+                    first_name, last_name = user.first_name, user.last_name
                     print(f"\nModifying user: {first_name or ''} {last_name or ''}")
                     
                     from src.names import modify_names
@@ -108,93 +144,67 @@ def userinfo(passphrase):
                             print(f"\nUser Information for {first_name or ''} {last_name or ''} (User ID: {user_id}):")
                             
                             # Users table
-                            cursor.execute("""
-                            SELECT first_name, middle_name, last_name, primary_email, primary_phone, state
-                            FROM users WHERE user_id = ?
-                            """, (user_id,))
-                            user_info = cursor.fetchone()
+                            user_info = repo.get(user_id)
                             print("\nBasic Info:")
-                            print(f"First Name: {user_info[0] or 'None'}")
-                            print(f"Middle Name: {user_info[1] or 'None'}")
-                            print(f"Last Name: {user_info[2] or 'None'}")
-                            print(f"Primary Email: {user_info[3] or 'None'}")
-                            print(f"Primary Phone: {user_info[4] or 'None'}")
-                            print(f"State: {user_info[5] or 'None'}")
+                            print(f"First Name: {user_info.first_name or 'None'}")
+                            print(f"Middle Name: {user_info.middle_name or 'None'}")
+                            print(f"Last Name: {user_info.last_name or 'None'}")
+                            print(f"Primary Email: {user_info.primary_email or 'None'}")
+                            print(f"Primary Phone: {user_info.primary_phone or 'None'}")
+                            print(f"State: {user_info.state or 'None'}")
                             
                             # Addresses table
-                            cursor.execute("""
-                            SELECT address_id, street, city, state, zip, is_current
-                            FROM addresses WHERE user_id = ?
-                            """, (user_id,))
-                            addresses = cursor.fetchall()
+                            addresses = AddressRepo(conn).for_user(user_id)
                             print("\nAddresses:")
                             if not addresses:
                                 print("No addresses found.")
                             for addr in addresses:
-                                print(f"Address ID: {addr[0]}")
-                                print(f"Street: {addr[1] or 'None'}")
-                                print(f"City: {addr[2] or 'None'}")
-                                print(f"State: {addr[3] or 'None'}")
-                                print(f"ZIP: {addr[4] or 'None'}")
-                                print(f"Current: {'Yes' if addr[5] else 'No'}")
+                                print(f"Address ID: {addr.address_id}")
+                                print(f"Street: {addr.street or 'None'}")
+                                print(f"City: {addr.city or 'None'}")
+                                print(f"State: {addr.state or 'None'}")
+                                print(f"ZIP: {addr.zip or 'None'}")
+                                print(f"Current: {'Yes' if addr.is_current else 'No'}")
                                 print()
                             
                             # Emails table
-                            cursor.execute("""
-                            SELECT email_id, email_address, source_site, is_active
-                            FROM emails WHERE user_id = ?
-                            """, (user_id,))
-                            emails = cursor.fetchall()
+                            emails = EmailRepo(conn).for_user(user_id)
                             print("Emails:")
                             if not emails:
                                 print("No emails found.")
                             for email in emails:
-                                print(f"Email ID: {email[0]}")
-                                print(f"Email Address: {email[1] or 'None'}")
-                                print(f"Source Site: {email[2] or 'None'}")
-                                print(f"Active: {'Yes' if email[3] else 'No'}")
+                                print(f"Email ID: {email.email_id}")
+                                print(f"Email Address: {email.email_address or 'None'}")
+                                print(f"Source Site: {email.source_site or 'None'}")
+                                print(f"Active: {'Yes' if email.is_active else 'No'}")
                                 print()
                             
                             # Phone Numbers table
-                            cursor.execute("""
-                            SELECT phone_id, phone_number, source_site, is_active
-                            FROM phone_numbers WHERE user_id = ?
-                            """, (user_id,))
-                            phones = cursor.fetchall()
+                            phones = PhoneNumberRepo(conn).for_user(user_id)
                             print("Phone Numbers:")
                             if not phones:
                                 print("No phone numbers found.")
                             for phone in phones:
-                                print(f"Phone ID: {phone[0]}")
-                                print(f"Phone Number: {phone[1] or 'None'}")
-                                print(f"Source Site: {phone[2] or 'None'}")
-                                print(f"Active: {'Yes' if phone[3] else 'No'}")
+                                print(f"Phone ID: {phone.phone_id}")
+                                print(f"Phone Number: {phone.phone_number or 'None'}")
+                                print(f"Source Site: {phone.source_site or 'None'}")
+                                print(f"Active: {'Yes' if phone.is_active else 'No'}")
                                 print()
                             
                             # Usernames table
-                            cursor.execute("""
-                            SELECT username_id, username, platform, is_tied
-                            FROM usernames WHERE user_id = ?
-                            """, (user_id,))
-                            usernames = cursor.fetchall()
+                            usernames = UsernameRepo(conn).for_user(user_id)
                             print("Usernames:")
                             if not usernames:
                                 print("No usernames found.")
                             for uname in usernames:
-                                print(f"Username ID: {uname[0]}")
-                                print(f"Username: {uname[1] or 'None'}")
-                                print(f"Platform: {uname[2] or 'None'}")
-                                print(f"Tied: {'Yes' if uname[3] else 'No'}")
+                                print(f"Username ID: {uname.username_id}")
+                                print(f"Username: {uname.username or 'None'}")
+                                print(f"Platform: {uname.platform or 'None'}")
+                                print(f"Tied: {'Yes' if uname.is_tied else 'No'}")
                                 print()
                             
                             # Opt-out Requests
-                            cursor.execute("""
-                            SELECT oor.request_id, bs.name, oor.status, oor.request_date
-                            FROM opt_out_requests oor
-                            JOIN broker_sites bs ON oor.site_id = bs.site_id
-                            WHERE oor.user_id = ?
-                            """, (user_id,))
-                            requests = cursor.fetchall()
+                            requests = OptOutRepo(conn).for_user_with_sites(user_id)
                             print("Opt-out Requests:")
                             if not requests:
                                 print("No opt-out requests found.")
@@ -206,49 +216,30 @@ def userinfo(passphrase):
                                 print()
                             
                             # Cleaning Records (via broker_sites)
-                            cursor.execute("""
-                            SELECT cr.record_id, cr.site_name, cr.date_cleaned, cr.date_confirmed_deleted
-                            FROM cleaning_records cr
-                            JOIN broker_sites bs ON cr.site_id = bs.site_id
-                            WHERE cr.site_id IN (SELECT site_id FROM opt_out_requests WHERE user_id = ?)
-                            """, (user_id,))
-                            cleaning_records = cursor.fetchall()
+                            cleaning_records = CleaningRepo(conn).for_user(user_id)
                             print("Cleaning Records:")
                             if not cleaning_records:
                                 print("No cleaning records found.")
                             for record in cleaning_records:
-                                print(f"Record ID: {record[0]}")
-                                print(f"Site Name: {record[1]}")
-                                print(f"Date Cleaned: {record[2] or 'None'}")
-                                print(f"Date Confirmed Deleted: {record[3] or 'None'}")
+                                print(f"Record ID: {record.record_id}")
+                                print(f"Site Name: {record.site_name}")
+                                print(f"Date Cleaned: {record.date_cleaned or 'None'}")
+                                print(f"Date Confirmed Deleted: {record.date_confirmed_deleted or 'None'}")
                                 print()
                         
                         elif sub_choice == '2':
-                            modify_names(passphrase, user_id)
+                            session.run_menu(modify_names, user_id)
                         elif sub_choice == '3':
-                            modify_addresses(passphrase, user_id)
+                            session.run_menu(modify_addresses, user_id)
                         elif sub_choice == '4':
-                            modify_emails(passphrase, user_id)
+                            session.run_menu(modify_emails, user_id)
                         elif sub_choice == '5':
-                            modify_phone_numbers(passphrase, user_id)
+                            session.run_menu(modify_phone_numbers, user_id)
                         elif sub_choice == '6':
-                            modify_usernames(passphrase, user_id)
+                            session.run_menu(modify_usernames, user_id)
                         elif sub_choice == 'd':
-                            name = f"{first_name or ''} {last_name or ''}".strip()
-                            confirmation = input(f"Are you sure you want to Delete {name} from the database? Type 'DELETE': ").strip()
-                            if confirmation == 'DELETE':
-                                # Delete associated records
-                                cursor.execute("DELETE FROM addresses WHERE user_id = ?", (user_id,))
-                                cursor.execute("DELETE FROM emails WHERE user_id = ?", (user_id,))
-                                cursor.execute("DELETE FROM phone_numbers WHERE user_id = ?", (user_id,))
-                                cursor.execute("DELETE FROM usernames WHERE user_id = ?", (user_id,))
-                                cursor.execute("DELETE FROM opt_out_requests WHERE user_id = ?", (user_id,))
-                                cursor.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
-                                conn.commit()
-                                print(f"User {name} (user_id: {user_id}) and associated records deleted.")
+                            if confirm_delete_user(conn, repo, user):
                                 break
-                            else:
-                                print("Deletion cancelled. Confirmation must be exactly 'DELETE'.")
                         elif sub_choice == 'b':
                             break
                         else:
@@ -257,48 +248,31 @@ def userinfo(passphrase):
                     print("Invalid user_id. Please enter a numeric value.")
             
             elif choice == '3':
-                cursor.execute("SELECT user_id, first_name, last_name FROM users")
-                users = cursor.fetchall()
+                users = repo.all()
                 if not users:
                     print("No users found in the database.")
                     continue
                 print("\nExisting Users:")
                 for user in users:
-                    user_id, first_name, last_name = user
-                    name = f"{first_name or ''} {last_name or ''}".strip()
-                    print(f"User ID: {user_id}, Name: {name}")
+                    print(f"User ID: {user.user_id}, Name: {user.display_name}")
                 
                 try:
                     user_id = int(input("Enter user_id to delete: ").strip())
-                    cursor.execute("SELECT first_name, last_name FROM users WHERE user_id = ?", (user_id,))
-                    user = cursor.fetchone()
+                    user = repo.get(user_id)
                     if not user:
                         print(f"No user found with user_id {user_id}.")
                         continue
-                    first_name, last_name = user
-                    name = f"{first_name or ''} {last_name or ''}".strip()
-                    confirmation = input(f"Are you sure you want to Delete {name} from the database? Type 'DELETE': ").strip()
-                    if confirmation == 'DELETE':
-                        cursor.execute("DELETE FROM addresses WHERE user_id = ?", (user_id,))
-                        cursor.execute("DELETE FROM emails WHERE user_id = ?", (user_id,))
-                        cursor.execute("DELETE FROM phone_numbers WHERE user_id = ?", (user_id,))
-                        cursor.execute("DELETE FROM usernames WHERE user_id = ?", (user_id,))
-                        cursor.execute("DELETE FROM opt_out_requests WHERE user_id = ?", (user_id,))
-                        cursor.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
-                        conn.commit()
-                        print(f"User {name} (user_id: {user_id}) and associated records deleted.")
-                    else:
-                        print("Deletion cancelled. Confirmation must be exactly 'DELETE'.")
+                    confirm_delete_user(conn, repo, user)
                 except ValueError:
                     print("Invalid user_id. Please enter a numeric value.")
             
             elif choice == '4':
+                purge_users(conn, repo)
+            
+            elif choice == '5':
                 break
             else:
-                print("Invalid choice. Please enter 1-4.")
+                print("Invalid choice. Please enter 1-5.")
     
     except Exception as e:
         print(f"Error managing user info: {e}")
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
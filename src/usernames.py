@@ -1,23 +1,15 @@
-import sqlite3
-import sqlcipher3
-import os
 import signal
+from src.repos import UsernameRepo
 
 def signal_handler(sig, frame):
     """Handle Ctrl+S to skip input."""
     raise KeyboardInterrupt
 
-def modify_usernames(passphrase, user_id):
+def modify_usernames(session, user_id):
     """Modify username information for a specific user_id."""
-    db_path = os.path.join('data', 'pii_data.db')
-    conn = None
+    conn = session.conn
     try:
-        conn = sqlcipher3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA key = '{passphrase}'")
-        cursor.execute("PRAGMA kdf_iter = 64000")
-        cursor.execute("PRAGMA cipher_page_size = 4096")
-        cursor.execute("PRAGMA foreign_keys = ON")
+        repo = UsernameRepo(conn)
         
         while True:
             print("\nUsername Options:")
@@ -51,22 +43,18 @@ def modify_usernames(passphrase, user_id):
                     print("Username and platform are required.")
                     continue
                 
-                cursor.execute("""
-                INSERT INTO usernames (user_id, username, platform, is_tied)
-                VALUES (?, ?, ?, ?)
-                """, (user_id, username, platform, is_tied))
+                repo.add(user_id=user_id, username=username, platform=platform, is_tied=is_tied)
                 conn.commit()
                 print("Username added.")
             
             elif choice == '2':
-                cursor.execute("SELECT username_id, username, platform, is_tied FROM usernames WHERE user_id = ?", (user_id,))
-                usernames = cursor.fetchall()
+                usernames = repo.for_user(user_id)
                 if not usernames:
                     print("No usernames found for this user.")
                 else:
                     print("\nUsernames:")
                     for uname in usernames:
-                        username_id, username, platform, is_tied = uname
+                        username_id, _, username, platform, is_tied = uname
                         print(f"Username ID: {username_id}")
                         print(f"Username: {username}")
                         print(f"Platform: {platform}")
@@ -74,22 +62,20 @@ def modify_usernames(passphrase, user_id):
                         print()
             
             elif choice == '3':
-                cursor.execute("SELECT username_id, username, platform FROM usernames WHERE user_id = ?", (user_id,))
-                usernames = cursor.fetchall()
+                usernames = repo.for_user(user_id)
                 if not usernames:
                     print("No usernames found for this user.")
                     continue
                 print("\nUsernames:")
                 for uname in usernames:
-                    username_id, username, platform = uname
+                    username_id, username, platform = uname.username_id, uname.username, uname.platform
                     print(f"Username ID: {username_id}, {username} ({platform})")
                 try:
                     username_id = int(input("Enter username_id to delete: ").strip())
-                    cursor.execute("SELECT 1 FROM usernames WHERE username_id = ? AND user_id = ?", (username_id, user_id))
-                    if not cursor.fetchone():
+                    if not repo.owned_by(username_id, user_id):
                         print(f"No username found with username_id {username_id} for this user.")
                         continue
-                    cursor.execute("DELETE FROM usernames WHERE username_id = ?", (username_id,))
+                    repo.delete(username_id)
                     conn.commit()
                     print(f"Username ID {username_id} deleted.")
                 except ValueError:
@@ -102,6 +88,3 @@ def modify_usernames(passphrase, user_id):
     
     except Exception as e:
         print(f"Error managing usernames: {e}")
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
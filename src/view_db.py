@@ -1,19 +1,10 @@
-import sqlite3
-import sqlcipher3
-import os
+from src.repos import BrokerRepo
 
-def view_db(passphrase):
+def view_db(session):
     """View entries in the broker_sites table with various options."""
-    db_path = os.path.join('data', 'pii_data.db')
-    conn = None
+    conn = session.conn
     try:
-        conn = sqlcipher3.connect(db_path)
-        cursor = conn.cursor()
-        if passphrase:
-            cursor.execute(f"PRAGMA key = '{passphrase}'")
-            cursor.execute("PRAGMA kdf_iter = 64000")
-            cursor.execute("PRAGMA cipher_page_size = 4096")
-        cursor.execute("PRAGMA foreign_keys = ON")
+        brokers = BrokerRepo(conn)
         
         while True:
             print("\nView Entries Options:")
@@ -24,34 +15,23 @@ def view_db(passphrase):
             choice = input("Enter choice (1-4): ").strip()
             
             if choice == '1':
-                search_text = input("Enter search text: ").strip().lower()
-                query = """
-                SELECT * FROM broker_sites
-                WHERE LOWER(name) LIKE ? OR LOWER(url) LIKE ? OR LOWER(deletion_url) LIKE ?
-                OR LOWER(privacy_policy) LIKE ? OR LOWER(contact) LIKE ?
-                OR LOWER(requirements) LIKE ? OR LOWER(notes) LIKE ?
-                """
-                cursor.execute(query, (f'%{search_text}%',) * 7)
-                results = cursor.fetchall()
+                search_text = input("Enter search text (words match as prefixes): ").strip()
+                if not search_text:
+                    continue
+                total, results = brokers.search(search_text)
                 if not results:
                     print("No entries found matching the search text.")
                 else:
-                    print(f"\nFound {len(results)} entries:")
-                    for row in results:
-                        print("\nEntry:")
-                        print(f"Site ID: {row[0]}")
-                        print(f"Name: {row[1]}")
-                        print(f"URL: {row[2] or 'None'}")
-                        print(f"Deletion URL: {row[3] or 'None'}")
-                        print(f"Privacy Policy: {row[4] or 'None'}")
-                        print(f"Contact: {row[5] or 'None'}")
-                        print(f"Requirements: {row[6] or 'None'}")
-                        print(f"Notes: {row[7] or 'None'}")
-                        print(f"Last Updated: {row[8] or 'None'}")
+                    shown = f"top {len(results)} of {total}" if total > len(results) else f"{total}"
+                    print(f"\nFound {total} entries (showing {shown}, best match first):")
+                    for site_id, name, snippet in results:
+                        print(f"Entry {site_id}: {name}")
+                        if snippet and snippet != name:
+                            print(f"    {' '.join(snippet.split())}")
+                    print("Use 'View entry by number' for full details.")
             
             elif choice == '2':
-                cursor.execute("SELECT site_id, name FROM broker_sites ORDER BY site_id")
-                results = cursor.fetchall()
+                results = brokers.names()
                 if not results:
                     print("No entries in broker_sites.")
                 else:
@@ -62,8 +42,7 @@ def view_db(passphrase):
             elif choice == '3':
                 try:
                     site_id = int(input("Enter entry number (site_id): ").strip())
-                    cursor.execute("SELECT * FROM broker_sites WHERE site_id = ?", (site_id,))
-                    row = cursor.fetchone()
+                    row = brokers.get(site_id)
                     if row:
                         print("\nEntry:")
                         print(f"Site ID: {row[0]}")
@@ -87,6 +66,3 @@ def view_db(passphrase):
     
     except Exception as e:
         print(f"Error querying database: {e}")
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
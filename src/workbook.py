@@ -0,0 +1,439 @@
+import os
+import json
+import hashlib
+import datetime
+import re
+import email.utils
+import unicodedata
+import concurrent.futures
+import multiprocessing
+import threading
+import contextlib
+import mmap
+import base64
+import binascii
+import logging
+import requests
+import pdfplumber
+from src.config import get_int_setting
+
+WORKBOOK_URL = "https://inteltechniques.com/data/workbook.pdf"
+CACHE_DIR = os.path.join('data', 'workbook')
+CACHE_PDF = os.path.join(CACHE_DIR, 'workbook.pdf')
+CACHE_META = os.path.join(CACHE_DIR, 'workbook.json')
+CACHE_PART = CACHE_PDF + '.part'  # Download in progress; kept across runs so it can resume
+DOWNLOAD_CHUNK = 64 * 1024
+CHECK_INTERVAL = datetime.timedelta(hours=24)  # How long a cached PDF is trusted without asking the server
+PAGES_PER_CHUNK = 8  # Minimum pages handed to one extraction worker at a time
+# Extraction runs from the catalog-refresh thread, where fork would copy a process holding other
+# threads' locks; forkserver (or spawn where unavailable) starts workers from a clean process
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+_active_pools = {}  # Running extraction pool -> cancelled Event, so an abandoned refresh can stop them
+_active_pools_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+SERVICE_RE = re.compile(r'\n*\s*Service:\s*')
+FIELD_MAP = {
+    "Service:": "name",
+    "Website:": "url",
+    "Removal Link:": "deletion_url",
+    "Privacy Policy:": "privacy_policy",
+    "Contact:": "contact",
+    "Requirements:": "requirements",
+    "Notes:": "notes"
+}
+FIELD_RE = re.compile(r'\n*\s*(Website:|Removal Link:|Privacy Policy:|Contact:|Requirements:|Notes:)')
+SKIP_BLOCK_RE = re.compile(r'Book|Guide|Data Request|Credit Freeze')  # Book/guide sections, not brokers
+CONTACT_JUNK_RE = re.compile(r'\(/cdn-cgi/.*?\)|\[|\]')  # Cloudflare email-protection links and link brackets
+NOTES_DATES_RE = re.compile(r'\n*Date:.*?Verified Removal:.*?(?=\n|$)', re.DOTALL)  # Blank tracking form lines
+NOTES_FOOTER_RE = re.compile(r'\n*(Copyright © \d{4} by IntelTechniques|EXTREME PRIVACY \| PERSONAL DATA REMOVAL WORKBOOK \| INTELTECHNIQUES\.COM).*', re.DOTALL)
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+
+def load_cache_meta():
+    """Load the workbook cache metadata (ETag, Last-Modified, SHA-256, ...)."""
+    if not os.path.exists(CACHE_META):
+        return {}
+    try:
+        with open(CACHE_META, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}  # Corrupt metadata just means a fresh download
+
+def save_cache_meta(meta):
+    """Atomically write the workbook cache metadata."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = CACHE_META + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, CACHE_META)
+
+def sha256_file(path):
+    """Return the hex SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _advertised_sha256(response):
+    """Return the SHA-256 a server advertises for the full body (Repr-Digest/Digest headers), if any."""
+    for header in ('Repr-Digest', 'Digest'):
+        match = re.search(r'sha-256=:?([A-Za-z0-9+/]+=*):?', response.headers.get(header, ''), re.IGNORECASE)
+        if match:
+            try:
+                return base64.b64decode(match.group(1)).hex()
+            except (ValueError, binascii.Error):
+                return None
+    return None
+
+def _expected_size(response, offset):
+    """Return the full size of the file being downloaded, if the server says."""
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range and content_range.rsplit('/', 1)[1].isdigit():
+        return int(content_range.rsplit('/', 1)[1])
+    length = response.headers.get('Content-Length')
+    if length and length.isdigit() and not response.headers.get('Content-Encoding'):
+        return offset + int(length)
+    return None
+
+def _discard_partial(meta):
+    if os.path.exists(CACHE_PART):
+        os.remove(CACHE_PART)
+    meta.pop('partial', None)
+    save_cache_meta(meta)
+
+def _promote_partial(meta, response, partial, sha256, size, now):
+    """Move the verified .part download into place as the cached workbook."""
+    os.replace(CACHE_PART, CACHE_PDF)
+    meta.pop('partial', None)
+    meta['sha256'] = sha256
+    meta['size'] = size
+    meta['etag'] = response.headers.get('ETag') or partial.get('etag')
+    meta['last_modified'] = response.headers.get('Last-Modified') or partial.get('last_modified')
+    meta['downloaded_at'] = now.isoformat(timespec='seconds')
+    meta.pop('workbook_date', None)  # Re-read from the new PDF
+
+def fetch_workbook(url=WORKBOOK_URL, force=False, log=print):
+    """Return (pdf_path, meta) for the cached workbook, refreshing it with a conditional GET when stale.
+
+    The PDF is streamed to a .part file in chunks and hashed on the way; an interrupted
+    download resumes with an HTTP Range request next time. Returns (None, meta) if no copy
+    is available at all.
+    """
+    meta = load_cache_meta()
+    now = datetime.datetime.now()
+    have_cache = os.path.exists(CACHE_PDF) and meta.get('sha256')
+    fallback = (CACHE_PDF, meta) if have_cache else (None, meta)
+    if have_cache and not force and meta.get('last_checked'):
+        last_checked = datetime.datetime.fromisoformat(meta['last_checked'])
+        if now - last_checked < CHECK_INTERVAL:
+            return CACHE_PDF, meta  # Checked recently; no network round trip
+
+    headers = {}
+    if have_cache:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    # Resume a partial download only if we can ask for the same version (If-Range needs a strong validator)
+    partial = meta.get('partial') or {}
+    offset = os.path.getsize(CACHE_PART) if os.path.exists(CACHE_PART) else 0
+    etag = partial.get('etag') if not (partial.get('etag') or '').startswith('W/') else None
+    validator = etag or partial.get('last_modified')
+    if offset and partial.get('url') == url and validator:
+        headers['Range'] = f"bytes={offset}-"
+        headers['If-Range'] = validator
+    else:
+        offset = 0
+
+    log(f"Checking {url} for workbook updates...")
+    try:
+        response = requests.get(url, headers=headers, stream=True, timeout=(5, 60))
+    except requests.RequestException as e:
+        log(f"Error: Unable to connect to {url} ({e})")
+        return fallback
+
+    with response:
+        if response.status_code == 304 and have_cache:
+            log("Workbook not modified since last download.")
+        elif response.status_code in (200, 206):
+            resuming = response.status_code == 206 and response.headers.get('Content-Range', '').startswith(f"bytes {offset}-")
+            if response.status_code == 206 and not resuming:
+                log("Error: Server returned an unexpected byte range; restarting the download.")
+                _discard_partial(meta)
+                return fallback
+            if not resuming:
+                offset = 0
+            digest = hashlib.sha256()
+            if resuming:
+                with open(CACHE_PART, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+                log(f"Resuming workbook download at byte {offset}...")
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            meta['partial'] = {'url': url, 'etag': response.headers.get('ETag'),
+                               'last_modified': response.headers.get('Last-Modified')}
+            save_cache_meta(meta)
+            expected_size = _expected_size(response, offset)
+            try:
+                with open(CACHE_PART, 'ab' if resuming else 'wb') as f:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                        f.write(chunk)
+                        digest.update(chunk)
+            except (requests.RequestException, OSError) as e:
+                size = os.path.getsize(CACHE_PART) if os.path.exists(CACHE_PART) else 0
+                log(f"Error: Workbook download interrupted at {size} bytes ({e}); it will resume on the next refresh.")
+                return fallback
+            size = os.path.getsize(CACHE_PART)
+            if expected_size is not None and size < expected_size:
+                log(f"Error: Workbook download ended early ({size} of {expected_size} bytes); it will resume on the next refresh.")
+                return fallback
+            sha256 = digest.hexdigest()
+            advertised = _advertised_sha256(response) if response.status_code == 200 else None
+            if (expected_size is not None and size != expected_size) or (advertised and advertised != sha256):
+                log(f"Error: Downloaded workbook failed verification ({size} bytes, sha256 {sha256[:12]}); discarding it.")
+                _discard_partial(meta)
+                return fallback
+            _promote_partial(meta, response, partial, sha256, size, now)
+            log(f"Downloaded workbook ({size} bytes, sha256 {sha256[:12]}).")
+        elif response.status_code == 416 and offset:
+            # Nothing left past our offset: the partial is already complete, or the file got shorter
+            full_size = response.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+            if not (full_size.isdigit() and int(full_size) == offset):
+                log("Error: Server rejected the resume range; restarting the workbook download.")
+                _discard_partial(meta)
+                return fetch_workbook(url, force, log)  # No Range this time, so no second 416
+            sha256 = sha256_file(CACHE_PART)
+            _promote_partial(meta, response, partial, sha256, offset, now)
+            log(f"Completed workbook download ({offset} bytes, sha256 {sha256[:12]}).")
+        else:
+            log(f"Error: Unable to fetch {url} (status code: {response.status_code})")
+            return fallback
+
+    meta['url'] = url
+    meta['last_checked'] = now.isoformat(timespec='seconds')
+    save_cache_meta(meta)
+    return CACHE_PDF, meta
+
+@contextlib.contextmanager
+def open_pdf(path):
+    """Open a PDF with pdfplumber, memory-mapping the file where the platform allows it."""
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            mapped = None  # Empty file or no mmap support; read through the file object instead
+        try:
+            with pdfplumber.open(mapped if mapped is not None else f) as pdf:
+                yield pdf
+        finally:
+            if mapped is not None:
+                mapped.close()
+
+def _extract_page_range(pdf_path, start, stop):
+    """Extract the text of pages [start, stop) (runs in a worker process)."""
+    with open_pdf(pdf_path) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages[start:stop]]
+
+def iter_page_texts(pdf_path, workers=None, progress=None, log=print):
+    """Yield the text of every page of the PDF, in page order.
+
+    With workers > 1 the page range is split into chunks that are extracted in a process
+    pool; chunks are yielded in order so the output matches the serial path exactly.
+    progress, if given, is called with (pages_done, page_count) after each page.
+    """
+    if workers is None:
+        workers = get_int_setting('pdf_workers', os.cpu_count() or 1)
+    with open_pdf(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+        if workers <= 1 or page_count < 2 * PAGES_PER_CHUNK:
+            for done, page in enumerate(pdf.pages, 1):
+                yield page.extract_text() or ""
+                if progress:
+                    progress(done, page_count)
+            return
+
+    chunk_size = max(PAGES_PER_CHUNK, -(-page_count // (workers * 4)))  # ~4 chunks per worker for balance
+    ranges = [(start, min(start + chunk_size, page_count)) for start in range(0, page_count, chunk_size)]
+    done = 0
+    cancelled = threading.Event()
+    try:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(POOL_START_METHOD))
+        with _active_pools_lock:
+            _active_pools[executor] = cancelled
+        finished = False
+        try:
+            futures = [executor.submit(_extract_page_range, pdf_path, start, stop) for start, stop in ranges]
+            for future in futures:
+                if cancelled.is_set():
+                    raise concurrent.futures.CancelledError("PDF extraction cancelled")
+                for page_text in future.result():
+                    yield page_text
+                    done += 1
+                    if progress:
+                        progress(done, page_count)
+            finished = True
+        finally:
+            with _active_pools_lock:
+                _active_pools.pop(executor, None)
+            # Only wait for the workers after a complete run; otherwise drop the queued chunks
+            executor.shutdown(wait=finished, cancel_futures=not finished)
+    except (OSError, concurrent.futures.BrokenExecutor) as e:
+        if cancelled.is_set():
+            raise concurrent.futures.CancelledError("PDF extraction cancelled") from e
+        log(f"Parallel PDF extraction unavailable ({e}); falling back to serial extraction.")
+        for page_text in _extract_page_range(pdf_path, done, page_count):
+            yield page_text
+            done += 1
+            if progress:
+                progress(done, page_count)
+
+def cancel_page_extraction():
+    """Stop every running parallel extraction without waiting for it.
+
+    Queued chunks are cancelled and the workers terminated, so the pool's exit-time join
+    returns at once; the cancelled iter_page_texts generators raise CancelledError.
+    """
+    with _active_pools_lock:
+        pools = list(_active_pools.items())
+    for executor, cancelled in pools:
+        cancelled.set()
+        if hasattr(executor, 'terminate_workers'):  # Python 3.14+
+            executor.terminate_workers()
+            continue
+        processes = list((executor._processes or {}).values())  # shutdown() drops this mapping
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+def iter_entry_blocks(page_texts):
+    """Yield the raw text block following each "Service:" label as pages arrive.
+
+    Only the current, possibly incomplete block is carried across page boundaries; text
+    before the first "Service:" is dropped.
+    """
+    carry = ""
+    started = False
+    for page_text in page_texts:
+        buffer = carry + unicodedata.normalize('NFKD', page_text + "\n")
+        matches = list(SERVICE_RE.finditer(buffer))
+        if not matches:
+            carry = buffer if started else ""
+            continue
+        for current, following in zip(matches, matches[1:]):
+            yield buffer[current.end():following.start()]
+        # The last block may continue on the next page, so keep it (label included)
+        carry = buffer[matches[-1].start():]
+        started = True
+    if started:
+        yield carry[SERVICE_RE.match(carry).end():]
+
+def tokenize_block(block):
+    """Split an entry block into its name and (label, value) pairs in one pass over FIELD_RE."""
+    name = None
+    fields = []
+    label = None
+    position = 0
+    for match in FIELD_RE.finditer(block):
+        if label is None:
+            name = block[:match.start()]
+        else:
+            fields.append((label, block[position:match.start()]))
+        label = match.group(1)
+        position = match.end()
+    if label is None:
+        return block, fields
+    fields.append((label, block[position:]))
+    return name, fields
+
+def clean_field(key, value):
+    """Normalize one field value (text is already NFKD-normalized by iter_entry_blocks)."""
+    if key in ("url", "deletion_url", "privacy_policy"):
+        return value.strip('[] ')
+    if key == "contact":
+        if '[email' in value or '@' not in value:
+            return "Email protected (requires manual retrieval)"
+        return CONTACT_JUNK_RE.sub('', value).strip(' ,')
+    if key == "notes":
+        value = NOTES_DATES_RE.sub('', value)
+        return NOTES_FOOTER_RE.sub('', value).strip()
+    return value
+
+def parse_entry_block(block, i, last_updated):
+    """Parse one entry block into a broker_sites dict, or None if it should be skipped."""
+    block = block.strip()
+    if not block or SKIP_BLOCK_RE.search(block):
+        logger.debug("Skipping block %d: %s...", i + 1, block[:50], extra={'fields': {'event': 'block_skipped', 'block': i + 1}})
+        return None
+    name, fields = tokenize_block(block)
+    name = name.strip()
+    if name == "The name of the service":
+        logger.debug("Skipping block %d (placeholder name): %s...", i + 1, block[:50],
+                     extra={'fields': {'event': 'block_skipped', 'block': i + 1, 'reason': 'placeholder'}})
+        return None
+    if not name:
+        logger.debug("Skipping invalid entry %d (missing or empty name): %s...", i + 1, block[:50],
+                     extra={'fields': {'event': 'block_skipped', 'block': i + 1, 'reason': 'no_name'}})
+        return None
+    current_entry = {'name': name}
+    for label, value in fields:
+        key = FIELD_MAP[label]
+        current_entry[key] = clean_field(key, value.strip())
+    current_entry['last_updated'] = last_updated
+    logger.debug("Parsed entry %d: %s", i + 1, current_entry,
+                 extra={'fields': {'event': 'entry_parsed', 'block': i + 1, 'entry': current_entry}})
+    return current_entry
+
+def parse_entries(page_texts, last_updated, log=print):
+    """Yield parsed broker entries one at a time from an iterable of page texts.
+
+    Per-block detail is logged at DEBUG; log only receives a one-line summary at the end.
+    """
+    block_count = entry_count = 0
+    for i, block in enumerate(iter_entry_blocks(page_texts)):
+        block_count = i + 1
+        if i == 0:
+            logger.debug("First entry block (first 1000 chars):\n%s...", block[:1000])
+        entry = parse_entry_block(block, i, last_updated)
+        if entry:
+            entry_count += 1
+            yield entry
+    log(f"Parsed {entry_count} broker entries from {block_count} blocks ({block_count - entry_count} skipped).")
+
+def _pdf_date(value):
+    """Parse a PDF date string like D:20241001120000-05'00' into an ISO date."""
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    match = re.match(r"^(?:D:)?(\d{4})(\d{2})(\d{2})", value or '')
+    if not match:
+        return None
+    try:
+        return datetime.date(*map(int, match.groups())).isoformat()
+    except ValueError:
+        return None
+
+def workbook_date(pdf, meta=None):
+    """Work out when the workbook was last updated from the PDF itself.
+
+    Prefers the document's ModDate/CreationDate metadata, then a "Month YYYY" stamp on the
+    first pages, then the server's Last-Modified header.
+    """
+    metadata = pdf.metadata or {}
+    for key in ('ModDate', 'CreationDate'):
+        date = _pdf_date(metadata.get(key))
+        if date:
+            return date
+    pattern = re.compile(r'\b(' + '|'.join(MONTHS) + r')\s+(\d{4})\b')
+    for page in pdf.pages[:3]:
+        match = pattern.search(page.extract_text() or '')
+        if match:
+            return datetime.date(int(match.group(2)), MONTHS.index(match.group(1)) + 1, 1).isoformat()
+    if meta and meta.get('last_modified'):
+        try:
+            return email.utils.parsedate_to_datetime(meta['last_modified']).date().isoformat()
+        except (TypeError, ValueError):
+            pass
+    return None
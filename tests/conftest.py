@@ -0,0 +1,24 @@
+import os
+import sys
+import random
+import datetime
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import connect_db, init_db
+from benchmarks.common import fill_cleanings
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """A connection to a freshly initialized, unencrypted database in a scratch data/ dir."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    init_db('')
+    conn = connect_db('')
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def cleaned_conn(conn):
+    """conn with 300 broker sites, about 80% of them cleaned on random days over the last year."""
+    fill_cleanings(conn, 300, random.Random(0), datetime.date.today())
+    return conn
@@ -0,0 +1,26 @@
+import json
+import datetime
+from src.backup import BackupStore
+from src.db import DB_PATH
+
+TODAY = datetime.date(2026, 3, 15)
+
+def snapshot_on(store, conn, day):
+    """Take a snapshot and date it day (noon)."""
+    manifest = store.snapshot(conn, DB_PATH)
+    manifest['created_at'] = f"{day.isoformat()}T12:00:00"
+    with open(store.snapshot_path(manifest['id']), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return manifest['id']
+
+def test_retention_counts_calendar_days_not_days_with_backups(conn):
+    store = BackupStore()
+    ids = [snapshot_on(store, conn, TODAY - datetime.timedelta(days=days)) for days in (30, 10, 6, 1, 0)]
+    assert store.prune(keep_last=1, keep_daily=7, keep_monthly=0, today=TODAY)[0] == 2
+    assert [manifest['id'] for manifest in store.snapshots()] == ids[2:]
+
+def test_retention_counts_calendar_months(conn):
+    store = BackupStore()
+    ids = [snapshot_on(store, conn, datetime.date(*day)) for day in ((2025, 1, 5), (2025, 4, 5), (2026, 2, 5))]
+    store.prune(keep_last=1, keep_daily=0, keep_monthly=12, today=TODAY)
+    assert [manifest['id'] for manifest in store.snapshots()] == ids[1:]
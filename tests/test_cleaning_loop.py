@@ -0,0 +1,53 @@
+import time
+import threading
+import pytest
+import src.db
+from src.catalog import save_snapshot
+from src.db import populate_broker_sites
+from src.repos import BrokerRepo, CleaningRepo, CleaningRunRepo
+from src.session import Session
+from src.transactions import CHECKPOINT_EVERY
+from benchmarks.common import automated_pass
+
+SITES = 60
+
+@pytest.fixture
+def session(conn):
+    """A session on conn's database with SITES expired broker sites."""
+    BrokerRepo(conn).add_many({'name': f"Broker {i}", 'url': f"https://broker{i}.example"} for i in range(SITES))
+    conn.commit()
+    with Session('', src.db.DB_PATH) as session:
+        yield session
+
+def test_pass_commits_once_per_checkpoint_not_per_site(session):
+    commits = automated_pass(session, 'cvsf' * (SITES // 4))
+    assert commits <= SITES // CHECKPOINT_EVERY + 4  # Plus the status read, queueing, finishing and exit
+    counts = CleaningRepo(session.conn).status_counts()
+    assert (counts['clean'], counts['expired']) == (SITES // 2, SITES // 2)  # Skipped and failed stay expired
+
+def test_exit_keeps_handled_sites_and_resumes_after_them(session):
+    automated_pass(session, 'c' * 30 + 'e')
+    assert not session.conn.in_transaction
+    assert len(CleaningRepo(session.conn).all()) == 30
+    automated_pass(session, 'v' * (SITES - 30), resume=True)
+    assert CleaningRunRepo(session.conn).current() is None
+    assert CleaningRepo(session.conn).status_counts()['expired'] == 0
+
+def test_refresh_waits_for_the_checkpoint_instead_of_failing(session, monkeypatch):
+    monkeypatch.setattr(src.db, 'WRITE_RETRY_SECONDS', 0.05)
+    save_snapshot('catalog.json.gz', [{'name': "New broker", 'url': "https://new.example"}], 'f' * 64, "2026-01-01")
+    work = session.unit_of_work()
+    CleaningRepo(session.conn).record(1, "Broker 0", "2026-01-01")
+    work.changed()  # Pending: the main connection holds the write lock
+    stages, result = [], []
+    refresh = threading.Thread(target=lambda: result.append(populate_broker_sites(
+        session.connection('catalog-refresh'), sources=['snapshot:catalog.json.gz'],
+        progress=lambda stage, *counts: stages.append(stage), log=lambda message: None)))
+    refresh.start()
+    deadline = time.monotonic() + 10
+    while 'waiting for the write lock' not in stages and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert 'waiting for the write lock' in stages and refresh.is_alive()
+    work.checkpoint()
+    refresh.join(10)
+    assert result == ["2026-01-01"] and BrokerRepo(session.conn).count() == SITES + 1
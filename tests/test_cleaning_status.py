@@ -0,0 +1,38 @@
+import random
+import datetime
+from src.repos import BrokerRepo, CleaningRepo
+from benchmarks.common import mutate, python_counts, view_counts, rewind_summary
+
+def test_view_classifies_like_the_python_loop(cleaned_conn):
+    assert view_counts(cleaned_conn) == python_counts(cleaned_conn, datetime.date.today())
+
+def test_summary_matches_view_after_changes(cleaned_conn):
+    conn = cleaned_conn
+    cleanings = CleaningRepo(conn)
+    assert cleanings.status_counts() == view_counts(conn)
+    mutate(conn, random.Random(1), datetime.date.today(), 200)
+    assert cleanings.status_counts() == view_counts(conn)
+
+def test_aging_moves_sites_across_thresholds(cleaned_conn):
+    conn = cleaned_conn
+    cleanings = CleaningRepo(conn)
+    for days in (1, 7, 45, 200):
+        rewind_summary(conn, (datetime.date.today() - datetime.timedelta(days=days)).isoformat())
+        assert cleanings.status_counts() == view_counts(conn), f"aged over {days} days"
+
+def test_summary_rebuilds_when_the_clock_goes_back(cleaned_conn):
+    conn = cleaned_conn
+    conn.execute("UPDATE cleaning_status_summary SET site_count = 0, as_of = '2999-01-01'")
+    assert CleaningRepo(conn).status_counts() == view_counts(conn)
+
+def test_recording_a_site_again_updates_its_record(conn):
+    site_id = BrokerRepo(conn).add(name="Broker")
+    cleanings = CleaningRepo(conn)
+    cleanings.record(site_id, "Broker", "2026-01-01")
+    record_id = cleanings.for_site(site_id).record_id
+    cleanings.record(site_id, "Broker", "2026-02-01", "2026-02-03")
+    conn.commit()
+
+    record = cleanings.for_site(site_id)
+    assert (record.record_id, record.date_cleaned, record.date_confirmed_deleted) == (record_id, "2026-02-01", "2026-02-03")
+    assert len(cleanings.all()) == 1
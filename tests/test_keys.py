@@ -0,0 +1,42 @@
+import os
+import json
+import pytest
+import sqlcipher3
+import src.db
+from src.db import connect_db, init_db
+from src.keys import KDF_ITER, CIPHER_SETTINGS_SUFFIX, DatabaseKey
+
+@pytest.fixture
+def encrypted_db(tmp_path):
+    """A database SQLCipher keyed itself from a passphrase (running its own KDF)."""
+    path = str(tmp_path / 'passphrase.db')
+    conn = sqlcipher3.connect(path)
+    conn.execute("PRAGMA key = 'correct horse'")
+    conn.execute(f"PRAGMA kdf_iter = {KDF_ITER}")
+    conn.execute("CREATE TABLE t (x)")
+    conn.execute("INSERT INTO t VALUES (42)")
+    conn.commit()
+    conn.close()
+    return path
+
+def test_derived_raw_key_opens_passphrase_database(encrypted_db):
+    key = DatabaseKey.unlock('correct horse', encrypted_db)
+    conn = connect_db(key, encrypted_db)
+    assert conn.execute("SELECT x FROM t").fetchone() == (42,)
+    conn.close()
+
+def test_wrong_passphrase_does_not_open(encrypted_db):
+    conn = connect_db(DatabaseKey.unlock('wrong', encrypted_db), encrypted_db)
+    with pytest.raises(sqlcipher3.DatabaseError):
+        conn.execute("SELECT x FROM t").fetchone()
+    conn.close()
+
+def test_missing_settings_file_is_named_in_the_unlock_error(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    with open(os.path.join('data', 'config.json'), 'w', encoding='utf-8') as f:
+        json.dump({'cipher_kdf_iter': 1000}, f)
+    init_db(DatabaseKey.unlock('correct horse', src.db.DB_PATH))
+    os.remove(src.db.DB_PATH + CIPHER_SETTINGS_SUFFIX)
+    with pytest.raises(sqlcipher3.DatabaseError, match="cipher settings file .* is missing"):
+        init_db(DatabaseKey.unlock('correct horse', src.db.DB_PATH))
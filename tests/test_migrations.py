@@ -0,0 +1,42 @@
+from src.migrations import LATEST_VERSION, schema_version, migrate, dedupe_cleaning_records, pending_lossy_migrations
+from src.repos import UserRepo, AddressRepo, EmailRepo, BrokerRepo
+
+def test_new_database_is_at_latest_version(conn):
+    assert schema_version(conn) == LATEST_VERSION
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+
+def test_migrating_a_current_database_changes_nothing(conn):
+    schema = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+    assert migrate(conn) == LATEST_VERSION
+    assert conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall() == schema
+
+def test_duplicate_cleaning_records_are_counted_and_the_newest_kept(conn, capsys):
+    site_id = BrokerRepo(conn).add(name="Broker")
+    conn.execute("DROP INDEX idx_cleaning_records_site_id")  # As before migration 2
+    conn.executemany("INSERT INTO cleaning_records (site_id, site_name, date_cleaned) VALUES (?, 'Broker', ?)",
+                     [(site_id, day) for day in ("2026-01-01", "2026-02-01", "2026-03-01")])
+    dedupe_cleaning_records(conn)
+    assert "Dropped 2 older duplicate cleaning_records rows" in capsys.readouterr().out
+    assert conn.execute("SELECT date_cleaned FROM cleaning_records").fetchall() == [("2026-03-01",)]
+
+def test_only_migrations_that_would_drop_rows_back_up_first(conn):
+    conn.execute("PRAGMA user_version = 1")
+    assert pending_lossy_migrations(conn) == []  # Nothing to lose in empty tables
+    conn.execute("INSERT INTO cleaning_records (site_name) VALUES ('Broker')")
+    assert pending_lossy_migrations(conn) == [2]
+    EmailRepo(conn).add(user_id=UserRepo(conn).add(first_name="User"), email_address="user@example.com")
+    assert pending_lossy_migrations(conn) == [2, 5]
+
+def test_deleting_users_cascades_to_their_records(conn):
+    users = UserRepo(conn)
+    kept, deleted, purged = (users.add(first_name=name) for name in ('Kept', 'Deleted', 'Purged'))
+    for user_id in (kept, deleted, purged):
+        AddressRepo(conn).add(user_id=user_id, street="1 Main St")
+        EmailRepo(conn).add(user_id=user_id, email_address=f"{user_id}@example.com")
+    conn.commit()
+
+    users.delete(deleted)
+    assert users.purge([purged]) == 1
+    conn.commit()
+    assert [row.user_id for row in AddressRepo(conn).all()] == [kept]
+    assert [row.user_id for row in EmailRepo(conn).all()] == [kept]
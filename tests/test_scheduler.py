@@ -0,0 +1,31 @@
+import random
+import datetime
+from src.repos import CleaningRepo
+from src.scheduler import CleaningSchedule, CLEANING_ACTIONS
+from benchmarks.common import mutate, scheduled, rebuilt_schedule
+
+def test_schedule_agrees_with_status_view(cleaned_conn):
+    conn = cleaned_conn
+    schedule, cleanings = CleaningSchedule(conn), CleaningRepo(conn)
+    expired = [row[0] for row in cleanings.sites_with_status('expired')]
+    assert sorted(item.site_id for item in schedule.due_now(CLEANING_ACTIONS)) == expired
+    unverified = [row[0] for row in cleanings.sites_with_status('needs_verification')]
+    assert sorted(item.site_id for item in schedule.due_now(('verify',))) == unverified
+
+def test_triggers_keep_schedule_equal_to_a_rebuild(cleaned_conn):
+    conn = cleaned_conn
+    assert scheduled(conn) == rebuilt_schedule(conn)
+    mutate(conn, random.Random(1), datetime.date.today(), 200)
+    assert scheduled(conn) == rebuilt_schedule(conn)
+
+def test_paging_with_cursor_returns_every_due_action_once(cleaned_conn):
+    conn = cleaned_conn
+    schedule = CleaningSchedule(conn)
+    pages, cursor = [], None
+    while True:
+        page = schedule.due_now(limit=7, cursor=cursor)
+        if not page:
+            break
+        pages.extend(page)
+        cursor = page[-1]
+    assert pages == schedule.due_now()
@@ -0,0 +1,58 @@
+import os
+import hashlib
+import pytest
+import src.workbook as workbook
+from src.workbook import CACHE_PDF, CACHE_PART, fetch_workbook, load_cache_meta, save_cache_meta
+
+BODY = b"%PDF-1.4 workbook"
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, body=b""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+@pytest.fixture
+def partial_download(tmp_path, monkeypatch):
+    """A scratch cache holding an interrupted download of the first size bytes of BODY."""
+    monkeypatch.chdir(tmp_path)
+    def write(size):
+        os.makedirs(os.path.dirname(CACHE_PART), exist_ok=True)
+        with open(CACHE_PART, 'wb') as f:
+            f.write(BODY[:size])
+        save_cache_meta({'partial': {'url': workbook.WORKBOOK_URL, 'etag': '"v1"', 'last_modified': None}})
+    return write
+
+def serve(monkeypatch, *responses):
+    """Answer requests.get with responses in turn; returns the request headers seen."""
+    requests_seen, queue = [], list(responses)
+    def get(url, headers, **kwargs):
+        requests_seen.append(headers)
+        return queue.pop(0)
+    monkeypatch.setattr(workbook.requests, 'get', get)
+    return requests_seen
+
+def test_416_for_a_complete_partial_promotes_it(partial_download, monkeypatch):
+    partial_download(len(BODY))
+    seen = serve(monkeypatch, FakeResponse(416, {'Content-Range': f"bytes */{len(BODY)}"}))
+    path, meta = fetch_workbook(log=lambda message: None)
+    assert seen[0]['Range'] == f"bytes={len(BODY)}-"
+    assert path == CACHE_PDF and not os.path.exists(CACHE_PART)
+    assert meta['sha256'] == hashlib.sha256(BODY).hexdigest() and 'partial' not in load_cache_meta()
+
+def test_416_for_a_shrunk_file_restarts_from_byte_0(partial_download, monkeypatch):
+    partial_download(len(BODY))
+    seen = serve(monkeypatch, FakeResponse(416, {'Content-Range': "bytes */4"}),
+                 FakeResponse(200, {'Content-Length': '4', 'ETag': '"v2"'}, BODY[:4]))
+    path, meta = fetch_workbook(log=lambda message: None)
+    assert 'Range' in seen[0] and 'Range' not in seen[1]
+    assert meta['sha256'] == hashlib.sha256(BODY[:4]).hexdigest() and meta['etag'] == '"v2"'
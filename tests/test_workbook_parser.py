@@ -0,0 +1,17 @@
+import os
+import json
+from src.workbook import parse_entries
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+LAST_UPDATED = "2024-10-01"
+
+def test_parser_matches_golden_output():
+    # Regenerate the golden file with: python benchmarks/bench_parser.py --update-golden
+    with open(os.path.join(FIXTURE_DIR, 'workbook_sample.txt'), 'r', encoding='utf-8') as f:
+        pages = f.read().split('\f')
+    with open(os.path.join(FIXTURE_DIR, 'workbook_sample.golden.json'), 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+    entries = list(parse_entries(pages, LAST_UPDATED, log=lambda message: None))
+    assert golden and len(entries) == len(golden)
+    for number, (entry, expected) in enumerate(zip(entries, golden), 1):
+        assert entry == expected, f"entry {number}"